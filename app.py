@@ -18,37 +18,141 @@ Notes:
 - Passwords are hashed using werkzeug.security (do NOT store plaintext).
 """
 
+import csv
+import hashlib
+import hmac
+import io
+import json
+import math
+import mimetypes
 import os
-from datetime import datetime
-from typing import Optional
-
-import requests
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from functools import wraps
+from itertools import islice
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import click
+from flask import (Blueprint, Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify,
+                   g, current_app, has_app_context, has_request_context, send_from_directory, stream_with_context)
+from flask.blueprints import BlueprintSetupState
 
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import (check_password_hash, generate_password_hash)
+from itsdangerous import BadSignature
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import contains_eager
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-from flask_mail import Mail, Message
+
+from assets import build_assets, compress_body, load_manifest, pick_encoding
+from fulfillment import (Dispatcher, FulfillmentError, HTTPProviderAdapter, NetworkLimits, Order, ProviderAdapter,
+                         StubAdapter, TransientFulfillmentError, UnresolvedOrderError, parse_size_mb)
+from importer import chunked, iter_records
+from metrics import AccessLog, Registry
+from passwords import PasswordHasher, PasswordHasherBusy
+from ratelimit import Overloaded, RateLimited, SharedLimiter, parse_limit
+from paystack import PaystackClient, PaystackError
 
 # ----------------------
 # App configuration
 # ----------------------
-app = Flask(__name__)
+# Settings are read from the environment here; create_app() (at the end of
+# this file) builds the Flask app from them.
 
 # Secret key (use environment variable in production)
-app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-key")
+SECRET_KEY = os.environ.get("FLASK_SECRET_KEY", "dev-secret-key")
 
 # File upload configuration
 UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "static/uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+# Largest accepted picture; requests announcing a bigger body get 413 before it is read
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(2 * 1024 * 1024)))
 
 # Database configuration: default to a local SQLite DB file
 db_path = os.environ.get("DATABASE_URL", "sqlite:///data_bundle.db")
-app.config["SQLALCHEMY_DATABASE_URI"] = db_path
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-db = SQLAlchemy(app)
+
+# Engine profiles: connection pragmas (SQLite) and pool sizing, chosen with
+# DB_PROFILE. "sqlite-wal" lets readers run alongside the single writer and
+# makes writers wait for the lock instead of failing with "database is locked".
+ENGINE_PROFILES = {
+    "sqlite-default": {"pragmas": {}, "pool": {}},
+    "sqlite-wal": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "busy_timeout": int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000")),
+            "synchronous": "NORMAL",  # durable across app crashes; WAL fsyncs at checkpoints
+            "cache_size": -int(os.environ.get("DB_CACHE_KB", "20000")),  # negative = KiB
+            "temp_store": "MEMORY",
+        },
+        "pool": {"pool_size": int(os.environ.get("DB_POOL_SIZE", "10")), "max_overflow": 10},
+    },
+    "server": {
+        "pragmas": {},
+        "pool": {
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", "10")),
+            "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "20")),
+            "pool_pre_ping": True,
+            "pool_recycle": 1800,
+        },
+    },
+}
+DB_PROFILE = os.environ.get("DB_PROFILE") or ("sqlite-wal" if db_path.startswith("sqlite") else "server")
+if DB_PROFILE not in ENGINE_PROFILES:
+    raise RuntimeError(f"Unknown DB_PROFILE {DB_PROFILE!r}; choose one of {sorted(ENGINE_PROFILES)}")
+engine_profile = ENGINE_PROFILES[DB_PROFILE]
+
+# Read-only routes (see @read_only) use a separate pool, optionally on a replica
+read_url = os.environ.get("DATABASE_READ_URL", "")
+
+
+def is_memory_sqlite(url: str) -> bool:
+    """Return True for an in-memory SQLite URL, which exists only inside its one connection."""
+    return ":memory:" in url or url in ("sqlite://", "sqlite:///")
+
+
+@event.listens_for(Engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Apply the engine profile's PRAGMAs to every new SQLite connection."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in engine_profile["pragmas"].items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+class RoutingSession(FlaskSQLAlchemySession):
+    """
+    Session that sends reads to the "read" bind inside @read_only routes.
+
+    Anything flushed by the ORM still goes to the primary engine.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get("db_read_only"):
+            return read_engine()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def read_engine() -> Engine:
+    """Return the engine for read-only queries: the "read" bind, or the primary without one."""
+    return db.engines.get("read") or db.engine
 
 
 
@@ -62,15 +166,373 @@ PAYSTACK_PUBLIC_KEY = os.environ.get(
     "pk_test_5dba95da4545041b0211cab413af0c955f71354f",
 )
 
-# Flask-Mail Configuration
-app.config["MAIL_SERVER"] = "smtp.gmail.com"
-app.config["MAIL_PORT"] = 587
-app.config["MAIL_USE_TLS"] = True
-app.config["MAIL_USERNAME"] = "emmanuelzoryiku344@gmail.com"   # replace with your email
-app.config["MAIL_PASSWORD"] = "fajl vldl isoy hkqp"   # replace with your password or app password
-app.config["MAIL_DEFAULT_SENDER"] = ("Developers Arena Data Bunble App", "emmanuelzoryiku344@gmail.com")
+# One pooled, time-bounded client per process (see paystack.py)
+paystack = PaystackClient(
+    PAYSTACK_SECRET_KEY,
+    base_url=os.environ.get("PAYSTACK_BASE_URL", "https://api.paystack.co"),
+    connect_timeout=float(os.environ.get("PAYSTACK_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.environ.get("PAYSTACK_READ_TIMEOUT", "10")),
+)
+
+# Password hashing runs in a bounded worker pool per process (see passwords.py).
+# Stored hashes made with other parameters are upgraded at the next login.
+password_hasher = PasswordHasher(
+    method=os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1"),
+    workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "1")),
+    queue_limit=int(os.environ.get("PASSWORD_HASH_QUEUE", "16")),
+    wait=float(os.environ.get("PASSWORD_HASH_WAIT", "2")),
+)
+
+# Flask-Mail Configuration (Flask-Mail itself is only loaded by the outbox sender)
+MAIL_CONFIG = {
+    "MAIL_SERVER": os.environ.get("MAIL_SERVER", "smtp.gmail.com"),
+    "MAIL_PORT": int(os.environ.get("MAIL_PORT", "587")),
+    "MAIL_USE_TLS": os.environ.get("MAIL_USE_TLS", "true").lower() == "true",
+    "MAIL_USE_SSL": os.environ.get("MAIL_USE_SSL", "false").lower() == "true",
+    "MAIL_USERNAME": os.environ.get("MAIL_USERNAME", "emmanuelzoryiku344@gmail.com"),   # replace with your email
+    "MAIL_PASSWORD": os.environ.get("MAIL_PASSWORD", "fajl vldl isoy hkqp"),   # replace with your password or app password
+    "MAIL_DEFAULT_SENDER": ("Developers Arena Data Bunble App", "emmanuelzoryiku344@gmail.com"),
+}
+
+# Where contact-form messages are delivered
+CONTACT_RECIPIENT = os.environ.get("CONTACT_RECIPIENT", "your_email@gmail.com")
+
+# Compiled templates are cached on disk so new workers skip Jinja compilation;
+# set to an empty string to disable. Defaults to <instance folder>/jinja_cache.
+JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR")
+
+
+def default_config() -> dict:
+    """Return the Flask config built from the environment (see create_app)."""
+    return {
+        "SECRET_KEY": SECRET_KEY,
+        "UPLOAD_FOLDER": UPLOAD_FOLDER,
+        "MAX_CONTENT_LENGTH": UPLOAD_MAX_BYTES + 64 * 1024,  # room for the other form fields
+        "SQLALCHEMY_DATABASE_URI": db_path,
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        **MAIL_CONFIG,
+    }
+
+
+class Routes(Blueprint):
+    """
+    Blueprint whose endpoints keep their bare names ("home", not "routes.home").
+
+    All views live on one blueprint that create_app() registers, so existing
+    url_for() calls and templates are unchanged. With no endpoint prefix,
+    requests never count as "inside" the blueprint, so hooks and error
+    handlers must be the app-wide variants (after_app_request,
+    app_errorhandler, ...).
+    """
+
+    def make_setup_state(self, app, options, first_registration=False):
+        return UnprefixedSetupState(self, app, options, first_registration)
+
+
+class UnprefixedSetupState(BlueprintSetupState):
+    """Registers a blueprint's URL rules under their own endpoint names."""
+
+    def add_url_rule(self, rule, endpoint=None, view_func=None, **options):
+        self.app.add_url_rule(rule, endpoint, view_func, **options)
+
+
+routes = Routes("routes", __name__, cli_group=None)
+
+# ----------------------
+# Instrumentation
+# ----------------------
+# Per-request SQL and Paystack time, per-route latency histograms, a slow
+# query/request log and an optional JSONL access log (see metrics.py).
+# Counters are per worker process and exposed at /metrics.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")  # if set, /metrics needs "Authorization: Bearer <token>"
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "200"))
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "1000"))
+REQUEST_QUERY_WARN = int(os.environ.get("REQUEST_QUERY_WARN", "50"))  # catches N+1 loops
+ACCESS_LOG_PATH = os.environ.get("ACCESS_LOG_PATH", "")
+
+metrics = Registry()
+http_requests = metrics.counter(
+    "http_requests_total", "Requests handled, by endpoint, method and status.", ("endpoint", "method", "status")
+)
+http_request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "Time from request start to response, by endpoint.", ("endpoint", "method")
+)
+db_query_seconds = metrics.histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by statement type.", ("statement",)
+)
+db_queries_per_request = metrics.histogram(
+    "db_queries_per_request", "SQL statements issued per request, by endpoint.", ("endpoint",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+db_request_seconds = metrics.histogram(
+    "db_time_per_request_seconds", "Time spent in SQL per request, by endpoint.", ("endpoint",)
+)
+db_slow_queries = metrics.counter("db_slow_queries_total", f"Statements slower than {SLOW_QUERY_MS:g} ms.")
+paystack_seconds = metrics.histogram(
+    "paystack_request_duration_seconds", "Paystack API calls including retries.", ("operation", "outcome")
+)
+PROCESS_STARTED = time.time()
+# Read from their owners at scrape time
+metrics.gauge("process_start_time_seconds", "Start time of this worker (Unix time).", lambda: PROCESS_STARTED)
+metrics.gauge("page_cache_entries", "Pages held in this worker's page cache.", lambda: page_cache.stats()["entries"])
+metrics.gauge("page_cache_hits_total", "Page cache hits.", lambda: page_cache.stats()["hits"], kind="counter")
+metrics.gauge("page_cache_renders_total", "Page cache misses that rendered the page.",
+              lambda: page_cache.stats()["renders_by_endpoint"], labelname="endpoint", kind="counter")
+metrics.gauge("paystack_circuit_open", "1 while the Paystack circuit breaker rejects calls.",
+              lambda: int(paystack.breaker.state == "open"))
+
+access_log = AccessLog(ACCESS_LOG_PATH, max_lines=int(os.environ.get("ACCESS_LOG_BUFFER", "200"))) \
+    if ACCESS_LOG_PATH else None
+
+
+class RequestTiming:
+    """Time spent by one request, accumulated in ``g.timing``."""
+
+    __slots__ = ("started", "sql_count", "sql_seconds", "paystack_seconds")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.paystack_seconds = 0.0
+
+
+def current_timing() -> Optional[RequestTiming]:
+    """Return the running request's timing, or None outside an instrumented request."""
+    return g.get("timing") if has_request_context() else None
+
+
+def statement_kind(statement: str) -> str:
+    """Return a bounded label for a SQL statement: select, insert, update, delete or other."""
+    verb = statement.lstrip()[:6].lower()
+    return verb if verb in ("select", "insert", "update", "delete") else "other"
+
+
+def observe_paystack_call(operation: str, outcome: str, seconds: float) -> None:
+    """PaystackClient observer: add the call to the histogram and the request's timing."""
+    paystack_seconds.observe(seconds, operation, outcome)
+    timing = current_timing()
+    if timing is not None:
+        timing.paystack_seconds += seconds
+
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany) -> None:
+    """Engine hook: note when a statement was sent (a stack, as cursors can nest)."""
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def record_query(conn, cursor, statement, parameters, context, executemany) -> None:
+    """Engine hook: time a finished statement and log it if it was slow."""
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    db_query_seconds.observe(elapsed, statement_kind(statement))
+    timing = current_timing()
+    if timing is not None:
+        timing.sql_count += 1
+        timing.sql_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc()
+        # Statement text only: parameters can hold personal data
+        current_app.logger.warning(
+            "Slow query %.1f ms (%s): %s", elapsed * 1000,
+            request.endpoint if has_request_context() else "no request", " ".join(statement.split())[:500],
+        )
+
+
+def discard_query_timer(exception_context) -> None:
+    """Engine hook: drop the start time of a statement that raised."""
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def begin_request_timing() -> None:
+    """Start timing the request."""
+    g.timing = RequestTiming()
+
+
+def record_request(response):
+    """Record latency, SQL and Paystack time for the finished request."""
+    timing = g.pop("timing", None)
+    if timing is None:
+        return response
+    elapsed = time.perf_counter() - timing.started
+    endpoint = request.endpoint or "unmatched"  # never the raw path: label values must stay bounded
+    http_requests.inc(endpoint, request.method, str(response.status_code))
+    http_request_seconds.observe(elapsed, endpoint, request.method)
+    db_queries_per_request.observe(timing.sql_count, endpoint)
+    db_request_seconds.observe(timing.sql_seconds, endpoint)
+
+    if elapsed * 1000 >= SLOW_REQUEST_MS or timing.sql_count >= REQUEST_QUERY_WARN:
+        current_app.logger.warning(
+            "Slow request %s %s: %.1f ms, %d queries (%.1f ms), Paystack %.1f ms",
+            request.method, request.path, elapsed * 1000, timing.sql_count, timing.sql_seconds * 1000,
+            timing.paystack_seconds * 1000,
+        )
+    if access_log is not None:
+        # Only read the session if the view did, so logging never adds "Vary: Cookie"
+        user_id = session.get("user_id") if session.accessed else None
+        access_log.write({
+            "ts": datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+            "method": request.method,
+            "path": request.path,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "ms": round(elapsed * 1000, 2),
+            "sql": timing.sql_count,
+            "sql_ms": round(timing.sql_seconds * 1000, 2),
+            "paystack_ms": round(timing.paystack_seconds * 1000, 2),
+            "bytes": response.content_length,
+            "user_id": user_id,
+            "ip": request.remote_addr,
+        })
+    return response
+
+
+if METRICS_ENABLED:
+    # Request hooks are added by create_app()
+    event.listen(Engine, "before_cursor_execute", start_query_timer)
+    event.listen(Engine, "after_cursor_execute", record_query)
+    event.listen(Engine, "handle_error", discard_query_timer)
+    paystack.observer = observe_paystack_call
+
+
+@routes.route("/metrics")
+def metrics_endpoint():
+    """This worker's metrics in the Prometheus text format."""
+    if METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ----------------------
+# Rate limiting and load shedding
+# ----------------------
+# POSTs to the costly routes (password hashing, Paystack calls, wallet debits)
+# take a token per client IP and per account from buckets shared by all
+# workers on the host (see ratelimit.py); an empty bucket answers 429 with
+# Retry-After. They also count against RATE_LIMIT_MAX_IN_FLIGHT, a host-wide
+# cap that answers 503 before these routes can occupy every worker.
+# Limits are "N/second|minute|hour|day" or "off", overridable per route and
+# scope: RATE_LIMIT_LOGIN_IP, RATE_LIMIT_LOGIN_ACCOUNT, ...
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_DB = os.environ.get("RATE_LIMIT_DB")  # defaults to <instance folder>/ratelimit.db
+RATE_LIMIT_MAX_IN_FLIGHT = int(os.environ.get("RATE_LIMIT_MAX_IN_FLIGHT", "8"))  # 0 disables the cap
+# Proxies in front of the app; their X-Forwarded-For gives the client IP
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", "0"))
+
+# endpoint -> (per IP, per account) defaults
+RATE_LIMIT_DEFAULTS = {
+    "login": ("20/minute", "10/minute"),
+    "register": ("5/minute", "off"),
+    "purchase": ("60/minute", "30/minute"),
+    "initiate_payment": ("20/minute", "5/minute"),
+}
+RATE_LIMITS = {
+    endpoint: {
+        "ip": parse_limit(os.environ.get(f"RATE_LIMIT_{endpoint.upper()}_IP", ip_default)),
+        "account": parse_limit(os.environ.get(f"RATE_LIMIT_{endpoint.upper()}_ACCOUNT", account_default)),
+    }
+    for endpoint, (ip_default, account_default) in RATE_LIMIT_DEFAULTS.items()
+}
+rate_limited_requests = metrics.counter(
+    "rate_limited_requests_total", "Requests refused with 429, by endpoint and bucket scope.", ("endpoint", "scope")
+)
+shed_requests = metrics.counter(
+    "shed_requests_total", "Requests refused with 503 at the in-flight cap, by endpoint.", ("endpoint",)
+)
+
+
+def rate_limit_account() -> Optional[str]:
+    """Return the account a limited request acts for: the login email, else the signed-in user."""
+    if request.endpoint in ("login", "register"):
+        return request.form.get("email", "").strip().lower() or None
+    user_id = current_user_id()
+    return str(user_id) if user_id is not None else None
+
+
+@routes.before_app_request
+def enforce_rate_limits() -> None:
+    """Take the request's tokens and an in-flight slot, or raise RateLimited / Overloaded."""
+    limits = RATE_LIMITS.get(request.endpoint)
+    limiter = current_app.extensions.get("rate_limiter")
+    if limits is None or limiter is None or request.method != "POST":
+        return
+    try:
+        for scope, identity in (("ip", request.remote_addr), ("account", rate_limit_account())):
+            if limits[scope] is None or not identity:
+                continue
+            # Hashed, so the limiter file holds no emails or addresses
+            key = hashlib.sha256(f"{request.endpoint}:{scope}:{identity}".encode()).hexdigest()[:32]
+            retry_after = limiter.take(key, limits[scope])
+            if retry_after:
+                rate_limited_requests.inc(request.endpoint, scope)
+                raise RateLimited(scope, retry_after)
+        if RATE_LIMIT_MAX_IN_FLIGHT:
+            limiter.acquire_slot(RATE_LIMIT_MAX_IN_FLIGHT)
+            g.rate_limit_slot = True
+    except Overloaded:
+        shed_requests.inc(request.endpoint)
+        raise
+    except sqlite3.Error as exc:
+        # A broken limiter must not take sign-in down with it
+        current_app.logger.warning("Rate limiter unavailable, request allowed: %s", exc)
+
+
+@routes.teardown_app_request
+def release_rate_limit_slot(exc) -> None:
+    """Give back the in-flight slot taken by enforce_rate_limits."""
+    if g.pop("rate_limit_slot", False):
+        try:
+            current_app.extensions["rate_limiter"].release_slot()
+        except sqlite3.Error as error:
+            current_app.logger.warning("Could not release a rate limiter slot: %s", error)
+
+
+def limited_response(message: str, status: int, retry_after: float):
+    """Build a 429/503 reply: JSON for fetch, the re-rendered form for login/register, else text."""
+    headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+    if request.headers.get("X-Requested-With") == "fetch":
+        return jsonify({"ok": False, "error": message}), status, headers
+    if request.endpoint in ("login", "register"):
+        return render_template(f"{request.endpoint}.html", error=message), status, headers
+    return message, status, headers
+
+
+@routes.app_errorhandler(RateLimited)
+def rate_limited(exc):
+    """Answer 429 when a rate limit bucket is empty."""
+    return limited_response("Too many attempts. Please wait a moment and try again.", 429, exc.retry_after)
+
+
+@routes.app_errorhandler(Overloaded)
+def overloaded(exc):
+    """Answer 503 when the in-flight cap is reached."""
+    return limited_response("We're very busy right now. Please try again in a moment.", 503, 1)
+
+
+LOCK_ERROR_MARKERS = ("database is locked", "database table is locked", "lock timeout", "lock wait timeout", "deadlock")
+
+
+def is_lock_error(exc: OperationalError) -> bool:
+    """Return True if ``exc`` is a lock wait that gave up (SQLite busy timeout, server lock timeout or deadlock)."""
+    message = str(exc.orig or exc).lower()
+    return any(marker in message for marker in LOCK_ERROR_MARKERS)
 
-mail = Mail(app)
+
+@routes.app_errorhandler(OperationalError)
+def database_locked(exc):
+    """
+    Answer 503 with Retry-After when a write could not get its lock in time.
+
+    The transaction was rolled back as a whole, so the client can repeat the
+    request. Any other OperationalError is a server error.
+    """
+    if not is_lock_error(exc):
+        raise exc
+    db.session.rollback()
+    return limited_response("The database is busy. Please try again in a moment.", 503, 1)
 
 # ----------------------
 # Database models
@@ -88,10 +550,12 @@ class User(db.Model):
         mobile: Mobile phone number (string).
         gender: Gender string.
         password_hash: Hashed password (never store plaintext).
-        wallet_balance: Float wallet balance in local currency units.
+        legacy_wallet_balance: Pre-ledger float balance, only read once to
+            open the user's ledger (see migrate_wallets).
         profile_pic: Filename for uploaded profile picture (optional).
         purchases: Relationship to Purchase records.
         transactions: Relationship to Transaction records.
+        wallet: Balance snapshot maintained from the wallet ledger.
     """
 
     __tablename__ = "users"
@@ -102,19 +566,25 @@ class User(db.Model):
     mobile = db.Column(db.String(50), nullable=True)
     gender = db.Column(db.String(20), nullable=True)
     password_hash = db.Column(db.String(200), nullable=False)
-    wallet_balance = db.Column(db.Float, default=0.0)
+    legacy_wallet_balance = db.Column("wallet_balance", db.Float, default=0.0)
     profile_pic = db.Column(db.String(300), nullable=True)
 
     purchases = db.relationship("Purchase", backref="user", lazy=True)
     transactions = db.relationship("Transaction", backref="user", lazy=True)
+    wallet = db.relationship("WalletBalance", uselist=False, lazy="joined", cascade="all, delete-orphan")
+
+    @property
+    def wallet_balance(self) -> float:
+        """Wallet balance in GHS, read from the ledger snapshot."""
+        return self.wallet.balance_minor / 100 if self.wallet else 0.0
 
     def set_password(self, password: str) -> None:
         """Hash and set the user's password."""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
         """Return True if the provided password matches the stored hash."""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
     def __repr__(self) -> str:
         return f"<User {self.email}>"
@@ -131,11 +601,28 @@ class Purchase(db.Model):
         number: Recipient phone number.
         amount: Amount charged for this purchase.
         created_at: Timestamp of creation (UTC).
-        status: Status string (payment_completed, credited, etc.).
+        status: Status string (payment_completed, fulfilling, credited,
+            refunded, etc.).
         user_id: Foreign key to the User who made the purchase.
+        idempotency_key: Client-supplied key; a retried request with the same
+            key returns this purchase instead of charging the wallet again.
+        idempotency_fingerprint: Hash of what the keyed request asked for, so
+            a reused key with a different order is refused, not replayed.
+        bundle_id: Catalog Bundle that was bought (None for legacy rows).
+        attempts: Delivery attempts made by the fulfillment engine.
+        next_attempt_at: While fulfilling, when the claim lapses or the next
+            retry is due.
+        provider_reference: The network provider's id for the delivery.
+        last_error: Why the latest delivery attempt failed.
     """
 
     __tablename__ = "purchases"
+    __table_args__ = (
+        db.Index("ix_purchases_user_idempotency", "user_id", "idempotency_key", unique=True),
+        db.Index("ix_purchases_status_id", "status", "id"),
+        db.Index("ix_purchases_user_created", "user_id", "created_at"),
+        db.Index("ix_purchases_status_provider_id", "status", "provider", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     provider = db.Column(db.String(100), nullable=True)
@@ -145,11 +632,31 @@ class Purchase(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(50), default="payment_completed")
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    idempotency_key = db.Column(db.String(64), nullable=True)
+    idempotency_fingerprint = db.Column(db.String(64), nullable=True)
+    bundle_id = db.Column(db.Integer, db.ForeignKey("bundles.id"), nullable=True)
+    attempts = db.Column(db.Integer, nullable=True, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    provider_reference = db.Column(db.String(100), nullable=True)
+    last_error = db.Column(db.String(300), nullable=True)
 
     def created_at_str(self) -> str:
         """Return a formatted timestamp string for templates."""
         return self.created_at.strftime("%Y-%m-%d %H:%M:%S")
 
+    def to_dict(self) -> dict:
+        """Return a JSON-serializable representation for the admin API."""
+        return {
+            "id": self.id,
+            "user": self.user.username,
+            "provider": self.provider,
+            "bundle": self.bundle,
+            "number": self.number,
+            "amount": self.amount,
+            "status": self.status,
+            "created_at": self.created_at_str(),
+        }
+
 
 class PendingPayment(db.Model):
     """
@@ -173,7 +680,7 @@ class PendingPayment(db.Model):
     provider = db.Column(db.String(100), nullable=True)
     number = db.Column(db.String(50), nullable=True)
     reference = db.Column(db.String(200), nullable=False, unique=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 
 class Transaction(db.Model):
@@ -185,13 +692,15 @@ class Transaction(db.Model):
         amount: Amount credited.
         provider: Provider used (for reference).
         number: Phone number recorded.
-        reference: External reference (Paystack).
+        reference: External reference (Paystack); unique, so a payment can
+            only ever be credited once.
         status: Status string (e.g., success).
         at: Timestamp of completion.
         user_id: ForeignKey to User.
     """
 
     __tablename__ = "transactions"
+    __table_args__ = (db.Index("ix_transactions_reference", "reference", unique=True),)
 
     id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)
@@ -207,271 +716,2202 @@ class Transaction(db.Model):
         return self.at.strftime("%Y-%m-%d %H:%M:%S")
 
 
-# Create tables if they don't exist
-with app.app_context():
-    db.create_all()
+class LedgerEntry(db.Model):
+    """
+    Append-only record of one wallet money movement, in pesewas.
 
+    Rows are never updated or deleted; the balance is the sum of a user's
+    entries (kept pre-computed in WalletBalance).
 
-# ----------------------
-# Helper utilities
-# ----------------------
-def allowed_file(filename: str) -> bool:
+    Attributes:
+        id: Primary key; increases with time.
+        user_id: Wallet owner.
+        amount_minor: Signed amount in pesewas (credits > 0, debits < 0).
+        kind: opening, topup, purchase, refund or adjustment.
+        reference: Unique source of the movement (e.g. 'purchase:42',
+            'paystack:<ref>'), so one event cannot be posted twice.
+        created_at: Timestamp of posting.
     """
-    Determine whether the uploaded filename has an allowed extension.
 
-    Args:
-        filename: Uploaded filename.
+    __tablename__ = "wallet_ledger"
+    __table_args__ = (
+        db.Index("ix_wallet_ledger_user_id", "user_id", "id"),
+        db.Index("ix_wallet_ledger_reference", "reference", unique=True),
+    )
 
-    Returns:
-        True if extension is allowed, otherwise False.
-    """
-    if not filename:
-        return False
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    amount_minor = db.Column(db.BigInteger, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    reference = db.Column(db.String(220), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
-def now_str() -> str:
+class WalletBalance(db.Model):
     """
-    Return the current UTC time as a formatted string.
+    Snapshot of a user's ledger sum, updated with every posted entry.
 
-    Returns:
-        formatted timestamp string.
+    Attributes:
+        user_id: Wallet owner (primary key).
+        balance_minor: Current balance in pesewas.
+        last_entry_id: Highest ledger entry included in the balance.
+        updated_at: Timestamp of the last change.
     """
-    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
+    __tablename__ = "wallet_balances"
 
-def current_user() -> Optional[User]:
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    balance_minor = db.Column(db.BigInteger, nullable=False, default=0)
+    last_entry_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+@event.listens_for(User, "after_insert")
+def open_wallet(mapper, connection, target: User) -> None:
+    """Give every new user an empty balance snapshot in the same transaction."""
+    connection.execute(db.insert(WalletBalance).values(user_id=target.id, balance_minor=0, last_entry_id=0))
+
+
+class Bundle(db.Model):
     """
-    Return the currently logged-in user (or None).
+    A data bundle offered for sale, keyed by (provider, size).
 
-    Uses session['email'] to look up the user in the DB.
+    Attributes:
+        id: Primary key (sent by clients when purchasing).
+        provider: Network/provider name (e.g., MTN).
+        size_mb: Bundle size in megabytes.
+        price: Selling price in GHS.
+        active: Inactive bundles are hidden and cannot be bought.
+        updated_at: Timestamp of the last change.
     """
-    email = session.get("email")
-    if not email:
-        return None
-    return User.query.filter_by(email=email).first()
 
+    __tablename__ = "bundles"
+    __table_args__ = (db.UniqueConstraint("provider", "size_mb", name="uq_bundles_provider_size"),)
 
-# ----------------------
-# Routes (public)
-# ----------------------
-@app.route("/")
-def home():
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(100), nullable=False)
+    size_mb = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CatalogVersion(db.Model):
     """
-    Landing page.
+    Single-row counter bumped on every catalog change.
 
-    Renders the landing page template with the current year.
+    Workers compare it with the version of their in-memory price index and
+    reload the index when it has moved on.
     """
-    return render_template("landing.html", current_year=datetime.utcnow().year)
 
+    __tablename__ = "catalog_version"
 
-@app.route("/register", methods=("GET", "POST"))
-def register():
-    """
-    Handle user registration.
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
 
-    Validates form input, prevents duplicate emails, hashes the password,
-    and creates a new User record.
+
+class StoredUpload(db.Model):
     """
-    if request.method == "POST":
-        username = request.form.get("username", "").strip()
-        email = request.form.get("email", "").strip().lower()
-        mobile = request.form.get("mobile", "").strip()
-        gender = request.form.get("gender", "").strip()
-        password = request.form.get("password", "")
-        confirm_password = request.form.get("confirm_password", "")
+    A content-addressed file in UPLOAD_FOLDER, stored once however many users use it.
 
-        # Validate passwords match
-        if password != confirm_password:
-            return render_template("register.html", error="Passwords do not match")
+    Attributes:
+        name: "<sha256>.<ext>", the file name on disk and in User.profile_pic.
+        size: Size in bytes.
+        refcount: Number of users referencing the file; at zero it is removed.
+        created_at: Timestamp of the first upload.
+    """
 
-        # Prevent duplicate emails
-        if User.query.filter_by(email=email).first():
-            return render_template("register.html", error="Email already registered")
+    __tablename__ = "uploads"
 
-        # Create user with hashed password
-        user = User(username=username, email=email, mobile=mobile, gender=gender)
-        user.set_password(password)
-        db.session.add(user)
-        db.session.commit()
+    name = db.Column(db.String(80), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-        return redirect(url_for("login"))
 
-    return render_template("register.html")
+class SalesDaily(db.Model):
+    """
+    Daily sales rollup, kept in step with purchases by the code that writes them.
 
+    One row per (day, provider, bundle, status); status changes move counts
+    between rows. Analytics read only this table.
 
-@app.route("/login", methods=("GET", "POST"))
-def login():
+    Attributes:
+        day: UTC date of the purchase.
+        provider: Network/provider name.
+        bundle: Bundle label.
+        status: Purchase status.
+        purchases: Number of purchases.
+        amount_minor: Their total amount in pesewas.
     """
-    Authenticate user and create a session.
 
-    Passwords are validated against a secure hash.
+    __tablename__ = "sales_daily"
+
+    day = db.Column(db.Date, primary_key=True)
+    provider = db.Column(db.String(100), primary_key=True)
+    bundle = db.Column(db.String(200), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    purchases = db.Column(db.Integer, nullable=False, default=0)
+    amount_minor = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class ImportCheckpoint(db.Model):
     """
-    error = None
-    if request.method == "POST":
-        email = request.form.get("email", "").strip().lower()
-        password = request.form.get("password", "")
+    Progress of a `flask import-data` run, committed with each batch.
 
-        user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
-            # Store minimal info in session
-            session["email"] = user.email
-            session["username"] = user.username
-            return redirect(url_for("dashboard"))
+    Attributes:
+        source: "<kind>:<absolute path>:<size>", so a changed file starts over.
+        rows_done: Input records fully processed (inserted or skipped).
+        updated_at: Timestamp of the last committed batch.
+        finished_at: Set when the whole file was processed.
+    """
 
-        error = "Invalid email or password"
+    __tablename__ = "import_checkpoints"
 
-    return render_template("login.html", error=error)
+    source = db.Column(db.String(600), primary_key=True)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
 
 
-@app.route("/dashboard")
-def dashboard():
+class PurchaseTransition(db.Model):
     """
-    User dashboard showing purchases and wallet balance.
+    One status change of a purchase, kept after the purchase is deleted.
 
-    Redirects to login for anonymous users.
+    Attributes:
+        id: Primary key.
+        purchase_id: The purchase (not a foreign key, so history survives deletion).
+        from_status: Previous status (None when the purchase was created).
+        to_status: New status ("deleted" for deletions). Equal to from_status
+            for failed delivery attempts that will be retried.
+        actor: Who made the change: "customer", "admin" or "fulfillment".
+        detail: Provider reference or error, if any.
+        created_at: When it happened (UTC).
     """
-    user = current_user()
-    if not user:
-        return redirect(url_for("login"))
 
-    purchases = Purchase.query.filter_by(user_id=user.id).order_by(
-        Purchase.created_at.desc()
-    ).all()
-    return render_template(
-        "dashboard.html", username=user.username, purchases=purchases, balance=user.wallet_balance
-    )
+    __tablename__ = "purchase_transitions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    purchase_id = db.Column(db.Integer, nullable=False, index=True)
+    from_status = db.Column(db.String(50), nullable=True)
+    to_status = db.Column(db.String(50), nullable=False)
+    actor = db.Column(db.String(20), nullable=False)
+    detail = db.Column(db.String(300), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 
-@app.route("/purchase", methods=("GET", "POST"))
-def purchase():
+class SchemaMigration(db.Model):
     """
-    Handle bundle purchase requests.
+    A schema migration applied to this database (see `flask migrate`).
 
-    - Validates bundle price
-    - Ensures sufficient wallet balance
-    - Creates a Purchase record and deducts the user's wallet
+    Attributes:
+        version: Migration number.
+        name: Short description.
+        applied_at: When it ran.
     """
-    user = current_user()
-    if not user:
-        return redirect(url_for("login"))
 
-    if request.method == "POST":
-        network = request.form.get("network", "").strip()
-        bundle = request.form.get("bundle", "").strip()
-        mobile = request.form.get("mobile", "").strip()
+    __tablename__ = "schema_migrations"
 
-        # Parse price from bundle string like "1 GB - 5.40 GHS"
-        try:
-            price_part = bundle.split("-", 1)[1]  # everything after the first dash
-            price_str = price_part.replace("GHS", "").strip()
-            amount = float(price_str)
-        except (IndexError, ValueError):
-            return jsonify({"error": "Invalid bundle format."}), 400
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False)
 
-        if user.wallet_balance < amount:
-            return jsonify({"error": "Insufficient wallet balance", "balance": float(user.wallet_balance)}), 400
 
-        # Deduct wallet and create purchase
-        user.wallet_balance = round(user.wallet_balance - amount, 2)
-        purchase = Purchase(
-            provider=network,
-            bundle=bundle,
-            number=mobile,
-            amount=amount,
-            created_at=datetime.utcnow(),
-            status="payment_completed",
-            user_id=user.id,
-        )
-        db.session.add(purchase)
-        db.session.commit()
+class OutboxMessage(db.Model):
+    """
+    Outgoing email waiting to be delivered by the background sender.
 
-        # AJAX/fetch support
-        if request.headers.get("X-Requested-With") == "fetch":
-            return jsonify({"ok": True, "id": purchase.id})
+    Attributes:
+        id: Primary key.
+        subject: Message subject.
+        recipients: Comma-separated recipient addresses.
+        body: Plain-text body.
+        reply_to: Optional Reply-To address.
+        status: queued, sending (claimed by a sender), sent or failed.
+        attempts: Delivery attempts so far.
+        next_attempt_at: When the message is next due (also the claim lease).
+        last_error: Error from the most recent failed attempt.
+        created_at: Timestamp of queuing.
+        sent_at: Timestamp of delivery.
+    """
 
-        return redirect(url_for("dashboard"))
+    __tablename__ = "mail_outbox"
+    __table_args__ = (db.Index("ix_mail_outbox_status_due", "status", "next_attempt_at"),)
 
-    # GET
-    return render_template("purchase.html", username=user.username, balance=user.wallet_balance)
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(300), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    reply_to = db.Column(db.String(150), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
 
 
-@app.route("/faq")
-def faq():
-    """Render FAQ page."""
-    return render_template("FAQ.html")
+def create_tables(*models) -> None:
+    """Create the tables of ``models`` that do not exist yet."""
+    for model in models:
+        model.__table__.create(db.engine, checkfirst=True)
 
 
-@app.route("/landing")
-def landing():
-    """Render landing page (alternate route)."""
-    return render_template("landing.html")
+def add_missing_columns(*models) -> None:
+    """
+    Add model columns (and indexes) missing from tables created by older releases.
 
+    New columns must be nullable (SQLite cannot add a NOT NULL column
+    without a default). Safe to repeat, like every migration step.
+    """
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for model in models:
+            table = model.__table__
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=conn.dialect)
+                    conn.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+# Catalog shipped with the app; seeded into an empty bundles table.
+DEFAULT_BUNDLES = {
+    "MTN": [
+        (1, 5.40), (2, 10.50), (3, 14.50), (4, 19.50), (5, 24.70), (6, 29.70), (8, 37.00),
+        (10, 47.50), (15, 68.50), (20, 88.00), (25, 113.00), (30, 131.00), (40, 168.00), (50, 197.00),
+    ],
+    "Vodafone": [
+        (1, 4.90), (2, 9.50), (3, 13.00), (4, 17.50), (5, 22.00), (6, 26.00), (8, 34.00),
+        (10, 44.00), (15, 64.00), (20, 84.00), (25, 108.00), (30, 126.00), (40, 160.00), (50, 190.00),
+    ],
+    "AirtelTigo": [
+        (1, 5.00), (2, 10.00), (3, 14.00), (4, 19.00), (5, 24.00), (6, 28.00), (8, 36.00),
+        (10, 46.00), (15, 67.00), (20, 86.00), (25, 110.00), (30, 128.00), (40, 165.00), (50, 194.00),
+    ],
+}
+
+
+def seed_bundles() -> None:
+    """Populate the bundle catalog from DEFAULT_BUNDLES if it is empty."""
+    if not db.session.get(CatalogVersion, 1):
+        db.session.add(CatalogVersion(id=1, version=1))
+    if Bundle.query.first() is None:
+        for provider, sizes in DEFAULT_BUNDLES.items():
+            for size_gb, price in sizes:
+                db.session.add(Bundle(provider=provider, size_mb=size_gb * 1024, price=price))
+    db.session.commit()
 
 
-# ---------------- Contact Route ---------------- #
-@app.route("/contact", methods=["GET", "POST"])
-def contact():
-    if request.method == "POST":
-        name = request.form.get("name")
-        email = request.form.get("email")
-        message_body = request.form.get("message")
+def migrate_wallets() -> None:
+    """
+    Open a ledger for users created before the wallet ledger existed.
 
-        # Build the email message
-        msg = Message(
-            subject=f"New Contact Message from {name}",
-            recipients=["your_email@gmail.com"],  # replace with where you want to receive messages
-            body=f"From: {name} <{email}>\n\nMessage:\n{message_body}"
+    Each such user gets an 'opening' entry for their legacy float balance
+    (rounded to pesewas) and a matching snapshot, in set-based statements.
+    """
+    missing = db.select(WalletBalance.user_id)
+    db.session.execute(
+        db.insert(LedgerEntry).from_select(
+            ["user_id", "amount_minor", "kind", "reference", "created_at"],
+            db.select(
+                User.id,
+                db.cast(db.func.round(db.func.coalesce(User.legacy_wallet_balance, 0) * 100), db.BigInteger),
+                db.literal("opening"),
+                db.literal("opening:") + db.cast(User.id, db.String),
+                db.literal(datetime.utcnow()),
+            ).where(User.id.not_in(missing)),
         )
-        try:
-            mail.send(msg)
-            flash("✅ Your message has been sent successfully!", "success")
-        except Exception as e:
-            flash("❌ Failed to send your message. Please try again later.", "danger")
-            print("Mail error:", e)
+    )
+    db.session.execute(
+        db.insert(WalletBalance).from_select(
+            ["user_id", "balance_minor", "last_entry_id"],
+            db.select(LedgerEntry.user_id, LedgerEntry.amount_minor, LedgerEntry.id).where(
+                LedgerEntry.kind == "opening", LedgerEntry.user_id.not_in(missing)
+            ),
+        )
+    )
+    db.session.commit()
 
-        return redirect(url_for("contact"))
 
-    return render_template("contact.html")
+def sales_rollup_key(created_at: Optional[datetime], provider: Optional[str], bundle: str, status: Optional[str]) -> tuple:
+    """Return the SalesDaily key for a purchase (missing values become "")."""
+    return ((created_at or datetime.utcnow()).date(), provider or "", bundle or "", status or "")
 
 
-# ----------------------
-# Admin routes
-# ----------------------
-@app.route("/admin")
-def admin_panel():
+def apply_sales_deltas(deltas: Dict[tuple, list]) -> None:
     """
-    Admin panel that lists all purchases.
+    Add purchase-count and amount deltas to the daily rollup; the caller commits.
 
-    NOTE: This route has no authentication. In production add admin auth!
+    Args:
+        deltas: sales_rollup_key -> [purchases delta, amount_minor delta].
     """
-    purchases = Purchase.query.order_by(Purchase.id.desc()).all()
-    return render_template("admin.html", purchases=purchases)
+    for (day, provider, bundle, status), (count, amount_minor) in deltas.items():
+        if not count and not amount_minor:
+            continue
+        key = (
+            SalesDaily.day == day, SalesDaily.provider == provider,
+            SalesDaily.bundle == bundle, SalesDaily.status == status,
+        )
+        update = (
+            db.update(SalesDaily).where(*key)
+            .values(purchases=SalesDaily.purchases + count, amount_minor=SalesDaily.amount_minor + amount_minor)
+            .execution_options(synchronize_session=False)
+        )
+        if db.session.execute(update).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(SalesDaily).values(
+                    day=day, provider=provider, bundle=bundle, status=status,
+                    purchases=count, amount_minor=amount_minor,
+                ))
+        except IntegrityError:
+            # Another transaction created the row first
+            db.session.execute(update)
 
 
-@app.route("/admin/confirm/<int:pid>", methods=("POST",))
-def admin_confirm(pid: int):
+def add_sales_delta(deltas: Dict[tuple, list], key: tuple, amount: float, sign: int = 1) -> None:
+    """Accumulate one purchase (sign=1) or its removal (sign=-1) into ``deltas``."""
+    entry = deltas.setdefault(key, [0, 0])
+    entry[0] += sign
+    entry[1] += sign * to_minor(amount)
+
+
+def record_transitions(transitions: list) -> None:
     """
-    Admin endpoint to mark a purchase as 'credited'.
+    Append purchase status changes to the transition log; the caller commits.
 
-    Accepts POST only. Returns JSON for AJAX or redirect for browser.
+    Args:
+        transitions: Dicts with purchase_id, from_status, to_status, actor
+            and optionally detail.
     """
-    purchase = Purchase.query.get(pid)
-    if not purchase:
-        return jsonify({"error": "Purchase not found"}), 404
+    if transitions:
+        now = datetime.utcnow()
+        db.session.execute(
+            db.insert(PurchaseTransition),
+            [{"detail": None, "created_at": now, **transition} for transition in transitions],
+        )
 
-    purchase.status = "credited"
-    db.session.commit()
 
-    if request.headers.get("X-Requested-With") == "fetch":
-        return jsonify({"ok": True})
-    return redirect(url_for("admin_panel"))
+def rebuild_sales_rollups(check_only: bool = False) -> Dict[str, int]:
+    """
+    Recompute the daily rollup from the purchases table in one GROUP BY.
 
+    Used for the initial backfill and to verify or repair drift. The rebuild
+    replaces the table in a single transaction.
 
+    Args:
+        check_only: Only count rows that differ.
+
+    Returns:
+        Counts of rollup rows expected, mismatched and written.
+    """
+    day = db.func.date(Purchase.created_at)
+    fresh = db.select(
+        day.label("day"),
+        db.func.coalesce(Purchase.provider, "").label("provider"),
+        db.func.coalesce(Purchase.bundle, "").label("bundle"),
+        db.func.coalesce(Purchase.status, "").label("status"),
+        db.func.count().label("purchases"),
+        db.func.sum(db.cast(db.func.round(Purchase.amount * 100), db.BigInteger)).label("amount_minor"),
+    ).group_by(day, Purchase.provider, Purchase.bundle, Purchase.status)
+
+    expected = {
+        (str(r.day), r.provider, r.bundle, r.status): (r.purchases, r.amount_minor)
+        for r in db.session.execute(fresh)
+    }
+    stored = {
+        (str(r.day), r.provider, r.bundle, r.status): (r.purchases, r.amount_minor)
+        for r in db.session.execute(db.select(SalesDaily)).scalars()
+        if r.purchases or r.amount_minor
+    }
+    mismatched = len(set(expected.items()) ^ set(stored.items()))
+    counts = {"expected": len(expected), "mismatched": mismatched, "written": 0}
+    if check_only or not mismatched:
+        return counts
+
+    db.session.execute(db.delete(SalesDaily).execution_options(synchronize_session=False))
+    db.session.execute(
+        db.insert(SalesDaily).from_select(
+            ["day", "provider", "bundle", "status", "purchases", "amount_minor"], fresh
+        )
+    )
+    db.session.commit()
+    counts["written"] = len(expected)
+    return counts
+
+
+def backfill_sales_rollups() -> None:
+    """Build the rollup once for databases that have purchases but no rollup yet."""
+    has_rollup = db.session.execute(db.select(SalesDaily.day).limit(1)).first() is not None
+    if not has_rollup and db.session.execute(db.select(Purchase.id).limit(1)).first() is not None:
+        rebuild_sales_rollups()
+
+
+# ----------------------
+# Schema migrations
+# ----------------------
+# The schema is changed only by `flask migrate` (run once per deploy), never
+# when a worker starts. Migrations run in version order and each is recorded
+# in schema_migrations; new ones get the next version number. Every step
+# must be safe to repeat, because version 1 brings databases of any older
+# release up to date as well as creating new ones.
+MIGRATIONS: Dict[int, tuple] = {}
+
+
+def migration(version: int, name: str):
+    """Register a migration function under ``version``."""
+
+    def register(func):
+        if version in MIGRATIONS:
+            raise RuntimeError(f"Duplicate migration version {version}")
+        MIGRATIONS[version] = (name, func)
+        return func
+
+    return register
+
+
+@migration(1, "baseline")
+def migrate_baseline() -> None:
+    """Tables up to the sales rollups, plus the data fixes older releases ran on every start."""
+    models = (
+        User, Purchase, PendingPayment, Transaction, LedgerEntry, WalletBalance, Bundle, CatalogVersion,
+        StoredUpload, SalesDaily, ImportCheckpoint, OutboxMessage,
+    )
+    create_tables(*models)
+    add_missing_columns(*models)
+    seed_bundles()
+    migrate_wallets()
+    backfill_sales_rollups()
+
+
+@migration(2, "purchase fulfillment")
+def migrate_purchase_fulfillment() -> None:
+    """Delivery columns and claim index on purchases; the status transition log."""
+    add_missing_columns(Purchase)
+    create_tables(PurchaseTransition)
+
+
+# Full-text indexes for the admin search (SQLite FTS5). The rowid of each
+# index row is the id of the row it indexes; triggers keep them in step with
+# every write, bulk imports included. '-_@.+' count as word characters, so
+# emails, references and numbers stay one prefix-searchable token each.
+# Prefixes of 2-10 characters are indexed as terms of their own. Without
+# them a prefix query merges the postings of every matching term: thousands
+# of numbers for "02412", or every AirtelTigo purchase for "airteltigo",
+# at about 100 ms per million rows. Longer tokens are near-unique (numbers,
+# emails, references). detail=none drops positions, which prefix matching
+# never uses, and keeps the index smaller than with prefix='3' alone.
+SEARCH_TOKENIZER = "unicode61 remove_diacritics 2 tokenchars '-_@.+'"
+SEARCH_INDEX_OPTIONS = f"""tokenize = "{SEARCH_TOKENIZER}", prefix = '2 3 4 5 6 7 8 9 10', detail = none"""
+SEARCH_INDEX_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS purchases_fts USING fts5(
+        number, bundle, provider, username, email, {SEARCH_INDEX_OPTIONS})""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        username, email, mobile, {SEARCH_INDEX_OPTIONS})""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        reference, number, provider, {SEARCH_INDEX_OPTIONS})""",
+    # Purchases, with the owner's name and email; status changes do not touch the index
+    """CREATE TRIGGER IF NOT EXISTS purchases_fts_insert AFTER INSERT ON purchases BEGIN
+        INSERT INTO purchases_fts (rowid, number, bundle, provider, username, email)
+        SELECT NEW.id, NEW.number, NEW.bundle, NEW.provider, u.username, u.email
+        FROM (SELECT 1) LEFT JOIN users u ON u.id = NEW.user_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS purchases_fts_update
+    AFTER UPDATE OF number, bundle, provider, user_id ON purchases BEGIN
+        DELETE FROM purchases_fts WHERE rowid = OLD.id;
+        INSERT INTO purchases_fts (rowid, number, bundle, provider, username, email)
+        SELECT NEW.id, NEW.number, NEW.bundle, NEW.provider, u.username, u.email
+        FROM (SELECT 1) LEFT JOIN users u ON u.id = NEW.user_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS purchases_fts_delete AFTER DELETE ON purchases BEGIN
+        DELETE FROM purchases_fts WHERE rowid = OLD.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts (rowid, username, email, mobile) VALUES (NEW.id, NEW.username, NEW.email, NEW.mobile);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF username, email, mobile ON users BEGIN
+        DELETE FROM users_fts WHERE rowid = OLD.id;
+        INSERT INTO users_fts (rowid, username, email, mobile) VALUES (NEW.id, NEW.username, NEW.email, NEW.mobile);
+        UPDATE purchases_fts SET username = NEW.username, email = NEW.email
+        WHERE rowid IN (SELECT id FROM purchases WHERE user_id = NEW.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        DELETE FROM users_fts WHERE rowid = OLD.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts (rowid, reference, number, provider)
+        VALUES (NEW.id, NEW.reference, NEW.number, NEW.provider);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+    AFTER UPDATE OF reference, number, provider ON transactions BEGIN
+        DELETE FROM transactions_fts WHERE rowid = OLD.id;
+        INSERT INTO transactions_fts (rowid, reference, number, provider)
+        VALUES (NEW.id, NEW.reference, NEW.number, NEW.provider);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        DELETE FROM transactions_fts WHERE rowid = OLD.id;
+    END""",
+)
+SEARCH_INDEX_BACKFILL = (
+    """INSERT INTO purchases_fts (rowid, number, bundle, provider, username, email)
+    SELECT p.id, p.number, p.bundle, p.provider, u.username, u.email
+    FROM purchases p LEFT JOIN users u ON u.id = p.user_id""",
+    "INSERT INTO users_fts (rowid, username, email, mobile) SELECT id, username, email, mobile FROM users",
+    """INSERT INTO transactions_fts (rowid, reference, number, provider)
+    SELECT id, reference, number, provider FROM transactions""",
+)
+
+
+def search_index_enabled() -> bool:
+    """True if the database has the FTS5 search indexes (SQLite only)."""
+    return db.engine.dialect.name == "sqlite"
+
+
+@migration(3, "admin search index")
+def migrate_search_index() -> None:
+    """FTS5 indexes over purchases, users and transactions, their sync triggers and the initial fill."""
+    if not search_index_enabled():
+        return  # other databases search with prefix LIKE (see admin_search)
+    with db.engine.begin() as conn:
+        for table in ("purchases_fts", "users_fts", "transactions_fts"):
+            conn.execute(db.text(f"DROP TABLE IF EXISTS {table}"))  # a rerun rebuilds from scratch
+        for statement in SEARCH_INDEX_DDL:
+            conn.execute(db.text(statement))
+        for statement in SEARCH_INDEX_BACKFILL:
+            conn.execute(db.text(statement))
+        for table in ("purchases_fts", "users_fts", "transactions_fts"):
+            conn.execute(db.text(f"INSERT INTO {table} ({table}) VALUES ('optimize')"))
+
+
+@migration(4, "idempotency fingerprint")
+def migrate_idempotency_fingerprint() -> None:
+    """Fingerprint column for purchase idempotency keys (older rows are compared field by field)."""
+    add_missing_columns(Purchase)
+
+
+def applied_migrations() -> Dict[int, datetime]:
+    """Return version -> applied_at for the migrations this database has run."""
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    return dict(db.session.execute(db.select(SchemaMigration.version, SchemaMigration.applied_at)).all())
+
+
+def migrate(target: Optional[int] = None) -> list:
+    """
+    Apply pending migrations in order, each committed on its own.
+
+    Args:
+        target: Stop after this version (default: all).
+
+    Returns:
+        "version name" of each migration applied.
+    """
+    applied = applied_migrations()
+    done = []
+    for version in sorted(MIGRATIONS):
+        if version in applied or (target is not None and version > target):
+            continue
+        name, func = MIGRATIONS[version]
+        func()
+        db.session.add(SchemaMigration(version=version, name=name, applied_at=datetime.utcnow()))
+        db.session.commit()
+        done.append(f"{version} {name}")
+    return done
+
+
+# ----------------------
+# Static assets & compression
+# ----------------------
+# Fingerprinted, precompressed copies of static/ (see assets.py). Built once
+# at deploy time with `flask build-assets`; workers only load the manifest.
+# ASSETS_BUILD_ON_START=true rebuilds them in create_app() instead (local
+# development), which every worker would otherwise repeat on start.
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+ASSET_BUILD_FOLDER = os.path.join(STATIC_FOLDER, "dist")
+ASSETS_BUILD_ON_START = os.environ.get("ASSETS_BUILD_ON_START", "false").lower() == "true"
+
+# Dynamic HTML smaller than this is not worth compressing
+HTML_COMPRESS_MIN_BYTES = 500
+
+
+@routes.app_url_defaults
+def versioned_static_urls(endpoint: str, values: dict) -> None:
+    """Make url_for("static", filename=...) point at the fingerprinted copy."""
+    if endpoint == "static":
+        asset_manifest = current_app.extensions["asset_manifest"]
+        if values.get("filename") in asset_manifest:
+            values["filename"] = "dist/" + asset_manifest[values["filename"]]
+
+
+def serve_static(filename):
+    """
+    Static route: fingerprinted files are served precompressed and immutable.
+
+    Anything else (unbuilt files, direct links to old names) falls back to
+    Flask's default static handling.
+    """
+    if not filename.startswith("dist/"):
+        return current_app.send_static_file(filename)
+
+    name = filename[len("dist/"):]
+    path = safe_join(ASSET_BUILD_FOLDER, name)
+    encoding = pick_encoding(request.accept_encodings)
+    if path and encoding and os.path.exists(path + encoding[1]):
+        response = send_from_directory(
+            ASSET_BUILD_FOLDER, name + encoding[1], mimetype=mimetypes.guess_type(name)[0], max_age=31536000
+        )
+        response.headers["Content-Encoding"] = encoding[0]
+    else:
+        response = send_from_directory(ASSET_BUILD_FOLDER, name, max_age=31536000)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+
+@routes.after_app_request
+def compress_html(response):
+    """Compress rendered HTML for clients that accept gzip (or brotli)."""
+    if (
+        response.mimetype != "text/html"
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = pick_encoding(request.accept_encodings)
+    data = response.get_data()
+    if encoding and len(data) >= HTML_COMPRESS_MIN_BYTES:
+        response.set_data(compress_body(data, encoding[0]))
+        response.headers["Content-Encoding"] = encoding[0]
+    return response
+
+
+# ----------------------
+# Helper utilities
+# ----------------------
+def to_minor(amount: float) -> int:
+    """Convert a GHS amount to integer pesewas."""
+    return int(round(float(amount) * 100))
+
+
+def post_ledger_entry(
+    user_id: int, amount_minor: int, kind: str, reference: Optional[str] = None, require_funds: bool = False
+) -> bool:
+    """
+    Append a wallet ledger entry and apply it to the balance snapshot.
+
+    The entry insert and the snapshot UPDATE run in the caller's transaction;
+    the caller commits. With ``require_funds`` the UPDATE only matches if the
+    balance covers a debit, and False is returned otherwise; the caller must
+    then roll back (the entry was already added). A reused ``reference``
+    raises IntegrityError.
+
+    The snapshot UPDATE serialises money movements per user: two concurrent
+    movements on one wallet take turns on its WalletBalance row (different
+    users never wait on each other, and the users row is not written). This
+    is deliberate. A debit's funds check needs the latest balance, and
+    keeping the snapshot exact is what makes balance reads O(1).
+
+    Args:
+        user_id: Wallet owner.
+        amount_minor: Signed amount in pesewas.
+        kind: Entry kind (topup, purchase, refund, adjustment).
+        reference: Unique source of the movement.
+        require_funds: Refuse to take the balance below zero.
+
+    Returns:
+        True if the snapshot was updated.
+    """
+    entry_id = db.session.execute(
+        db.insert(LedgerEntry)
+        .values(user_id=user_id, amount_minor=amount_minor, kind=kind, reference=reference,
+                created_at=datetime.utcnow())
+        .returning(LedgerEntry.id)
+    ).scalar_one()
+
+    stmt = db.update(WalletBalance).where(WalletBalance.user_id == user_id)
+    if require_funds:
+        stmt = stmt.where(WalletBalance.balance_minor + amount_minor >= 0)
+    updated = db.session.execute(
+        stmt.values(
+            balance_minor=WalletBalance.balance_minor + amount_minor,
+            last_entry_id=db.case(
+                (WalletBalance.last_entry_id > entry_id, WalletBalance.last_entry_id), else_=entry_id
+            ),
+            updated_at=datetime.utcnow(),
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    return bool(updated)
+
+
+def wallet_balance_minor(user_id: int) -> int:
+    """Return a user's balance in pesewas from the snapshot (one primary-key read)."""
+    return db.session.execute(
+        db.select(WalletBalance.balance_minor).where(WalletBalance.user_id == user_id)
+    ).scalar() or 0
+
+
+def rebuild_wallet_balances(repair: bool = True, chunk_size: int = 1000) -> Dict[str, int]:
+    """
+    Verify every balance snapshot against the ledger in one streaming pass.
+
+    Per-user sums are streamed from the (user_id, id) index together with the
+    snapshot; memory stays constant however large the ledger is. Mismatched
+    snapshots are recomputed with one correlated UPDATE each, which is safe
+    while the app keeps posting entries.
+
+    Returns:
+        Counts of "checked", "mismatched" and "repaired" wallets.
+    """
+    counts = {"checked": 0, "mismatched": 0, "repaired": 0}
+    sums = (
+        db.select(LedgerEntry.user_id, db.func.sum(LedgerEntry.amount_minor).label("total"),
+                  WalletBalance.balance_minor)
+        .outerjoin(WalletBalance, WalletBalance.user_id == LedgerEntry.user_id)
+        .group_by(LedgerEntry.user_id, WalletBalance.balance_minor)
+        .order_by(LedgerEntry.user_id)
+    )
+    mismatched = []
+    with db.engine.connect() as conn:
+        for row in conn.execution_options(yield_per=chunk_size).execute(sums):
+            counts["checked"] += 1
+            if row.balance_minor != row.total:
+                counts["mismatched"] += 1
+                mismatched.append((row.user_id, row.balance_minor is None))
+
+    if repair:
+        for user_id, missing in mismatched:
+            if missing:
+                db.session.add(WalletBalance(user_id=user_id, balance_minor=0, last_entry_id=0))
+                db.session.flush()
+            ledger = db.select(LedgerEntry).where(LedgerEntry.user_id == user_id).subquery()
+            db.session.execute(
+                db.update(WalletBalance)
+                .where(WalletBalance.user_id == user_id)
+                .values(
+                    balance_minor=db.select(db.func.coalesce(db.func.sum(ledger.c.amount_minor), 0)).scalar_subquery(),
+                    last_entry_id=db.select(db.func.coalesce(db.func.max(ledger.c.id), 0)).scalar_subquery(),
+                    updated_at=datetime.utcnow(),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            counts["repaired"] += 1
+        db.session.commit()
+    return counts
+
+
+def read_only(view):
+    """
+    Mark a view as read-only so its queries use the "read" connection pool.
+
+    The view must not write to the database.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+@routes.teardown_app_request
+def end_read_only(exc) -> None:
+    """
+    Clear the read-only mark when the request ends (after any streamed body).
+
+    An app context can outlive one request (test clients, CLI commands run
+    inside it); writes made there must not go to the "read" pool.
+    """
+    g.pop("db_read_only", None)
+
+
+def allowed_file(filename: str) -> bool:
+    """
+    Determine whether the uploaded filename has an allowed extension.
+
+    Args:
+        filename: Uploaded filename.
+
+    Returns:
+        True if extension is allowed, otherwise False.
+    """
+    if not filename:
+        return False
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+# Leading bytes of each accepted image type -> stored extension
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload is too large or not an accepted image type."""
+
+
+def store_upload(stream) -> str:
+    """
+    Stream an uploaded image into content-addressed storage and take a reference.
+
+    The body is copied in chunks to a temporary file while being hashed. The
+    type is checked from the first chunk, and the size while copying, so a
+    bad upload is dropped without reading the rest. The file is then kept as
+    "<sha256>.<ext>"; identical uploads share one file. The caller commits.
+
+    Args:
+        stream: Readable binary stream (e.g. ``FileStorage.stream``).
+
+    Returns:
+        The stored name to save in User.profile_pic.
+
+    Raises:
+        UploadRejected: If the image type is not accepted or it exceeds UPLOAD_MAX_BYTES.
+    """
+    folder = current_app.config["UPLOAD_FOLDER"]
+    digest = hashlib.sha256()
+    size = 0
+    ext = None
+    tmp_path = os.path.join(folder, f".upload-{os.getpid()}-{threading.get_ident()}-{time.monotonic_ns()}")
+    try:
+        with open(tmp_path, "wb") as out:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if ext is None:
+                    ext = next((e for sig, e in IMAGE_SIGNATURES if chunk.startswith(sig)), None)
+                    if ext is None:
+                        raise UploadRejected("Profile pictures must be PNG, JPEG or GIF images")
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise UploadRejected(f"Profile pictures must be under {UPLOAD_MAX_BYTES // 1024} KB")
+                digest.update(chunk)
+                out.write(chunk)
+        if ext is None:
+            raise UploadRejected("The uploaded file is empty")
+
+        name = f"{digest.hexdigest()}.{ext}"
+        claimed = db.session.execute(
+            db.update(StoredUpload)
+            .where(StoredUpload.name == name)
+            .values(refcount=StoredUpload.refcount + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(StoredUpload(name=name, size=size, refcount=1))
+            except IntegrityError:
+                # Someone stored the same content concurrently
+                db.session.execute(
+                    db.update(StoredUpload)
+                    .where(StoredUpload.name == name)
+                    .values(refcount=StoredUpload.refcount + 1)
+                    .execution_options(synchronize_session=False)
+                )
+        # Identical bytes, so replacing an existing copy is harmless
+        os.replace(tmp_path, os.path.join(folder, name))
+        return name
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def release_upload(name: Optional[str]) -> Optional[str]:
+    """
+    Drop one reference to a stored upload. The caller commits.
+
+    Args:
+        name: Value of User.profile_pic (may be a pre-content-addressing filename).
+
+    Returns:
+        The name to pass to remove_unreferenced_upload() after commit, or None.
+    """
+    if not name:
+        return None
+    released = db.session.execute(
+        db.update(StoredUpload)
+        .where(StoredUpload.name == name)
+        .values(refcount=StoredUpload.refcount - 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if released:
+        db.session.execute(
+            db.delete(StoredUpload)
+            .where(StoredUpload.name == name, StoredUpload.refcount <= 0)
+            .execution_options(synchronize_session=False)
+        )
+    return name
+
+
+def remove_unreferenced_upload(name: Optional[str]) -> None:
+    """
+    Delete an upload's file once nothing references it. Call after commit.
+
+    Content-addressed files go when their uploads row is gone; older
+    per-filename uploads go when no user's profile_pic names them.
+    """
+    if not name:
+        return
+    if db.session.get(StoredUpload, name) or User.query.filter_by(profile_pic=name).first():
+        return
+    try:
+        os.remove(os.path.join(current_app.config["UPLOAD_FOLDER"], secure_filename(name)))
+    except FileNotFoundError:
+        pass
+
+
+def now_str() -> str:
+    """
+    Return the current UTC time as a formatted string.
+
+    Returns:
+        formatted timestamp string.
+    """
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class BundleEntry(NamedTuple):
+    """Immutable, session-independent snapshot of a catalog Bundle."""
+
+    id: int
+    provider: str
+    size_mb: int
+    price: float
+
+    @property
+    def size_label(self) -> str:
+        """Human-readable size, e.g. '1 GB' or '500 MB'."""
+        if self.size_mb % 1024 == 0:
+            return f"{self.size_mb // 1024} GB"
+        return f"{self.size_mb} MB"
+
+    @property
+    def label(self) -> str:
+        """Display string stored on purchases, e.g. '1 GB - 5.40 GHS'."""
+        return f"{self.size_label} - {self.price:.2f} GHS"
+
+
+class BundleCatalog:
+    """
+    Per-worker in-memory index of active bundles.
+
+    Lookups are dictionary hits. Each access compares the cached version with
+    the single-row CatalogVersion counter (a primary-key read) and rebuilds the
+    index only when another process has changed the catalog.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.version: Optional[int] = None
+        self.by_id: Dict[int, BundleEntry] = {}
+        self.by_label: Dict[Tuple[str, str], BundleEntry] = {}
+        self.payload: dict = {}
+
+    def refresh(self) -> "BundleCatalog":
+        """Reload the index if the stored catalog version has changed."""
+        version = db.session.execute(
+            db.select(CatalogVersion.version).where(CatalogVersion.id == 1)
+        ).scalar() or 0
+        if version == self.version:
+            return self
+
+        with self._lock:
+            if version == self.version:
+                return self
+            rows = db.session.execute(
+                db.select(Bundle.id, Bundle.provider, Bundle.size_mb, Bundle.price)
+                .where(Bundle.active.is_(True))
+                .order_by(Bundle.provider, Bundle.size_mb)
+            ).all()
+            entries = [BundleEntry(*row) for row in rows]
+
+            payload: Dict[str, list] = {}
+            for entry in entries:
+                payload.setdefault(entry.provider, []).append(
+                    {"id": entry.id, "size": entry.size_label, "price": entry.price, "label": entry.label}
+                )
+
+            self.by_id = {entry.id: entry for entry in entries}
+            self.by_label = {(entry.provider, entry.label): entry for entry in entries}
+            self.payload = {"version": version, "bundles": payload}
+            self.version = version
+        return self
+
+    def get(self, bundle_id: int) -> Optional[BundleEntry]:
+        """Return the active bundle with this id, or None."""
+        return self.refresh().by_id.get(bundle_id)
+
+    def find(self, provider: str, label: str) -> Optional[BundleEntry]:
+        """Return the active bundle matching a legacy display string, or None."""
+        return self.refresh().by_label.get((provider, label))
+
+
+bundle_catalog = BundleCatalog()
+
+
+def bump_catalog_version() -> None:
+    """Invalidate every worker's bundle index; commit with the catalog change."""
+    db.session.execute(
+        db.update(CatalogVersion).where(CatalogVersion.id == 1).values(version=CatalogVersion.version + 1)
+    )
+
+
+class UserProfile(NamedTuple):
+    """Cached, read-only copy of the user fields most pages display."""
+
+    id: int
+    username: str
+    email: str
+    wallet_balance: float
+    profile_pic: Optional[str]
+
+
+class ProfileCache:
+    """
+    Small per-process LRU of UserProfile snapshots with a TTL.
+
+    Writes in this process call invalidate() after committing; the TTL bounds
+    how long other workers can serve a value changed elsewhere. Snapshots are
+    for display only; money checks always go to the database.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 5.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[float, UserProfile]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[UserProfile]:
+        """Return a fresh cached profile, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            stored_at, profile = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return profile
+
+    def put(self, profile: UserProfile) -> None:
+        """Store a profile, evicting the least recently used entry when full."""
+        with self._lock:
+            self._entries[profile.id] = (time.monotonic(), profile)
+            self._entries.move_to_end(profile.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's cached profile (call after committing a change to it)."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+profile_cache = ProfileCache(
+    maxsize=int(os.environ.get("PROFILE_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("PROFILE_CACHE_TTL", "5")),
+)
+
+
+class CachedPage:
+    """
+    A rendered page kept by PageCache.
+
+    The identity body is hashed into a strong ETag; compressed variants are
+    made on first request for each encoding and get their own ETag suffix.
+    """
+
+    def __init__(self, body: bytes, mimetype: str, expires_at: float) -> None:
+        self.body = body
+        self.mimetype = mimetype
+        self.expires_at = expires_at
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.variants: Dict[str, bytes] = {}
+
+    def variant(self, encoding: Optional[str]) -> Tuple[bytes, str]:
+        """Return (body, etag) for a Content-Encoding, or the identity body for None."""
+        if encoding is None or len(self.body) < HTML_COMPRESS_MIN_BYTES:
+            return self.body, self.etag
+        if encoding not in self.variants:
+            self.variants[encoding] = compress_body(self.body, encoding)
+        return self.variants[encoding], f"{self.etag}-{encoding}"
+
+
+class PageCache:
+    """
+    Per-process LRU of rendered pages with a per-entry TTL.
+
+    Keys include the route, allow-listed query arguments and template
+    mtimes, so editing a template invalidates its pages without a restart.
+    Counters show how often pages are actually rendered.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, CachedPage]" = OrderedDict()
+        self.hits = 0
+        self.not_modified = 0
+        self.renders: Dict[str, int] = {}
+
+    def get(self, key: tuple) -> Optional[CachedPage]:
+        """Return a fresh cached page, or None on a miss."""
+        with self._lock:
+            page = self._entries.get(key)
+            if page is None:
+                return None
+            if time.monotonic() > page.expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key: tuple, page: CachedPage) -> None:
+        """Store a freshly rendered page, evicting the least recently used entry when full."""
+        with self._lock:
+            self.renders[key[0]] = self.renders.get(key[0], 0) + 1
+            self._entries[key] = page
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def record_not_modified(self) -> None:
+        """Count a revalidation answered with 304."""
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> dict:
+        """Return hit/render counters for this process."""
+        with self._lock:
+            renders = sum(self.renders.values())
+            lookups = self.hits + renders
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "renders": renders,
+                "not_modified": self.not_modified,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "renders_by_endpoint": dict(self.renders),
+            }
+
+
+page_cache = PageCache(
+    maxsize=int(os.environ.get("PAGE_CACHE_SIZE", "256")),
+    ttl=float(os.environ.get("PAGE_CACHE_TTL", "3600")),
+)
+
+
+def template_mtime(name: str) -> int:
+    """Return a template's modification time in nanoseconds (part of page cache keys)."""
+    return os.stat(os.path.join(current_app.root_path, current_app.template_folder, name)).st_mtime_ns
+
+
+def has_flashed_messages() -> bool:
+    """
+    Return True if the request's session cookie carries flashed messages.
+
+    Decodes the cookie directly instead of reading ``session``: any read
+    marks the session accessed, and Flask then adds "Vary: Cookie", which
+    stops shared caches from storing the page for everyone.
+    """
+    cookie = request.cookies.get(current_app.config["SESSION_COOKIE_NAME"])
+    serializer = current_app.session_interface.get_signing_serializer(current_app) if cookie else None
+    if serializer is None:
+        return False
+    try:
+        data = serializer.loads(cookie, max_age=int(current_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return False
+    return bool(data.get("_flashes"))
+
+
+def cached_page(*templates: str, ttl: Optional[float] = None, query_args: Tuple[str, ...] = ()):
+    """
+    Serve a GET route from the page cache with a strong ETag and 304s.
+
+    Only for pages that look the same to every visitor. Requests carrying
+    flashed messages, and non-200 responses, bypass the cache.
+
+    Args:
+        templates: Templates the page renders (their mtimes are part of the key).
+        ttl: Seconds an entry stays fresh; defaults to the cache's TTL.
+        query_args: Query arguments the page depends on. Only these are part
+            of the key, so tracking parameters (?utm_source=...) or a
+            cache-busting ?x=<random> cannot fill the cache with copies.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or has_flashed_messages():
+                return view(*args, **kwargs)
+
+            args_key = tuple((name, tuple(request.args.getlist(name))) for name in query_args)
+            key = (request.endpoint, request.path, args_key) + tuple(template_mtime(t) for t in templates)
+            page = page_cache.get(key)
+            cache_status = "HIT"
+            if page is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                expires_at = time.monotonic() + (page_cache.ttl if ttl is None else ttl)
+                page = CachedPage(response.get_data(), response.mimetype, expires_at)
+                page_cache.put(key, page)
+                cache_status = "MISS"
+
+            encoding = pick_encoding(request.accept_encodings)
+            body, etag = page.variant(encoding[0] if encoding else None)
+            if request.if_none_match.contains(etag):
+                page_cache.record_not_modified()
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.response_class(body, mimetype=page.mimetype)
+                if etag != page.etag:
+                    response.headers["Content-Encoding"] = encoding[0]
+            response.set_etag(etag)
+            response.vary.add("Accept-Encoding")
+            response.headers["Cache-Control"] = "public, max-age=60"
+            response.headers["X-Cache"] = cache_status
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def current_user_id() -> Optional[int]:
+    """
+    Return the logged-in user's id from the session.
+
+    Sessions created before ids were stored only carry the email; those are
+    upgraded in place with one lookup.
+    """
+    user_id = session.get("user_id")
+    if user_id is None and session.get("email"):
+        user_id = db.session.execute(
+            db.select(User.id).where(User.email == session["email"])
+        ).scalar()
+        if user_id is not None:
+            session["user_id"] = user_id
+    return user_id
+
+
+def current_user() -> Optional[User]:
+    """
+    Return the currently logged-in user (or None).
+
+    Looks the user up by primary key from session['user_id'] and memoizes
+    the result on flask.g for the rest of the request.
+    """
+    if "current_user" not in g:
+        user_id = current_user_id()
+        g.current_user = db.session.get(User, user_id) if user_id is not None else None
+    return g.current_user
+
+
+def current_user_profile() -> Optional[UserProfile]:
+    """
+    Return display fields of the logged-in user, served from profile_cache.
+
+    Use this instead of current_user() on read-only pages and APIs.
+    """
+    user_id = current_user_id()
+    if user_id is None:
+        return None
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        user = current_user()
+        if not user:
+            return None
+        profile = UserProfile(user.id, user.username, user.email, user.wallet_balance or 0.0, user.profile_pic)
+        profile_cache.put(profile)
+    return profile
+
+
+# ----------------------
+# Routes (public)
+# ----------------------
+@routes.route("/")
+@cached_page("landing.html")
+def home():
+    """
+    Landing page.
+
+    Renders the landing page template with the current year.
+    """
+    return render_template("landing.html", current_year=datetime.utcnow().year)
+
+
+@routes.app_errorhandler(PasswordHasherBusy)
+def password_hasher_busy(exc):
+    """
+    Answer 503 when the password hashing queue is full.
+
+    Sign-in and registration re-render their form so the user can retry.
+    """
+    message = "We're handling a lot of sign-ins right now. Please try again in a moment."
+    headers = {"Retry-After": "2"}
+    if request.endpoint in ("login", "register"):
+        return render_template(f"{request.endpoint}.html", error=message), 503, headers
+    return message, 503, headers
+
+
+@routes.route("/register", methods=("GET", "POST"))
+def register():
+    """
+    Handle user registration.
+
+    Validates form input, prevents duplicate emails, hashes the password,
+    and creates a new User record.
+    """
+    if request.method == "POST":
+        username = request.form.get("username", "").strip()
+        email = request.form.get("email", "").strip().lower()
+        mobile = request.form.get("mobile", "").strip()
+        gender = request.form.get("gender", "").strip()
+        password = request.form.get("password", "")
+        confirm_password = request.form.get("confirm_password", "")
+
+        # Validate passwords match
+        if password != confirm_password:
+            return render_template("register.html", error="Passwords do not match")
+
+        # Prevent duplicate emails
+        if User.query.filter_by(email=email).first():
+            return render_template("register.html", error="Email already registered")
+
+        # Create user with hashed password
+        user = User(username=username, email=email, mobile=mobile, gender=gender)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+
+        return redirect(url_for("login"))
+
+    return render_template("register.html")
+
+
+@routes.route("/login", methods=("GET", "POST"))
+def login():
+    """
+    Authenticate user and create a session.
+
+    Passwords are validated against a secure hash.
+    """
+    error = None
+    if request.method == "POST":
+        email = request.form.get("email", "").strip().lower()
+        password = request.form.get("password", "")
+
+        user = User.query.filter_by(email=email).first()
+        if user and user.check_password(password):
+            # Upgrade hashes made with an older method or cost
+            if password_hasher.needs_rehash(user.password_hash):
+                user.set_password(password)
+                db.session.commit()
+
+            # Store minimal info in session
+            session["user_id"] = user.id
+            session["email"] = user.email
+            session["username"] = user.username
+            return redirect(url_for("dashboard"))
+
+        error = "Invalid email or password"
+
+    return render_template("login.html", error=error)
+
+
+DASHBOARD_PAGE_SIZE = 20
+
+
+def user_purchase_page(user_id: int, cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    """
+    Load one page of a user's purchase history, newest first.
+
+    Uses keyset pagination over the (user_id, created_at) index, with the id
+    as tie-breaker, and selects only the columns the dashboard shows.
+
+    Args:
+        user_id: Owner of the purchases.
+        cursor: Opaque "<created_at ISO>_<id>" cursor from the previous page.
+
+    Returns:
+        (rows, next_cursor) where rows are plain dicts and next_cursor is None
+        on the last page.
+
+    Raises:
+        ValueError: If ``cursor`` is malformed.
+    """
+    query = db.select(
+        Purchase.id, Purchase.created_at, Purchase.amount, Purchase.provider, Purchase.number, Purchase.status
+    ).where(Purchase.user_id == user_id)
+
+    if cursor:
+        created_str, _, id_str = cursor.rpartition("_")
+        created_at, last_id = datetime.fromisoformat(created_str), int(id_str)
+        query = query.where(
+            db.or_(
+                Purchase.created_at < created_at,
+                db.and_(Purchase.created_at == created_at, Purchase.id < last_id),
+            )
+        )
+
+    query = query.order_by(Purchase.created_at.desc(), Purchase.id.desc()).limit(DASHBOARD_PAGE_SIZE + 1)
+    rows = db.session.execute(query).mappings().all()
+
+    next_cursor = None
+    if len(rows) > DASHBOARD_PAGE_SIZE:
+        rows = rows[:DASHBOARD_PAGE_SIZE]
+        next_cursor = f"{rows[-1]['created_at'].isoformat()}_{rows[-1]['id']}"
+
+    purchases = [
+        dict(row, created_at=row["created_at"].strftime("%Y-%m-%d %H:%M:%S")) for row in rows
+    ]
+    return purchases, next_cursor
+
+
+@routes.route("/dashboard")
+@read_only
+def dashboard():
+    """
+    User dashboard showing the first page of purchases and the wallet balance.
+
+    Older purchases are fetched from /api/purchases ("load more").
+    Redirects to login for anonymous users.
+    """
+    user = current_user_profile()
+    if not user:
+        return redirect(url_for("login"))
+
+    purchases, next_cursor = user_purchase_page(user.id)
+    return render_template(
+        "dashboard.html",
+        username=user.username,
+        purchases=purchases,
+        next_cursor=next_cursor,
+        balance=user.wallet_balance,
+    )
+
+
+def purchase_fingerprint(bundle_id: int, number: str, amount: float) -> str:
+    """Return the fingerprint of a purchase request stored with its idempotency key."""
+    return hashlib.sha256(f"{bundle_id}|{number}|{to_minor(amount)}".encode()).hexdigest()
+
+
+def replay_purchase(existing: Purchase, fingerprint: str):
+    """
+    Answer a request whose idempotency key was already used.
+
+    The original purchase is replayed only if the request asks for the same
+    bundle, number and amount; a different order under the same key gets
+    422, so it is never mistaken for a success. Rows stored before
+    fingerprints existed are compared field by field.
+    """
+    stored = existing.idempotency_fingerprint or purchase_fingerprint(
+        existing.bundle_id, existing.number, existing.amount
+    )
+    if not hmac.compare_digest(stored, fingerprint):
+        return jsonify({"error": "This idempotency key was already used for a different purchase."}), 422
+    return purchase_response(existing, replayed=True)
+
+
+def purchase_response(purchase: Purchase, replayed: bool = False):
+    """
+    Build the response for a completed (or replayed) purchase request.
+
+    Args:
+        purchase: The Purchase the request resolved to.
+        replayed: True when the request was a retry of an earlier idempotency key.
+    """
+    # AJAX/fetch support
+    if request.headers.get("X-Requested-With") == "fetch":
+        return jsonify({"ok": True, "id": purchase.id, "replayed": replayed})
+
+    return redirect(url_for("dashboard"))
+
+
+@routes.route("/purchase", methods=("GET", "POST"))
+def purchase():
+    """
+    Handle bundle purchase requests.
+
+    - Looks the bundle price up in the catalog index
+    - Creates a Purchase record and, in the same transaction, posts the debit
+      to the wallet ledger with a conditional snapshot UPDATE
+    - Replays the original result for a repeated idempotency key, if the
+      request is the same order (422 otherwise)
+    """
+    user = current_user_profile()
+    if not user:
+        return redirect(url_for("login"))
+
+    if request.method == "POST":
+        network = request.form.get("network", "").strip()
+        bundle_id = request.form.get("bundle_id", type=int)
+        mobile = request.form.get("mobile", "").strip()
+        idempotency_key = (
+            request.headers.get("Idempotency-Key") or request.form.get("idempotency_key", "")
+        ).strip()[:64] or None
+
+        # Older clients post the display string ("1 GB - 5.40 GHS") instead of an id
+        if bundle_id is not None:
+            entry = bundle_catalog.get(bundle_id)
+        else:
+            entry = bundle_catalog.find(network, request.form.get("bundle", "").strip())
+        if not entry or (network and entry.provider != network):
+            return jsonify({"error": "Unknown bundle."}), 400
+        amount = entry.price
+        fingerprint = purchase_fingerprint(entry.id, mobile, amount)
+
+        # A retry of a request we already processed returns the original purchase
+        if idempotency_key:
+            existing = Purchase.query.filter_by(user_id=user.id, idempotency_key=idempotency_key).first()
+            if existing:
+                return replay_purchase(existing, fingerprint)
+
+        purchase = Purchase(
+            provider=entry.provider,
+            bundle=entry.label,
+            number=mobile,
+            amount=amount,
+            created_at=datetime.utcnow(),
+            status="payment_completed",
+            user_id=user.id,
+            idempotency_key=idempotency_key,
+            idempotency_fingerprint=fingerprint if idempotency_key else None,
+            bundle_id=entry.id,
+        )
+        db.session.add(purchase)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # A concurrent request with the same key won the race
+            db.session.rollback()
+            existing = Purchase.query.filter_by(user_id=user.id, idempotency_key=idempotency_key).first()
+            if not existing:
+                raise
+            return replay_purchase(existing, fingerprint)
+
+        # Debit only if the balance covers it; the check and the write are one
+        # statement, so concurrent buys can neither overdraw nor lose updates.
+        if not post_ledger_entry(
+            user.id, -to_minor(amount), "purchase", reference=f"purchase:{purchase.id}", require_funds=True
+        ):
+            db.session.rollback()
+            balance = wallet_balance_minor(user.id) / 100
+            return jsonify({"error": "Insufficient wallet balance", "balance": balance}), 400
+        key = sales_rollup_key(purchase.created_at, purchase.provider, purchase.bundle, purchase.status)
+        apply_sales_deltas({key: [1, to_minor(amount)]})
+        record_transitions([
+            {"purchase_id": purchase.id, "from_status": None, "to_status": purchase.status, "actor": "customer"}
+        ])
+        db.session.commit()
+
+        profile_cache.invalidate(user.id)
+        return purchase_response(purchase)
+
+    # GET
+    return render_template("purchase.html", username=user.username, balance=user.wallet_balance)
+
+
+@routes.route("/faq")
+@cached_page("FAQ.html")
+def faq():
+    """Render FAQ page."""
+    return render_template("FAQ.html")
+
+
+@routes.route("/landing")
+@cached_page("landing.html")
+def landing():
+    """Render landing page (alternate route)."""
+    return render_template("landing.html")
+
+
+
+# ---------------- Contact Route ---------------- #
+@routes.route("/contact", methods=["GET", "POST"])
+@cached_page("contact.html")
+def contact():
+    """
+    Render the contact form and queue submitted messages for delivery.
+
+    The message is written to the mail outbox and sent by the background
+    sender (`flask send-mail`), so the request never waits on SMTP.
+    """
+    if request.method == "POST":
+        name = request.form.get("name")
+        email = request.form.get("email")
+        message_body = request.form.get("message")
+
+        queue_mail(
+            subject=f"New Contact Message from {name}",
+            recipients=[CONTACT_RECIPIENT],
+            body=f"From: {name} <{email}>\n\nMessage:\n{message_body}",
+            reply_to=email,
+        )
+        db.session.commit()
+        flash("✅ Your message has been sent successfully!", "success")
+
+        return redirect(url_for("contact"))
+
+    return render_template("contact.html")
+
+
+# ----------------------
+# Admin routes
+# ----------------------
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 200
+PURCHASE_STATUSES = ("pending", "payment_completed", "fulfilling", "confirmed", "credited", "refunded")
+
+
+def parse_date_arg(name: str) -> Optional[datetime]:
+    """Parse a YYYY-MM-DD query argument, ignoring missing or malformed values."""
+    value = request.args.get(name, "").strip()
+    try:
+        return datetime.strptime(value, "%Y-%m-%d") if value else None
+    except ValueError:
+        return None
+
+
+def admin_purchase_page() -> Tuple[list, Optional[int], dict]:
+    """
+    Load one page of purchases for the admin views using keyset pagination.
+
+    Query args: ``before`` (cursor: only ids lower than this), ``status``,
+    ``provider``, ``from``/``to`` (inclusive dates) and ``limit``.
+
+    Returns:
+        (purchases, next_cursor, filters) where next_cursor is None on the
+        last page and filters echoes the applied filters for building links.
+
+    Raises:
+        ValueError: If ``before`` is given but is not a purchase id.
+    """
+    filters = {
+        name: request.args.get(name, "").strip()
+        for name in ("status", "provider", "from", "to")
+        if request.args.get(name, "").strip()
+    }
+    limit = min(max(request.args.get("limit", ADMIN_PAGE_SIZE, type=int), 1), ADMIN_MAX_PAGE_SIZE)
+    before = request.args.get("before", "").strip()
+    if before and not before.isdigit():
+        raise ValueError(f"Invalid cursor {before!r}")
+
+    # Usernames arrive in the same SELECT (no per-row lazy load of p.user)
+    query = (
+        Purchase.query.join(Purchase.user)
+        .options(contains_eager(Purchase.user).load_only(User.id, User.username))
+    )
+    if before:
+        query = query.filter(Purchase.id < int(before))
+    if "status" in filters:
+        query = query.filter(Purchase.status == filters["status"])
+    if "provider" in filters:
+        query = query.filter(Purchase.provider == filters["provider"])
+    date_from = parse_date_arg("from")
+    if date_from:
+        query = query.filter(Purchase.created_at >= date_from)
+    date_to = parse_date_arg("to")
+    if date_to:
+        query = query.filter(Purchase.created_at < date_to + timedelta(days=1))
+
+    # Fetch one extra row to learn whether another page exists
+    purchases = query.order_by(Purchase.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(purchases) > limit:
+        purchases = purchases[:limit]
+        next_cursor = purchases[-1].id
+    return purchases, next_cursor, filters
+
+
+@routes.route("/admin")
+@read_only
+def admin_panel():
+    """
+    Admin panel that lists purchases, newest first, one page at a time.
+
+    NOTE: This route has no authentication. In production add admin auth!
+    """
+    # Read before the page, so the live feed replays anything committed in between
+    feed_cursor = latest_transition_id()
+    try:
+        purchases, next_cursor, filters = admin_purchase_page()
+    except ValueError:
+        return "Invalid page cursor", 400
+    return render_template(
+        "admin.html",
+        purchases=purchases,
+        next_cursor=next_cursor,
+        feed_cursor=feed_cursor,
+        filters=filters,
+        statuses=PURCHASE_STATUSES,
+        providers=sorted(DEFAULT_BUNDLES),
+    )
+
+
+@routes.route("/admin/api/purchases")
+@read_only
+def admin_api_purchases():
+    """
+    JSON version of the admin purchase list, accepting the same query args.
+
+    Pass the returned ``next_cursor`` as ``before`` to fetch the next page.
+    """
+    try:
+        purchases, next_cursor, _ = admin_purchase_page()
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    return jsonify({"purchases": [p.to_dict() for p in purchases], "next_cursor": next_cursor})
+
+
+ANALYTICS_DEFAULT_DAYS = 30
+
+
+def sales_summary(date_from: Optional[datetime], date_to: Optional[datetime]) -> dict:
+    """
+    Revenue and volume per day, provider, bundle and status from the rollup.
+
+    Reads only sales_daily, whose size depends on the date range and
+    catalog, not on the number of purchases.
+
+    Args:
+        date_from: First day (defaults to ANALYTICS_DEFAULT_DAYS ago).
+        date_to: Last day, inclusive (defaults to today).
+    """
+    last = (date_to or datetime.utcnow()).date()
+    first = date_from.date() if date_from else last - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    in_range = (SalesDaily.day >= first, SalesDaily.day <= last)
+
+    def grouped(column, order_by_revenue: bool = False) -> list:
+        revenue = db.func.sum(SalesDaily.amount_minor)
+        stmt = (
+            db.select(column, db.func.sum(SalesDaily.purchases), revenue)
+            .where(*in_range)
+            .group_by(column)
+            .having(db.func.sum(SalesDaily.purchases) != 0)
+            .order_by(revenue.desc() if order_by_revenue else column)
+        )
+        return [
+            {"key": str(key), "purchases": int(count), "revenue": (amount or 0) / 100}
+            for key, count, amount in db.session.execute(stmt)
+        ]
+
+    by_day = grouped(SalesDaily.day)
+    return {
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "totals": {
+            "purchases": sum(d["purchases"] for d in by_day),
+            "revenue": round(sum(d["revenue"] for d in by_day), 2),
+        },
+        "by_day": by_day,
+        "by_provider": grouped(SalesDaily.provider, order_by_revenue=True),
+        "by_bundle": grouped(SalesDaily.bundle, order_by_revenue=True),
+        "by_status": grouped(SalesDaily.status, order_by_revenue=True),
+    }
+
+
+@routes.route("/admin/analytics")
+@read_only
+def admin_analytics():
+    """Sales analytics page (reads only the daily rollup). Accepts ``from``/``to`` dates."""
+    summary = sales_summary(parse_date_arg("from"), parse_date_arg("to"))
+    return render_template("admin_analytics.html", summary=summary)
+
+
+@routes.route("/admin/api/analytics")
+@read_only
+def admin_api_analytics():
+    """JSON version of the analytics page."""
+    return jsonify(sales_summary(parse_date_arg("from"), parse_date_arg("to")))
+
+
+@routes.route("/admin/api/page_cache")
+def admin_api_page_cache():
+    """Page cache counters for this worker process (hit rate, renders per endpoint)."""
+    return jsonify({"pid": os.getpid(), **page_cache.stats()})
+
+
+# Live admin feed: purchase_transitions is the change log. Its id is the event
+# id, so a client resumes from Last-Event-ID and only the log's primary key
+# is polled, never the purchases table.
+ADMIN_EVENTS_POLL = float(os.environ.get("ADMIN_EVENTS_POLL_SECONDS", "1"))
+ADMIN_EVENTS_MAX_SECONDS = float(os.environ.get("ADMIN_EVENTS_MAX_SECONDS", "300"))  # then the browser reconnects
+ADMIN_EVENTS_HEARTBEAT = 15.0  # seconds; keeps proxies from closing an idle stream
+ADMIN_EVENTS_BATCH = 200
+
+
+def latest_transition_id() -> int:
+    """Return the id of the newest change-log entry (0 if none)."""
+    return db.session.execute(db.select(db.func.max(PurchaseTransition.id))).scalar() or 0
+
+
+def admin_events_after(cursor: int, limit: int = ADMIN_EVENTS_BATCH) -> list:
+    """
+    Return change-log entries after ``cursor`` as event dicts, oldest first.
+
+    Each event carries the purchase's current row (None once deleted), so
+    the client can patch or insert it without another request.
+    """
+    rows = db.session.execute(
+        db.select(
+            PurchaseTransition.id, PurchaseTransition.purchase_id, PurchaseTransition.from_status,
+            PurchaseTransition.to_status, PurchaseTransition.actor, PurchaseTransition.detail,
+            Purchase.provider, Purchase.bundle, Purchase.number, Purchase.amount, Purchase.status,
+            Purchase.created_at, User.username,
+        )
+        .outerjoin(Purchase, Purchase.id == PurchaseTransition.purchase_id)
+        .outerjoin(User, User.id == Purchase.user_id)
+        .where(PurchaseTransition.id > cursor)
+        .order_by(PurchaseTransition.id)
+        .limit(limit)
+    ).all()
+    events = []
+    for row in rows:
+        purchase = None
+        if row.status is not None:
+            purchase = {
+                "id": row.purchase_id,
+                "user": row.username,
+                "provider": row.provider,
+                "bundle": row.bundle,
+                "number": row.number,
+                "amount": row.amount,
+                "status": row.status,
+                "created_at": row.created_at.strftime("%Y-%m-%d %H:%M:%S") if row.created_at else "",
+            }
+        events.append({
+            "id": row.id,
+            "purchase_id": row.purchase_id,
+            "from": row.from_status,
+            "to": row.to_status,
+            "actor": row.actor,
+            "detail": row.detail,
+            "purchase": purchase,
+        })
+    return events
+
+
+def admin_event_stream(cursor: int):
+    """
+    Yield Server-Sent Events for change-log entries after ``cursor``.
+
+    Polls the log every ADMIN_EVENTS_POLL seconds while idle and ends after
+    ADMIN_EVENTS_MAX_SECONDS, so one stream never pins a worker for good;
+    EventSource reconnects on its own and resumes from the last id it saw.
+    The read transaction is closed between polls.
+    """
+    yield f"retry: {int(ADMIN_EVENTS_POLL * 3000)}\n\n"
+    started = last_sent = time.monotonic()
+    while time.monotonic() - started < ADMIN_EVENTS_MAX_SECONDS:
+        events = admin_events_after(cursor)
+        db.session.rollback()
+        for event in events:
+            cursor = event["id"]
+            yield f"id: {cursor}\nevent: purchase\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+        if events:
+            last_sent = time.monotonic()
+            if len(events) == ADMIN_EVENTS_BATCH:
+                continue  # catching up: fetch the next batch at once
+        elif time.monotonic() - last_sent >= ADMIN_EVENTS_HEARTBEAT:
+            last_sent = time.monotonic()
+            yield ": keepalive\n\n"
+        time.sleep(ADMIN_EVENTS_POLL)
+
+
+@routes.route("/admin/events")
+@read_only
+def admin_events():
+    """
+    Stream new purchases and status changes as Server-Sent Events.
+
+    Starts after the ``Last-Event-ID`` header (sent by EventSource when it
+    reconnects), else after the ``after`` query arg, else at the newest
+    entry. Each ``purchase`` event is a JSON change-log entry; see
+    admin_events_after.
+
+    NOTE: Like the rest of /admin, this route has no authentication yet.
+    Each open stream holds a worker thread; run gunicorn with threads
+    (--worker-class gthread) when admins keep the panel open.
+    """
+    cursor = request.headers.get("Last-Event-ID", type=int)
+    if cursor is None:
+        cursor = request.args.get("after", type=int)
+    if cursor is None:
+        cursor = latest_transition_id()
+        db.session.rollback()
+
+    response = current_app.response_class(stream_with_context(admin_event_stream(cursor)),
+                                          mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx: pass events through unbuffered
+    return response
+
+
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
+
+def search_terms(query: str) -> list:
+    """
+    Split a search box query into prefix terms, tokenized like SEARCH_TOKENIZER.
+
+    A phone number typed with spaces, dashes or the 233 country code is
+    collapsed into the local 0XXXXXXXXX form numbers are stored in.
+    """
+    query = query.strip().lower()
+    if re.fullmatch(r"[\d\s()+-]+", query) and sum(ch.isdigit() for ch in query) >= 3:
+        digits = re.sub(r"\D", "", query)
+        return ["0" + digits[3:] if digits.startswith("233") and len(digits) > 3 else digits]
+    # Single characters have no prefix index and would match nearly every row
+    return [term for term in re.findall(r"[\w@.+-]+", query) if len(term) > 1][:8]
+
+
+def fts_ids(table: str, terms: list, limit: int) -> list:
+    """Return the newest ``limit`` rowids of ``table`` matching every term as a prefix."""
+    match = " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+    return db.session.execute(
+        db.text(f"SELECT rowid FROM {table} WHERE {table} MATCH :match ORDER BY rowid DESC LIMIT :limit"),
+        {"match": match, "limit": limit},
+    ).scalars().all()
+
+
+def admin_search(query: str, limit: int = SEARCH_DEFAULT_LIMIT) -> dict:
+    """
+    Find purchases, users and transactions whose text fields start with the query's words.
+
+    Purchases match on recipient number, bundle, provider and the owner's
+    username or email; users on username, email and mobile; transactions on
+    Paystack reference, number and provider. Results are newest first.
+    Lookups use the FTS5 indexes (migration 3), walking them in rowid
+    order so a broad prefix stops after ``limit`` hits. Databases other
+    than SQLite fall back to indexed prefix LIKE on the main fields.
+    """
+    results = {"query": query, "purchases": [], "users": [], "transactions": []}
+    terms = search_terms(query)
+    if not terms:
+        return results
+
+    if search_index_enabled():
+        purchase_ids = fts_ids("purchases_fts", terms, limit)
+        user_ids = fts_ids("users_fts", terms, limit)
+        transaction_ids = fts_ids("transactions_fts", terms, limit)
+        purchase_filter = Purchase.id.in_(purchase_ids)
+        user_filter = User.id.in_(user_ids)
+        transaction_filter = Transaction.id.in_(transaction_ids)
+    else:
+        prefix = terms[0].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        purchase_filter = Purchase.number.like(prefix, escape="\\")
+        user_filter = db.or_(User.email.like(prefix, escape="\\"), User.username.like(prefix, escape="\\"))
+        transaction_filter = Transaction.reference.like(prefix, escape="\\")
+
+    for row in db.session.execute(
+        db.select(Purchase.id, Purchase.number, Purchase.bundle, Purchase.provider, Purchase.amount,
+                  Purchase.status, Purchase.created_at, User.username)
+        .outerjoin(User, User.id == Purchase.user_id)
+        .where(purchase_filter).order_by(Purchase.id.desc()).limit(limit)
+    ):
+        results["purchases"].append({
+            "id": row.id, "number": row.number, "bundle": row.bundle, "provider": row.provider,
+            "amount": row.amount, "status": row.status, "user": row.username,
+            "created_at": row.created_at.strftime("%Y-%m-%d %H:%M:%S") if row.created_at else "",
+        })
+    for row in db.session.execute(
+        db.select(User.id, User.username, User.email, User.mobile)
+        .where(user_filter).order_by(User.id.desc()).limit(limit)
+    ):
+        results["users"].append({"id": row.id, "username": row.username, "email": row.email, "mobile": row.mobile})
+    for row in db.session.execute(
+        db.select(Transaction.id, Transaction.reference, Transaction.number, Transaction.provider,
+                  Transaction.amount, Transaction.status, Transaction.at, User.username)
+        .outerjoin(User, User.id == Transaction.user_id)
+        .where(transaction_filter).order_by(Transaction.id.desc()).limit(limit)
+    ):
+        results["transactions"].append({
+            "id": row.id, "reference": row.reference, "number": row.number, "provider": row.provider,
+            "amount": row.amount, "status": row.status, "user": row.username,
+            "at": row.at.strftime("%Y-%m-%d %H:%M:%S") if row.at else "",
+        })
+    return results
+
+
+@routes.route("/admin/api/search")
+@read_only
+def admin_api_search():
+    """
+    Prefix search for the admin search box: ``q`` (words or a phone number) and ``limit``.
+
+    NOTE: Like the rest of /admin, this route has no authentication yet.
+    """
+    limit = min(max(request.args.get("limit", SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+    return jsonify(admin_search(request.args.get("q", "")[:200], limit))
+
+
+# Target status -> statuses a purchase may move from. Deletion is always allowed.
+ALLOWED_TRANSITIONS = {
+    "confirmed": ("pending", "payment_completed"),
+    "credited": ("pending", "payment_completed", "confirmed", "fulfilling"),  # fulfilling: e.g. a held order
+}
+MAX_BATCH_SIZE = 900  # stays below SQLite's bound-parameter limit
+
+
+def apply_purchase_action(ids: list, action: str, actor: str = "admin") -> Dict[int, str]:
+    """
+    Apply a status change (or deletion) to many purchases in set-based statements.
+
+    The allowed-transition check lives in the WHERE clause, so the UPDATE or
+    DELETE touches only eligible rows and RETURNING tells us which ones. An
+    UPDATE runs once per allowed source status, so each returned row's old
+    status is the one its WHERE matched; a DELETE returns the old row. The
+    rollup deltas come from those rows alone, never from an earlier read
+    another transaction could have overtaken. A second SELECT classifies
+    the rest. The daily sales rollup and the transition log are updated for
+    the changed rows in the same transaction. The caller commits; a lock
+    timeout raises OperationalError (answered with 503, see database_locked).
+
+    Args:
+        ids: Purchase ids.
+        action: A key of ALLOWED_TRANSITIONS, or "delete".
+        actor: Recorded in the transition log.
+
+    Returns:
+        Mapping of id -> outcome: "updated", "deleted", "unchanged" (already
+        in the target status), "invalid_transition" or "not_found".
+    """
+    ids = list(dict.fromkeys(ids))
+    columns = (Purchase.id, Purchase.created_at, Purchase.provider, Purchase.bundle, Purchase.amount)
+    if action == "delete":
+        statements = [(None, db.delete(Purchase).where(Purchase.id.in_(ids)).returning(*columns, Purchase.status))]
+        done = "deleted"
+    else:
+        # The target status is never a source status, so a row moves at most once
+        statements = [
+            (source, db.update(Purchase).where(Purchase.id.in_(ids), Purchase.status == source)
+             .values(status=action).returning(*columns))
+            for source in ALLOWED_TRANSITIONS[action]
+        ]
+        done = "updated"
+
+    changed: Dict[int, tuple] = {}
+    for source, stmt in statements:
+        for row in db.session.execute(stmt.execution_options(synchronize_session=False)):
+            changed[row.id] = (row, source or row.status)
+
+    deltas: Dict[tuple, list] = {}
+    transitions = []
+    for pid, (row, from_status) in changed.items():
+        add_sales_delta(deltas, sales_rollup_key(row.created_at, row.provider, row.bundle, from_status), row.amount, -1)
+        if action != "delete":
+            add_sales_delta(deltas, sales_rollup_key(row.created_at, row.provider, row.bundle, action), row.amount)
+        transitions.append({
+            "purchase_id": pid, "from_status": from_status,
+            "to_status": "deleted" if action == "delete" else action, "actor": actor,
+        })
+    apply_sales_deltas(deltas)
+    record_transitions(transitions)
+
+    outcomes = {pid: done for pid in changed}
+    remaining = [pid for pid in ids if pid not in changed]
+    if remaining:
+        found = dict(
+            db.session.execute(
+                db.select(Purchase.id, Purchase.status).where(Purchase.id.in_(remaining))
+            ).all()
+        )
+        for pid in remaining:
+            if pid not in found:
+                outcomes[pid] = "not_found"
+            elif found[pid] == action:
+                outcomes[pid] = "unchanged"
+            else:
+                outcomes[pid] = "invalid_transition"
+    return outcomes
+
+
+def single_purchase_action(pid: int, action: str):
+    """
+    Run apply_purchase_action for one id and build the legacy response.
+
+    Returns JSON for AJAX (X-Requested-With: fetch) or a redirect to the
+    admin panel for browser links.
+    """
+    outcome = apply_purchase_action([pid], action)[pid]
+    db.session.commit()
+
+    if outcome == "not_found":
+        return jsonify({"error": "Purchase not found"}), 404
+    if outcome == "invalid_transition":
+        return jsonify({"error": f"Cannot change this purchase to {action}"}), 409
+
+    if request.headers.get("X-Requested-With") == "fetch":
+        return jsonify({"ok": True, "outcome": outcome})
+    return redirect(url_for("admin_panel"))
+
+
+@routes.route("/admin/confirm/<int:pid>", methods=("POST",))
+def admin_confirm(pid: int):
+    """
+    Admin endpoint to mark a purchase as 'credited'.
+
+    Accepts POST only. Returns JSON for AJAX or redirect for browser.
+    """
+    return single_purchase_action(pid, "credited")
+
+
+@routes.route("/admin/purchases/batch", methods=("POST",))
+def admin_batch_action():
+    """
+    Apply one action to many purchases at once.
+
+    Expects JSON ``{"ids": [1, 2, ...], "action": "confirmed" | "credited" | "delete"}``
+    and returns ``{"ok": true, "results": {"<id>": "<outcome>", ...}}``.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    action = payload.get("action")
+    if action != "delete" and action not in ALLOWED_TRANSITIONS:
+        return jsonify({"error": "Unknown action"}), 400
+
+    # Strict: a string or object would otherwise be iterated, and JSON true is an int in Python
+    ids = payload.get("ids")
+    if not isinstance(ids, list) or not all(isinstance(pid, int) and not isinstance(pid, bool) for pid in ids):
+        return jsonify({"error": "ids must be a list of integers"}), 400
+    if not ids:
+        return jsonify({"error": "No purchases selected"}), 400
+    if len(ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} purchases per batch"}), 400
+
+    outcomes = apply_purchase_action(ids, action)
+    db.session.commit()
+    return jsonify({"ok": True, "results": {str(pid): outcome for pid, outcome in outcomes.items()}})
+
+
+# ----------------------
+# Wallet & Paystack integration
 # ----------------------
-# Wallet & Paystack integration
-# ----------------------
-@app.route("/wallet")
+@routes.route("/wallet")
 def wallet():
     """
     Show wallet page with current balance and Paystack public key.
@@ -489,7 +2929,7 @@ def wallet():
     return render_template("wallet.html", user=user, paystack_public_key=PAYSTACK_PUBLIC_KEY)
 
 
-@app.route("/initiate_payment", methods=("POST",))
+@routes.route("/initiate_payment", methods=("POST",))
 def initiate_payment():
     """
     Initialize a Paystack transaction for a wallet top-up.
@@ -497,7 +2937,7 @@ def initiate_payment():
     Stores a PendingPayment record and redirects the user to Paystack's
     authorization URL. Expects 'amount', 'provider', and 'number' in the form.
     """
-    user = current_user()
+    user = current_user_profile()
     if not user:
         return redirect(url_for("login"))
 
@@ -507,18 +2947,14 @@ def initiate_payment():
 
     # Build Paystack initialize request
     try:
-        amount_kobo = int(float(amount) * 100)
+        amount_kobo = int(round(float(amount) * 100))
     except (TypeError, ValueError):
         return "Invalid amount", 400
 
-    headers = {"Authorization": f"Bearer {PAYSTACK_SECRET_KEY}", "Content-Type": "application/json"}
-    data = {"email": user.email, "amount": amount_kobo, "callback_url": url_for("verify_payment", _external=True)}
-
-    response = requests.post("https://api.paystack.co/transaction/initialize", headers=headers, json=data)
     try:
-        res = response.json()
-    except ValueError:
-        return "Invalid response from Paystack", 502
+        res = paystack.initialize(user.email, amount_kobo, url_for("verify_payment", _external=True))
+    except PaystackError as exc:
+        return f"Payment provider unavailable, please try again shortly. ({exc})", 503
 
     if res.get("status"):
         reference = res["data"]["reference"]
@@ -543,38 +2979,47 @@ def initiate_payment():
     return f"Error initializing payment: {res.get('message', 'Unknown error')}", 500
 
 
-@app.route("/verify_payment")
-def verify_payment():
+# Pending top-ups older than this are re-verified by the reconciler...
+RECONCILE_AFTER = timedelta(minutes=int(os.environ.get("RECONCILE_AFTER_MINUTES", "15")))
+# ...and dropped once this old if Paystack does not report them paid.
+PENDING_EXPIRES_AFTER = timedelta(hours=int(os.environ.get("PENDING_EXPIRES_AFTER_HOURS", "24")))
+
+
+def credit_pending_payment(reference: str, paid_amount: Optional[int] = None) -> Tuple[str, Optional[User]]:
     """
-    Paystack callback / verification URL.
+    Credit the wallet for a successful Paystack payment, at most once.
+
+    Safe to call concurrently from the browser callback, the webhook and the
+    reconciler: the unique Transaction.reference lets exactly one caller
+    insert the transaction, and the credit is posted to the wallet ledger in
+    the same database transaction. Commits on success.
 
-    Verifies the transaction reference, credits the user's wallet on success,
-    creates a Transaction record, and removes the PendingPayment record.
+    Args:
+        reference: Paystack transaction reference.
+        paid_amount: Amount Paystack reports, in pesewas; checked against the
+            pending amount when given.
+
+    Returns:
+        (outcome, user) where outcome is "credited", "already_credited",
+        "not_found", "user_not_found" or "amount_mismatch".
     """
-    reference = request.args.get("reference")
-    if not reference:
-        return "Missing payment reference.", 400
+    done = Transaction.query.filter_by(reference=reference).first()
+    if done:
+        return "already_credited", db.session.get(User, done.user_id)
 
-    headers = {"Authorization": f"Bearer {PAYSTACK_SECRET_KEY}"}
-    response = requests.get(f"https://api.paystack.co/transaction/verify/{reference}", headers=headers)
-    try:
-        res = response.json()
-    except ValueError:
-        return "Invalid response from Paystack", 502
+    pending = PendingPayment.query.filter_by(reference=reference).first()
+    if not pending:
+        return "not_found", None
 
-    # Check success status from Paystack
-    if res.get("status") and res.get("data", {}).get("status") == "success":
-        pending = PendingPayment.query.filter_by(reference=reference).first()
-        if not pending:
-            return "No matching pending payment found.", 404
+    user = User.query.filter_by(email=pending.email).first()
+    if not user:
+        return "user_not_found", None
 
-        user = User.query.filter_by(email=pending.email).first()
-        if not user:
-            return "User not found.", 404
+    if paid_amount is not None and int(paid_amount) != int(round(pending.amount * 100)):
+        return "amount_mismatch", user
 
-        # Credit wallet and record a transaction
-        user.wallet_balance = round(user.wallet_balance + pending.amount, 2)
-        transaction = Transaction(
+    db.session.add(
+        Transaction(
             amount=pending.amount,
             provider=pending.provider,
             number=pending.number,
@@ -583,20 +3028,164 @@ def verify_payment():
             at=datetime.utcnow(),
             user_id=user.id,
         )
+    )
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # Another caller recorded this reference first
+        db.session.rollback()
+        return "already_credited", user
+
+    post_ledger_entry(user.id, to_minor(pending.amount), "topup", reference=f"paystack:{reference}")
+    db.session.delete(pending)  # remove pending record now that transaction is complete
+    db.session.commit()
+    profile_cache.invalidate(user.id)
+    return "credited", user
 
-        db.session.add(transaction)
-        db.session.delete(pending)  # remove pending record now that transaction is complete
-        db.session.commit()
 
-        return redirect(url_for("wallet", email=user.email))
+def wallet_redirect(user: Optional[User]):
+    """
+    Send the payer back to their wallet after a top-up.
+
+    The account may have been deleted since the payment was credited; the
+    wallet then falls back to whoever is signed in, with a notice.
+    """
+    if user is None:
+        flash("This payment was processed, but its account no longer exists.", "warning")
+        return redirect(url_for("wallet"))
+    return redirect(url_for("wallet", email=user.email))
+
+
+@routes.route("/verify_payment")
+def verify_payment():
+    """
+    Paystack callback / verification URL.
+
+    If the webhook (or reconciler) already credited this reference the user
+    is redirected straight away; otherwise the reference is verified with
+    Paystack and credited through credit_pending_payment().
+    """
+    reference = request.args.get("reference")
+    if not reference:
+        return "Missing payment reference.", 400
+
+    done = Transaction.query.filter_by(reference=reference).first()
+    if done:
+        return wallet_redirect(db.session.get(User, done.user_id))
+
+    try:
+        res = paystack.verify(reference)
+    except PaystackError as exc:
+        return f"Could not verify payment right now, please retry. ({exc})", 503
+
+    # Check success status from Paystack
+    data = res.get("data") or {}
+    if res.get("status") and data.get("status") == "success":
+        outcome, user = credit_pending_payment(reference, data.get("amount"))
+        if outcome == "not_found":
+            return "No matching pending payment found.", 404
+        if outcome == "user_not_found":
+            return "User not found.", 404
+        if outcome == "amount_mismatch":
+            return "Paid amount does not match the requested top-up.", 400
+
+        return wallet_redirect(user)
 
     return "Payment verification failed.", 400
 
 
+@routes.route("/paystack/webhook", methods=("POST",))
+def paystack_webhook():
+    """
+    Receive Paystack events and credit successful charges.
+
+    The body is authenticated with the X-Paystack-Signature header
+    (HMAC-SHA512 of the raw body keyed with the secret key), so no verify
+    call to Paystack is needed here. Always answers 200 for signed events so
+    Paystack does not retry ones we chose to ignore.
+    """
+    signature = request.headers.get("X-Paystack-Signature", "")
+    expected = hmac.new(PAYSTACK_SECRET_KEY.encode("utf-8"), request.get_data(), hashlib.sha512).hexdigest()
+    if not hmac.compare_digest(signature, expected):
+        return jsonify({"error": "Invalid signature"}), 401
+
+    event = request.get_json(silent=True) or {}
+    data = event.get("data") or {}
+    if event.get("event") == "charge.success" and data.get("status") == "success" and data.get("reference"):
+        credit_pending_payment(str(data["reference"]), data.get("amount"))
+
+    return jsonify({"ok": True})
+
+
+def verify_quietly(reference: str) -> Optional[dict]:
+    """Verify a reference with Paystack, returning None if Paystack is unreachable."""
+    try:
+        return paystack.verify(reference)
+    except PaystackError:
+        return None
+
+
+def reconcile_pending_payments(batch_size: int = 100, concurrency: int = 8) -> Dict[str, int]:
+    """
+    Verify stale pending top-ups with Paystack and settle them.
+
+    Walks pending payments older than RECONCILE_AFTER in created_at order
+    (keyset over the created_at index), verifying each batch with at most
+    ``concurrency`` calls in flight. Paid references are credited; unpaid
+    ones older than PENDING_EXPIRES_AFTER are deleted. References Paystack
+    could not be asked about are left for the next run.
+
+    Returns:
+        Counts per outcome ("credited", "expired", "waiting", "unreachable", ...).
+    """
+    now = datetime.utcnow()
+    stale_before = now - RECONCILE_AFTER
+    expire_before = now - PENDING_EXPIRES_AFTER
+    counts: Dict[str, int] = {}
+    cursor = None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            query = db.select(PendingPayment.id, PendingPayment.reference, PendingPayment.created_at).where(
+                PendingPayment.created_at < stale_before
+            )
+            if cursor:
+                query = query.where(
+                    db.or_(
+                        PendingPayment.created_at > cursor[0],
+                        db.and_(PendingPayment.created_at == cursor[0], PendingPayment.id > cursor[1]),
+                    )
+                )
+            rows = db.session.execute(
+                query.order_by(PendingPayment.created_at, PendingPayment.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            cursor = (rows[-1].created_at, rows[-1].id)
+            db.session.rollback()  # do not hold a read transaction across network calls
+
+            results = pool.map(verify_quietly, [row.reference for row in rows])
+            for row, res in zip(rows, results):
+                data = (res or {}).get("data") or {}
+                if res is None:
+                    outcome = "unreachable"
+                elif res.get("status") and data.get("status") == "success":
+                    outcome, _ = credit_pending_payment(row.reference, data.get("amount"))
+                elif row.created_at < expire_before:
+                    PendingPayment.query.filter_by(id=row.id).delete()
+                    db.session.commit()
+                    outcome = "expired"
+                else:
+                    outcome = "waiting"
+                counts[outcome] = counts.get(outcome, 0) + 1
+
+    return counts
+
+
 # ----------------------
 # Profile routes
 # ----------------------
-@app.route("/profile", methods=("GET", "POST"))
+@routes.route("/profile", methods=("GET", "POST"))
 def profile():
     """
     View and update the currently logged-in user's profile.
@@ -608,6 +3197,12 @@ def profile():
         return redirect(url_for("login"))
 
     if request.method == "POST":
+        # Refuse a body declared too large before the form and files are parsed;
+        # a body without a length is cut off at MAX_CONTENT_LENGTH while parsing
+        max_length = current_app.config.get("MAX_CONTENT_LENGTH")
+        if max_length and (request.content_length or 0) > max_length:
+            raise RequestEntityTooLarge()
+
         new_username = request.form.get("username", "").strip()
         new_email = request.form.get("email", "").strip().lower()
         new_mobile = request.form.get("mobile", "").strip()
@@ -631,37 +3226,60 @@ def profile():
         if new_password:
             user.set_password(new_password)
 
-        # Update session to reflect email/username changes
-        session["email"] = user.email
-        session["username"] = user.username
-
-        # Handle profile picture upload
+        # Handle profile picture upload (stored by content hash, see store_upload)
+        old_pic = None
         if "profile_pic" in request.files:
             file = request.files["profile_pic"]
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-                file.save(filepath)
-
-                # Delete old pic file if present and different
-                if user.profile_pic and user.profile_pic != filename:
-                    old_path = os.path.join(app.config["UPLOAD_FOLDER"], user.profile_pic)
-                    try:
-                        if os.path.exists(old_path):
-                            os.remove(old_path)
-                    except Exception:
-                        # Do not crash on file deletion errors; log in production
-                        pass
-
-                user.profile_pic = filename
+                try:
+                    new_pic = store_upload(file.stream)
+                except UploadRejected as exc:
+                    db.session.rollback()
+                    return render_template("profile.html", user=user, error=str(exc)), 400
+                old_pic = release_upload(user.profile_pic)
+                user.profile_pic = new_pic
 
         db.session.commit()
+        remove_unreferenced_upload(old_pic)
+        profile_cache.invalidate(user.id)
+
+        # Update session to reflect email/username changes, now that they are saved
+        session["email"] = user.email
+        session["username"] = user.username
         return render_template("profile.html", user=user, message="Profile updated successfully")
 
     # GET
     return render_template("profile.html", user=user)
 
-@app.route("/delete_purchase/<int:purchase_id>", methods=("POST", "GET"))
+
+@routes.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(exc):
+    """Reject oversized bodies (MAX_CONTENT_LENGTH); the profile form re-renders with a hint."""
+    user = current_user() if request.endpoint == "profile" else None
+    if user:
+        message = f"Profile pictures must be under {UPLOAD_MAX_BYTES // 1024} KB"
+        return render_template("profile.html", user=user, error=message), 413
+    return exc
+
+
+@routes.route("/uploads/<path:name>")
+def uploaded_file(name):
+    """
+    Serve an uploaded profile picture.
+
+    Content-addressed names never change content, so they are cached as
+    immutable for a year; older per-filename uploads get a short max-age.
+    """
+    content_addressed = re.fullmatch(r"[0-9a-f]{64}\.(png|jpg|gif)", name) is not None
+    response = send_from_directory(
+        current_app.config["UPLOAD_FOLDER"], name, max_age=31536000 if content_addressed else 300
+    )
+    if content_addressed:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+@routes.route("/delete_purchase/<int:purchase_id>", methods=("POST", "GET"))
 def delete_purchase(purchase_id):
     """
     Delete a purchase record by its ID.
@@ -672,17 +3290,10 @@ def delete_purchase(purchase_id):
     Returns:
         Redirect: Back to the admin panel after deletion.
     """
-    purchase = Purchase.query.get(purchase_id)
-    if not purchase:
-        return jsonify({"error": "Purchase not found"}), 404
-
-    db.session.delete(purchase)
-    db.session.commit()
-
-    return redirect(url_for("admin_panel"))
+    return single_purchase_action(purchase_id, "delete")
 
 
-@app.route("/credit_purchase/<int:purchase_id>", methods=("POST", "GET"))
+@routes.route("/credit_purchase/<int:purchase_id>", methods=("POST", "GET"))
 def credit_purchase(purchase_id):
     """
     Mark a purchase as credited.
@@ -693,16 +3304,9 @@ def credit_purchase(purchase_id):
     Returns:
         Redirect: Back to the admin panel after update.
     """
-    purchase = Purchase.query.get(purchase_id)
-    if not purchase:
-        return jsonify({"error": "Purchase not found"}), 404
-
-    purchase.status = "credited"
-    db.session.commit()
-
-    return redirect(url_for("admin_panel"))
+    return single_purchase_action(purchase_id, "credited")
 
-@app.route("/confirm_purchase/<int:purchase_id>", methods=("POST", "GET"))
+@routes.route("/confirm_purchase/<int:purchase_id>", methods=("POST", "GET"))
 def confirm_purchase(purchase_id):
     """
     Confirm a purchase by updating its status to 'confirmed'.
@@ -713,16 +3317,9 @@ def confirm_purchase(purchase_id):
     Returns:
         Redirect: Back to the admin panel after confirmation.
     """
-    purchase = Purchase.query.get(purchase_id)
-    if not purchase:
-        return jsonify({"error": "Purchase not found"}), 404
+    return single_purchase_action(purchase_id, "confirmed")
 
-    purchase.status = "confirmed"
-    db.session.commit()
-
-    return redirect(url_for("admin_panel"))
-
-@app.route("/delete_account", methods=("POST",))
+@routes.route("/delete_account", methods=("POST",))
 def delete_account():
     """
     Delete the currently logged-in user's account and associated profile picture.
@@ -733,24 +3330,20 @@ def delete_account():
     if not user:
         return redirect(url_for("login"))
 
-    # Remove profile picture file if exists
-    if user.profile_pic:
-        pic_path = os.path.join(app.config["UPLOAD_FOLDER"], user.profile_pic)
-        if os.path.exists(pic_path):
-            try:
-                os.remove(pic_path)
-            except Exception:
-                # In production, log this error
-                pass
+    # Drop the user's reference to their picture; the file goes with the last one
+    old_pic = release_upload(user.profile_pic)
 
     # Delete user and commit
+    user_id = user.id
     db.session.delete(user)
     db.session.commit()
+    remove_unreferenced_upload(old_pic)
+    profile_cache.invalidate(user_id)
     session.clear()
     return redirect(url_for("login"))
 
 
-@app.route("/logout")
+@routes.route("/logout")
 def logout():
     """Clear session and return to landing page."""
     session.clear()
@@ -760,74 +3353,1000 @@ def logout():
 # ----------------------
 # API endpoints
 # ----------------------
-@app.route("/api/wallet_balance")
+@routes.route("/api/wallet_balance")
+@read_only
 def api_wallet_balance():
     """
     Return the wallet balance for the currently logged-in user as JSON.
 
     If no user is logged in, returns 0.0.
     """
-    user = current_user()
+    user = current_user_profile()
     return jsonify({"balance": float(user.wallet_balance) if user else 0.0})
 
 
+@routes.route("/api/purchases")
+@read_only
+def api_purchases():
+    """
+    Return a page of the logged-in user's purchase history as JSON.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` to load older rows;
+    a malformed cursor is answered with 400.
+    """
+    user = current_user_profile()
+    if not user:
+        return jsonify({"error": "Not logged in"}), 401
+
+    try:
+        purchases, next_cursor = user_purchase_page(user.id, request.args.get("cursor"))
+    except ValueError:
+        # Answering with the first page would append duplicates to the list
+        return jsonify({"error": "Invalid cursor"}), 400
+    return jsonify({"purchases": purchases, "next_cursor": next_cursor})
+
+
+@routes.route("/api/bundles")
+@read_only
+def api_bundles():
+    """
+    Return the active bundle catalog grouped by provider.
+
+    The catalog version doubles as a strong ETag, so clients revalidate with
+    If-None-Match and get an empty 304 until prices change.
+    """
+    catalog = bundle_catalog.refresh()
+    etag = f"bundles-{catalog.version}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(catalog.payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return response
+
+
 # ----------------------
-# Utility: import JSON data (optional)
+# Bulk data import
 # ----------------------
-def import_json_to_db(users_json_path: str, purchases_json_path: str) -> None:
+IMPORT_BATCH_SIZE = 500
+IMPORT_DEFAULT_PASSWORD = "change_me"
+
+
+def parse_import_time(value: Optional[str]) -> datetime:
+    """Parse "YYYY-MM-DD HH:MM:SS" or ISO 8601 timestamps; missing values mean now."""
+    if not value:
+        return datetime.utcnow()
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def import_user_batch(records: list, hasher: PasswordHasher) -> Tuple[int, int]:
     """
-    Optional helper to migrate existing JSON files into the database.
+    Insert one batch of users with their wallets; the caller commits.
 
-    This function is not run automatically. Call it manually if needed.
+    Existing emails are found with one IN query for the whole batch.
+    Passwords are hashed across the hasher's worker processes. Users, ledger
+    entries and snapshots are written with one multi-row INSERT each.
+    Core inserts skip the open_wallet mapper event, so the wallets are opened
+    here.
 
     Args:
-        users_json_path: Path to existing users.json (list of user dicts).
-        purchases_json_path: Path to existing purchases.json (list of purchase dicts).
-    """
-    import json
-
-    if os.path.exists(users_json_path):
-        with open(users_json_path, "r", encoding="utf-8") as fh:
-            data = json.load(fh)
-            for u in data:
-                # Skip if user already exists
-                if User.query.filter_by(email=u.get("email")).first():
-                    continue
-                user = User(
-                    username=u.get("username", "user"),
-                    email=u.get("email"),
-                    mobile=u.get("mobile"),
-                    gender=u.get("gender"),
-                    wallet_balance=float(u.get("wallet_balance", 0.0)),
-                )
-                # If JSON stored plaintext password (not ideal), set a hash
-                pwd = u.get("password", "change_me")
-                user.set_password(pwd)
-                db.session.add(user)
-            db.session.commit()
-
-    if os.path.exists(purchases_json_path):
-        with open(purchases_json_path, "r", encoding="utf-8") as fh:
-            data = json.load(fh)
-            for p in data:
-                # Find user by email
-                user = User.query.filter_by(email=p.get("email")).first()
-                if not user:
-                    continue
-                # Create purchase
-                purchase = Purchase(
-                    provider=p.get("provider"),
-                    bundle=p.get("bundle"),
-                    number=p.get("number"),
-                    amount=float(p.get("amount", 0.0)),
-                    created_at=datetime.strptime(p.get("created_at"), "%Y-%m-%d %H:%M:%S")
-                    if p.get("created_at")
-                    else datetime.utcnow(),
-                    status=p.get("status", "payment_completed"),
-                    user_id=user.id,
-                )
-                db.session.add(purchase)
-            db.session.commit()
+        records: User dicts (username, email, mobile, gender, password or
+            password_hash, wallet_balance).
+        hasher: Hasher for plaintext passwords.
+
+    Returns:
+        (inserted, skipped) counts.
+    """
+    by_email = {}
+    for record in records:
+        email = (record.get("email") or "").strip().lower()
+        if email and email not in by_email:
+            by_email[email] = record
+    if by_email:
+        existing = db.session.execute(db.select(User.email).where(User.email.in_(list(by_email)))).scalars()
+        for email in existing:
+            del by_email[email]
+    if not by_email:
+        return 0, len(records)
+
+    # Pre-hashed passwords are kept; plaintext ones are hashed in parallel
+    plaintext = [email for email, r in by_email.items() if not r.get("password_hash")]
+    hashes = dict(zip(plaintext, hasher.hash_many(
+        [by_email[email].get("password") or IMPORT_DEFAULT_PASSWORD for email in plaintext]
+    )))
+
+    rows = [
+        {
+            "username": r.get("username") or "user",
+            "email": email,
+            "mobile": r.get("mobile"),
+            "gender": r.get("gender"),
+            "password_hash": r.get("password_hash") or hashes[email],
+            "legacy_wallet_balance": 0.0,
+        }
+        for email, r in by_email.items()
+    ]
+    created = db.session.execute(
+        db.insert(User).returning(User.id, User.email, sort_by_parameter_order=True), rows
+    ).all()
+
+    now = datetime.utcnow()
+    openings = [
+        {"user_id": user_id, "amount_minor": amount, "kind": "opening", "reference": f"opening:{user_id}",
+         "created_at": now}
+        for user_id, email in created
+        if (amount := to_minor(by_email[email].get("wallet_balance") or 0))
+    ]
+    entries = {}
+    if openings:
+        entries = {
+            user_id: (entry_id, amount)
+            for entry_id, user_id, amount in db.session.execute(
+                db.insert(LedgerEntry).returning(
+                    LedgerEntry.id, LedgerEntry.user_id, LedgerEntry.amount_minor, sort_by_parameter_order=True
+                ),
+                openings,
+            )
+        }
+    db.session.execute(
+        db.insert(WalletBalance),
+        [
+            {"user_id": user_id, "balance_minor": entries.get(user_id, (0, 0))[1],
+             "last_entry_id": entries.get(user_id, (0, 0))[0], "updated_at": now}
+            for user_id, _ in created
+        ],
+    )
+    return len(created), len(records) - len(created)
+
+
+def import_status(status: Optional[str]) -> str:
+    """Map an imported purchase status to one the fulfillment engine does not claim."""
+    status = (status or "").strip() or "credited"
+    return "confirmed" if status in ("payment_completed", "fulfilling") else status
+
+
+def import_purchase_row(record: dict, user_id: int) -> Optional[dict]:
+    """Build the insert values for one imported purchase, or None if the record is unusable."""
+    if not record.get("bundle") or not record.get("number"):
+        return None
+    try:
+        amount = float(record.get("amount") or 0.0)
+        created_at = parse_import_time(record.get("created_at"))
+    except (TypeError, ValueError):
+        return None
+    return {
+        "provider": record.get("provider"),
+        "bundle": record.get("bundle"),
+        "number": record.get("number"),
+        "amount": amount,
+        "created_at": created_at,
+        "status": import_status(record.get("status")),
+        "user_id": user_id,
+    }
+
+
+def import_purchase_batch(records: list) -> Tuple[int, int]:
+    """
+    Insert one batch of purchase history; the caller commits.
+
+    Owners are resolved with one email -> id query per batch. Purchases for
+    unknown emails, and ones without a bundle or number or with an
+    unreadable amount or timestamp, are skipped. Imported history does not move wallet money
+    but is added to the daily sales rollup. It is never delivered by the
+    fulfillment engine: rows without a status are stored as credited, and
+    ones still awaiting delivery in the old system as confirmed, for an
+    admin to settle.
+
+    Returns:
+        (inserted, skipped) counts.
+    """
+    emails = {(r.get("email") or "").strip().lower() for r in records} - {""}
+    user_ids = dict(db.session.execute(db.select(User.email, User.id).where(User.email.in_(list(emails)))).all())
+    rows = [
+        row
+        for r in records
+        if (email := (r.get("email") or "").strip().lower()) in user_ids
+        and (row := import_purchase_row(r, user_ids[email])) is not None
+    ]
+    if rows:
+        db.session.execute(db.insert(Purchase), rows)
+        deltas: Dict[tuple, list] = {}
+        for row in rows:
+            key = sales_rollup_key(row["created_at"], row["provider"], row["bundle"], row["status"])
+            add_sales_delta(deltas, key, row["amount"])
+        apply_sales_deltas(deltas)
+    return len(rows), len(records) - len(rows)
+
+
+def import_data(
+    kind: str,
+    path: str,
+    fmt: Optional[str] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    hasher: Optional[PasswordHasher] = None,
+    resume: bool = True,
+    progress=None,
+) -> Dict[str, int]:
+    """
+    Stream a users or purchases file into the database in batches.
+
+    Each batch commits together with its checkpoint row. An interrupted run
+    restarted with ``resume`` skips the records already committed, so it
+    neither repeats nor loses work.
+
+    Args:
+        kind: "users" or "purchases".
+        path: JSON array, NDJSON or CSV file.
+        fmt: Input format; detected from the extension if omitted.
+        batch_size: Records per transaction.
+        hasher: Hasher for user passwords (defaults to the app's).
+        resume: Continue from the checkpoint instead of starting over.
+        progress: Optional callable(counts, elapsed_seconds), called after each batch.
+
+    Returns:
+        Counts of records read, inserted, skipped and resumed-over.
+    """
+    source = f"{kind}:{os.path.abspath(path)}:{os.path.getsize(path)}"
+    checkpoint = db.session.get(ImportCheckpoint, source)
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(source=source, rows_done=0)
+        db.session.add(checkpoint)
+    elif not resume:
+        checkpoint.rows_done, checkpoint.finished_at = 0, None
+    db.session.commit()
+
+    counts = {"read": 0, "inserted": 0, "skipped": 0, "resumed": checkpoint.rows_done}
+    records = islice(iter_records(path, fmt), checkpoint.rows_done, None)
+    started = time.perf_counter()
+    for batch in chunked(records, batch_size):
+        if kind == "users":
+            inserted, skipped = import_user_batch(batch, hasher or password_hasher)
+        else:
+            inserted, skipped = import_purchase_batch(batch)
+        checkpoint.rows_done += len(batch)
+        checkpoint.updated_at = datetime.utcnow()
+        db.session.commit()
+
+        counts["read"] += len(batch)
+        counts["inserted"] += inserted
+        counts["skipped"] += skipped
+        if progress:
+            progress(counts, time.perf_counter() - started)
+
+    checkpoint.finished_at = datetime.utcnow()
+    db.session.commit()
+    return counts
+
+
+# ----------------------
+# Data export
+# ----------------------
+EXPORT_CHUNK_SIZE = 1000
+
+
+def export_columns(kind: str) -> list:
+    """Return the selected columns for a purchases or transactions export."""
+    if kind == "purchases":
+        return [
+            Purchase.id, Purchase.created_at, Purchase.status, Purchase.provider, Purchase.bundle,
+            Purchase.number, Purchase.amount, Purchase.user_id, User.username, User.email,
+        ]
+    return [
+        Transaction.id, Transaction.at, Transaction.status, Transaction.provider, Transaction.number,
+        Transaction.amount, Transaction.reference, Transaction.user_id, User.username, User.email,
+    ]
+
+
+def export_rows(
+    kind: str,
+    status: Optional[str] = None,
+    provider: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+):
+    """
+    Yield export rows (tuples) in id order, a chunk at a time.
+
+    Each chunk is one keyset query (``id > last``) on its own short read
+    transaction from the "read" pool, streamed with yield_per. Memory stays
+    flat however many rows there are. No lock or snapshot is held between
+    chunks, so a slow download never blocks writers, even without WAL.
+
+    Args:
+        kind: "purchases" or "transactions".
+        status: Only rows with this status.
+        provider: Only rows for this provider.
+        date_from: Only rows on or after this date.
+        date_to: Only rows on or before this date (inclusive).
+        chunk_size: Rows per query.
+    """
+    model = Purchase if kind == "purchases" else Transaction
+    created = Purchase.created_at if kind == "purchases" else Transaction.at
+    stmt = db.select(*export_columns(kind)).join(User, User.id == model.user_id)
+    if status:
+        stmt = stmt.where(model.status == status)
+    if provider:
+        stmt = stmt.where(model.provider == provider)
+    if date_from:
+        stmt = stmt.where(created >= date_from)
+    if date_to:
+        stmt = stmt.where(created < date_to + timedelta(days=1))
+    stmt = stmt.order_by(model.id).limit(chunk_size)
+
+    last_id = 0
+    while True:
+        with read_engine().connect() as conn:
+            result = conn.execution_options(yield_per=chunk_size).execute(stmt.where(model.id > last_id))
+            count = 0
+            for row in result:
+                count += 1
+                yield tuple(row)
+            if count:
+                last_id = row[0]
+        if count < chunk_size:
+            return
+
+
+def export_lines(kind: str, fmt: str, rows):
+    """Render export rows as CSV (with a header row) or NDJSON text chunks."""
+    names = [column.key for column in export_columns(kind)]
+
+    def value(v):
+        return v.isoformat(sep=" ") if isinstance(v, datetime) else v
+
+    if fmt == "ndjson":
+        for row in rows:
+            yield json.dumps(dict(zip(names, map(value, row)))) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([value(v) for v in row])
+        # Hand a block to the client every few hundred rows
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gzip_stream(chunks):
+    """Gzip a stream of text chunks incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@routes.route("/admin/export/<kind>.<fmt>")
+def admin_export(kind, fmt):
+    """
+    Download purchases or transactions as CSV or NDJSON, streamed.
+
+    Query args: ``status``, ``provider``, ``from``/``to`` (inclusive dates)
+    and ``gzip=1`` for a compressed file.
+
+    NOTE: Like the rest of /admin, this route has no authentication yet.
+    """
+    if kind not in ("purchases", "transactions") or fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "Use /admin/export/<purchases|transactions>.<csv|ndjson>"}), 404
+
+    rows = export_rows(
+        kind,
+        status=request.args.get("status", "").strip() or None,
+        provider=request.args.get("provider", "").strip() or None,
+        date_from=parse_date_arg("from"),
+        date_to=parse_date_arg("to"),
+    )
+    body = export_lines(kind, fmt, rows)
+    filename = f"{kind}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    if request.args.get("gzip") in ("1", "true"):
+        body = gzip_stream(body)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    else:
+        body = (chunk.encode("utf-8") for chunk in body)
+
+    response = current_app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+# ----------------------
+# Mail outbox
+# ----------------------
+MAIL_MAX_ATTEMPTS = 6
+MAIL_RETRY_BASE = timedelta(seconds=30)  # doubled after each failed attempt
+MAIL_CLAIM_LEASE = timedelta(minutes=5)  # a crashed sender's claim expires after this
+
+
+def queue_mail(subject: str, recipients: list, body: str, reply_to: Optional[str] = None) -> OutboxMessage:
+    """
+    Add a message to the outbox; it is committed with the caller's transaction.
+
+    Use this for every outgoing mail (contact form, receipts, ...) instead of
+    calling mail.send() in a request.
+    """
+    message = OutboxMessage(
+        subject=subject,
+        recipients=",".join(recipients),
+        body=body,
+        reply_to=reply_to or None,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.session.add(message)
+    return message
+
+
+def claim_outbox_batch(batch_size: int) -> list:
+    """
+    Claim up to ``batch_size`` due messages for this sender.
+
+    Claiming sets status 'sending' and pushes next_attempt_at out by the
+    lease, in one UPDATE guarded by the same due-condition, so concurrent
+    senders never pick the same message and a crashed sender's claim lapses.
+    """
+    now = datetime.utcnow()
+    due = db.and_(OutboxMessage.status.in_(("queued", "sending")), OutboxMessage.next_attempt_at <= now)
+    ids = db.session.execute(
+        db.select(OutboxMessage.id).where(due).order_by(OutboxMessage.next_attempt_at).limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return []
+
+    claimed = db.session.execute(
+        db.update(OutboxMessage)
+        .where(OutboxMessage.id.in_(ids), due)
+        .values(status="sending", next_attempt_at=now + MAIL_CLAIM_LEASE)
+        .returning(OutboxMessage.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    return OutboxMessage.query.filter(OutboxMessage.id.in_(claimed)).order_by(OutboxMessage.id).all()
+
+
+def send_outbox(batch_size: int = 50) -> Dict[str, int]:
+    """
+    Deliver one batch of due outbox messages over a single SMTP connection.
+
+    Failed messages are rescheduled with exponential backoff and marked
+    'failed' after MAIL_MAX_ATTEMPTS. If the connection itself cannot be
+    opened, the whole batch is rescheduled.
+
+    Returns:
+        Counts of "sent", "retry" and "failed" messages.
+    """
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    messages = claim_outbox_batch(batch_size)
+    if not messages:
+        return counts
+
+    def record_failure(message: OutboxMessage, error: Exception) -> None:
+        message.attempts += 1
+        message.last_error = str(error)[:1000]
+        if message.attempts >= MAIL_MAX_ATTEMPTS:
+            message.status = "failed"
+            counts["failed"] += 1
+        else:
+            message.status = "queued"
+            message.next_attempt_at = datetime.utcnow() + MAIL_RETRY_BASE * (2 ** (message.attempts - 1))
+            counts["retry"] += 1
+
+    # Flask-Mail is only needed by the sender, so web workers never import it
+    from flask_mail import Mail, Message
+
+    mail = current_app.extensions.get("mail") or Mail(current_app).state
+    try:
+        with mail.connect() as conn:
+            for message in messages:
+                try:
+                    conn.send(
+                        Message(
+                            subject=message.subject,
+                            recipients=message.recipients.split(","),
+                            body=message.body,
+                            reply_to=message.reply_to,
+                        )
+                    )
+                except Exception as exc:  # one bad message must not sink the batch
+                    current_app.logger.warning("Outbox message %s failed: %s", message.id, exc)
+                    record_failure(message, exc)
+                else:
+                    message.status = "sent"
+                    message.sent_at = datetime.utcnow()
+                    message.attempts += 1
+                    counts["sent"] += 1
+    except Exception as exc:
+        current_app.logger.warning("SMTP connection failed: %s", exc)
+        for message in messages:
+            if message.status == "sending":
+                record_failure(message, exc)
+
+    db.session.commit()
+    return counts
+
+
+# ----------------------
+# Fulfillment
+# ----------------------
+# Paid purchases (payment_completed) are delivered by `flask fulfill`
+# through each network's provider adapter (see fulfillment.py):
+#   payment_completed -> fulfilling -> credited, or -> refunded on a hard
+#   failure (or once retries run out), with the wallet refunded.
+# A claim is a lease: next_attempt_at is pushed FULFILLMENT_LEASE ahead, so
+# orders of a crashed engine are picked up again when it lapses. Transient
+# failures keep the order in "fulfilling" with next_attempt_at set to the
+# retry time. Settings are per network, e.g. FULFILLMENT_MTN_URL, falling
+# back to FULFILLMENT_<SETTING> (FULFILLMENT_CONCURRENCY, ...).
+FULFILLMENT_NETWORKS = ("MTN", "Vodafone", "AirtelTigo")
+FULFILLMENT_LEASE = timedelta(seconds=int(os.environ.get("FULFILLMENT_LEASE_SECONDS", "120")))
+FULFILLMENT_MAX_ATTEMPTS = int(os.environ.get("FULFILLMENT_MAX_ATTEMPTS", "5"))
+FULFILLMENT_RETRY_BASE = timedelta(seconds=int(os.environ.get("FULFILLMENT_RETRY_SECONDS", "10")))  # doubled per attempt
+
+
+def network_setting(network: str, name: str, default: str) -> str:
+    """Read FULFILLMENT_<NETWORK>_<NAME>, else FULFILLMENT_<NAME>, else ``default``."""
+    return os.environ.get(
+        f"FULFILLMENT_{network.upper()}_{name}", os.environ.get(f"FULFILLMENT_{name}", default)
+    )
+
+
+def fulfillment_dispatcher(stub: bool = False) -> Dispatcher:
+    """
+    Build the dispatcher for every network that has a provider configured.
+
+    Networks without FULFILLMENT_<NETWORK>_URL are left out, so their orders
+    keep waiting for an admin as before. With ``stub`` every network uses
+    the local StubAdapter instead.
+    """
+    adapters: Dict[str, ProviderAdapter] = {}
+    limits: Dict[str, NetworkLimits] = {}
+    for network in FULFILLMENT_NETWORKS:
+        url = network_setting(network, "URL", "")
+        if stub:
+            adapters[network] = StubAdapter(network, latency=float(network_setting(network, "STUB_LATENCY", "0.05")))
+        elif url:
+            adapters[network] = HTTPProviderAdapter(network, url, network_setting(network, "KEY", ""))
+        else:
+            continue
+        limits[network] = NetworkLimits(
+            concurrency=int(network_setting(network, "CONCURRENCY", "8")),
+            rate=float(network_setting(network, "RATE", "20")),
+        )
+    return Dispatcher(adapters, limits)
+
+
+def claim_fulfillment_orders(network: str, limit: int) -> list:
+    """
+    Lease up to ``limit`` orders of one network for delivery.
+
+    Lapsed claims and retries that are due come first, then new paid
+    purchases in id order. One UPDATE guarded by the same conditions takes
+    the lease, so concurrent engines never claim the same order. Moving
+    out of payment_completed updates the sales rollup and the transition
+    log; the claim is committed before returning.
+
+    Returns:
+        Order tuples for the claimed purchases.
+    """
+    now = datetime.utcnow()
+    retry_due = db.and_(Purchase.status == "fulfilling", Purchase.next_attempt_at <= now)
+    due = db.and_(Purchase.provider == network, db.or_(Purchase.status == "payment_completed", retry_due))
+    columns = (Purchase.id, Purchase.status, Purchase.created_at, Purchase.provider, Purchase.bundle, Purchase.amount)
+    candidates = db.session.execute(
+        db.select(*columns).where(Purchase.provider == network, retry_due).order_by(Purchase.id).limit(limit)
+    ).all()
+    if len(candidates) < limit:
+        candidates += db.session.execute(
+            db.select(*columns)
+            .where(Purchase.status == "payment_completed", Purchase.provider == network)
+            .order_by(Purchase.id)
+            .limit(limit - len(candidates))
+        ).all()
+    if not candidates:
+        db.session.rollback()
+        return []
+    before = {row.id: row for row in candidates}
+
+    claimed = db.session.execute(
+        db.update(Purchase)
+        .where(Purchase.id.in_(list(before)), due)
+        .values(status="fulfilling", next_attempt_at=now + FULFILLMENT_LEASE)
+        .returning(Purchase.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+    deltas: Dict[tuple, list] = {}
+    transitions = []
+    for pid in claimed:
+        row = before[pid]
+        if row.status == "fulfilling":
+            continue  # a lapsed claim taken over: no status change
+        add_sales_delta(deltas, sales_rollup_key(row.created_at, row.provider, row.bundle, row.status), row.amount, -1)
+        add_sales_delta(deltas, sales_rollup_key(row.created_at, row.provider, row.bundle, "fulfilling"), row.amount)
+        transitions.append(
+            {"purchase_id": pid, "from_status": row.status, "to_status": "fulfilling", "actor": "fulfillment"}
+        )
+    apply_sales_deltas(deltas)
+    record_transitions(transitions)
+    db.session.commit()
+    if not claimed:
+        return []
+
+    rows = db.session.execute(
+        db.select(Purchase.id, Purchase.number, Purchase.bundle, Bundle.size_mb)
+        .outerjoin(Bundle, Bundle.id == Purchase.bundle_id)
+        .where(Purchase.id.in_(claimed))
+        .order_by(Purchase.id)
+    ).all()
+    db.session.rollback()  # no read transaction held while orders are in flight
+    # Purchases made before the catalog have only the label ("1 GB - 5.40 GHS") to size them
+    return [
+        Order(row.id, f"purchase:{row.id}", network, row.number, row.size_mb or parse_size_mb(row.bundle), row.bundle)
+        for row in rows
+    ]
+
+
+def settle_fulfillment(order: Order, provider_reference: Optional[str] = None,
+                       error: Optional[Exception] = None) -> str:
+    """
+    Record the outcome of one delivery attempt and commit.
+
+    Success credits the purchase. A transient error schedules a retry with
+    exponential backoff until FULFILLMENT_MAX_ATTEMPTS; a permanent error,
+    or the last failed attempt, refunds the wallet and marks the purchase
+    refunded. An order that could not be sent at all (UnresolvedOrderError)
+    is held: it stays "fulfilling" with no next attempt, unrefunded, until
+    an admin credits it. Nothing is written if the purchase left
+    "fulfilling" in the meantime (deleted or changed by an admin).
+
+    Returns:
+        "credited", "retry", "held", "refunded" or "superseded".
+    """
+    row = db.session.execute(
+        db.select(Purchase.id, Purchase.user_id, Purchase.created_at, Purchase.provider, Purchase.bundle,
+                  Purchase.amount, Purchase.attempts, Purchase.status)
+        .where(Purchase.id == order.purchase_id)
+        .with_for_update()
+    ).first()
+    if row is None or row.status != "fulfilling":
+        db.session.rollback()
+        return "superseded"
+
+    attempts = (row.attempts or 0) + 1
+    if error is None:
+        outcome, status, detail = "credited", "credited", provider_reference
+        values = {"provider_reference": provider_reference, "next_attempt_at": None, "last_error": None}
+    elif isinstance(error, UnresolvedOrderError):
+        outcome, status, detail = "held", "fulfilling", f"held: {error}"[:300]
+        values = {"next_attempt_at": None, "last_error": str(error)[:300]}
+    elif isinstance(error, TransientFulfillmentError) and attempts < FULFILLMENT_MAX_ATTEMPTS:
+        outcome, status, detail = "retry", "fulfilling", f"attempt {attempts}: {error}"[:300]
+        values = {
+            "next_attempt_at": datetime.utcnow() + FULFILLMENT_RETRY_BASE * (2 ** (attempts - 1)),
+            "last_error": str(error)[:300],
+        }
+    else:
+        outcome, status, detail = "refunded", "refunded", str(error)[:300]
+        values = {"next_attempt_at": None, "last_error": str(error)[:300]}
+        post_ledger_entry(row.user_id, to_minor(row.amount), "refund", reference=f"refund:purchase:{row.id}")
+
+    updated = db.session.execute(
+        db.update(Purchase)
+        .where(Purchase.id == row.id, Purchase.status == "fulfilling")
+        .values(status=status, attempts=attempts, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        db.session.rollback()  # also undoes the refund
+        return "superseded"
+
+    if status != "fulfilling":
+        deltas: Dict[tuple, list] = {}
+        add_sales_delta(deltas, sales_rollup_key(row.created_at, row.provider, row.bundle, "fulfilling"), row.amount, -1)
+        add_sales_delta(deltas, sales_rollup_key(row.created_at, row.provider, row.bundle, status), row.amount)
+        apply_sales_deltas(deltas)
+    record_transitions([{
+        "purchase_id": row.id, "from_status": "fulfilling", "to_status": status,
+        "actor": "fulfillment", "detail": detail,
+    }])
+    db.session.commit()
+    if outcome == "refunded":
+        profile_cache.invalidate(row.user_id)
+    return outcome
+
+
+def run_fulfillment(dispatcher: Dispatcher, interval: float = 0.0) -> Dict[str, int]:
+    """
+    Claim, deliver and settle orders until none are left (or forever with ``interval``).
+
+    Each network keeps up to twice its concurrency in flight and is
+    topped up once half of that has finished, so claims are batched and a
+    slow network never holds up the others. Outcomes are settled as they
+    arrive, one short transaction each.
+
+    Args:
+        dispatcher: From fulfillment_dispatcher().
+        interval: Seconds to wait for new orders when idle; 0 returns instead.
+
+    Returns:
+        Counts per outcome.
+    """
+    counts: Dict[str, int] = {}
+    in_flight: Dict[Future, Order] = {}
+    busy = {network: 0 for network in dispatcher.adapters}
+    while True:
+        for network, limits in dispatcher.limits.items():
+            if busy[network] > limits.concurrency:
+                continue
+            queued = {order.purchase_id for order in in_flight.values()}
+            for order in claim_fulfillment_orders(network, 2 * limits.concurrency - busy[network]):
+                if order.purchase_id not in queued:  # a lease that lapsed while still in flight
+                    in_flight[dispatcher.submit(order)] = order
+                    busy[network] += 1
+
+        if not in_flight:
+            if not interval:
+                return counts
+            time.sleep(interval)
+            continue
+
+        done, _ = wait(in_flight, timeout=interval or None, return_when=FIRST_COMPLETED)
+        for future in done:
+            order = in_flight.pop(future)
+            busy[order.network] -= 1
+            try:
+                outcome = settle_fulfillment(order, provider_reference=future.result())
+            except FulfillmentError as exc:
+                outcome = settle_fulfillment(order, error=exc)
+            except Exception as exc:  # an adapter bug must not stop the engine; retried like an outage
+                current_app.logger.exception("Delivery of purchase %s failed", order.purchase_id)
+                outcome = settle_fulfillment(order, error=TransientFulfillmentError(str(exc)))
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+
+# ----------------------
+# CLI commands
+# ----------------------
+@routes.cli.command("set-bundle-price")
+@click.argument("provider")
+@click.argument("size_gb", type=float)
+@click.argument("price", type=float)
+@click.option("--deactivate", is_flag=True, help="Hide the bundle instead of repricing it.")
+def set_bundle_price(provider: str, size_gb: float, price: float, deactivate: bool) -> None:
+    """
+    Create or reprice a catalog bundle, e.g. `flask set-bundle-price MTN 1 5.60`.
+
+    Bumps the catalog version so every worker reloads its price index.
+    """
+    size_mb = int(round(size_gb * 1024))
+    bundle = Bundle.query.filter_by(provider=provider, size_mb=size_mb).first()
+    if not bundle:
+        bundle = Bundle(provider=provider, size_mb=size_mb)
+        db.session.add(bundle)
+    bundle.price = round(price, 2)
+    bundle.active = not deactivate
+    bump_catalog_version()
+    db.session.commit()
+    click.echo(f"{provider} {size_gb:g} GB -> {bundle.price:.2f} GHS ({'inactive' if deactivate else 'active'})")
+
+
+@routes.cli.command("reconcile-payments")
+@click.option("--batch-size", default=100, show_default=True, help="Pending payments fetched per batch.")
+@click.option("--concurrency", default=8, show_default=True, help="Verify calls in flight at once.")
+@click.option("--loop", "interval", type=int, default=0, help="Repeat every N seconds instead of running once.")
+def reconcile_payments_command(batch_size: int, concurrency: int, interval: int) -> None:
+    """Verify, credit or expire stale pending top-ups (run from cron or with --loop)."""
+    while True:
+        counts = reconcile_pending_payments(batch_size=batch_size, concurrency=concurrency)
+        click.echo(f"{now_str()} reconcile: {counts or 'nothing to do'}")
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+@routes.cli.command("fulfill")
+@click.option("--stub", is_flag=True, help="Deliver through the local stub provider for every network.")
+@click.option("--loop", "interval", type=float, default=0, help="Keep running, polling every N seconds when idle.")
+def fulfill_command(stub: bool, interval: float) -> None:
+    """Deliver paid purchases through the network providers (run once or with --loop)."""
+    dispatcher = fulfillment_dispatcher(stub=stub)
+    if not dispatcher.adapters:
+        raise click.ClickException("No provider configured; set FULFILLMENT_<NETWORK>_URL or use --stub")
+    try:
+        while True:
+            counts = run_fulfillment(dispatcher, interval=interval)
+            click.echo(f"{now_str()} fulfill: {counts or 'nothing to do'}")
+            if not interval:
+                break
+    finally:
+        dispatcher.shutdown()
+
+
+@routes.cli.command("send-mail")
+@click.option("--batch-size", default=50, show_default=True, help="Messages sent per SMTP connection.")
+@click.option("--loop", "interval", type=int, default=0, help="Poll every N seconds instead of draining once.")
+def send_mail_command(batch_size: int, interval: int) -> None:
+    """Deliver queued outbox mail (run from cron or with --loop)."""
+    while True:
+        while True:
+            counts = send_outbox(batch_size=batch_size)
+            if any(counts.values()):
+                click.echo(f"{now_str()} send-mail: {counts}")
+            # Stop draining when nothing was delivered (empty queue or SMTP down)
+            if not counts["sent"]:
+                break
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+@routes.cli.command("rebuild-balances")
+@click.option("--check-only", is_flag=True, help="Report mismatches without repairing them.")
+def rebuild_balances_command(check_only: bool) -> None:
+    """Verify wallet balance snapshots against the ledger and repair drift."""
+    counts = rebuild_wallet_balances(repair=not check_only)
+    click.echo(f"{now_str()} rebuild-balances: {counts}")
+    if check_only and counts["mismatched"]:
+        raise SystemExit(1)
+
+
+@routes.cli.command("import-data")
+@click.option("--users", "users_path", type=click.Path(exists=True, dir_okay=False), help="Users file.")
+@click.option("--purchases", "purchases_path", type=click.Path(exists=True, dir_okay=False),
+              help="Purchase history file (imported after users).")
+@click.option("--format", "fmt", type=click.Choice(["json", "ndjson", "csv"]), default=None,
+              help="Input format (default: from the file extension).")
+@click.option("--batch-size", default=IMPORT_BATCH_SIZE, show_default=True, help="Records per transaction.")
+@click.option("--workers", default=os.cpu_count() or 1, show_default=True, help="Password hashing processes.")
+@click.option("--hash-method", default=None,
+              help="Hash method for imported passwords (default: PASSWORD_HASH_METHOD). A cheaper one "
+                   "speeds up big imports; such hashes are upgraded at each user's next login.")
+@click.option("--restart", is_flag=True, help="Ignore checkpoints and start from the first record.")
+def import_data_command(users_path, purchases_path, fmt, batch_size, workers, hash_method, restart) -> None:
+    """Bulk-import users and purchase history from JSON, NDJSON or CSV, resuming interrupted runs."""
+    hasher = PasswordHasher(method=hash_method or password_hasher.method, workers=workers)
+
+    def report(counts: dict, elapsed: float) -> None:
+        click.echo(f"{now_str()} import-data: {counts['read']} read, {counts['inserted']} inserted, "
+                   f"{counts['skipped']} skipped ({counts['read'] / elapsed:.0f} rows/s)")
+
+    try:
+        for kind, path in (("users", users_path), ("purchases", purchases_path)):
+            if path:
+                counts = import_data(kind, path, fmt, batch_size, hasher, resume=not restart, progress=report)
+                resumed = f", resumed after {counts['resumed']}" if counts["resumed"] else ""
+                click.echo(f"{now_str()} import-data {kind} done: {counts['inserted']} inserted, "
+                           f"{counts['skipped']} skipped{resumed}")
+    finally:
+        hasher.shutdown()
+
+
+@routes.cli.command("export-data")
+@click.argument("kind", type=click.Choice(["purchases", "transactions"]))
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default="csv", show_default=True)
+@click.option("--status", default=None, help="Only rows with this status.")
+@click.option("--provider", default=None, help="Only rows for this provider.")
+@click.option("--from", "date_from", type=click.DateTime(["%Y-%m-%d"]), default=None, help="First day (YYYY-MM-DD).")
+@click.option("--to", "date_to", type=click.DateTime(["%Y-%m-%d"]), default=None, help="Last day, inclusive.")
+@click.option("--gzip", "compress", is_flag=True, help="Gzip the output.")
+@click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True), default="-", show_default=True)
+def export_data_command(kind, fmt, status, provider, date_from, date_to, compress, output) -> None:
+    """Stream purchases or transactions to CSV/NDJSON (stdout by default)."""
+    rows = export_rows(kind, status=status, provider=provider, date_from=date_from, date_to=date_to)
+    body = export_lines(kind, fmt, rows)
+    body = gzip_stream(body) if compress else (chunk.encode("utf-8") for chunk in body)
+    with click.open_file(output, "wb") as out:
+        for chunk in body:
+            out.write(chunk)
+
+
+@routes.cli.command("rebuild-sales-rollups")
+@click.option("--check-only", is_flag=True, help="Report drift without rewriting the rollup.")
+def rebuild_sales_rollups_command(check_only: bool) -> None:
+    """Backfill or verify the daily sales rollup from the purchases table."""
+    counts = rebuild_sales_rollups(check_only=check_only)
+    click.echo(f"{now_str()} rebuild-sales-rollups: {counts}")
+    if check_only and counts["mismatched"]:
+        raise SystemExit(1)
+
+
+@routes.cli.command("build-assets")
+def build_assets_command() -> None:
+    """Fingerprint and precompress static assets; run at deploy time, after every change to static/."""
+    manifest = build_assets(STATIC_FOLDER, ASSET_BUILD_FOLDER)
+    current_app.extensions["asset_manifest"] = manifest
+    click.echo(f"{now_str()} build-assets: {len(manifest)} assets in {ASSET_BUILD_FOLDER}")
+
+
+@routes.cli.command("migrate")
+@click.option("--status", is_flag=True, help="List migrations and whether they have run, without applying any.")
+@click.option("--to", "target", type=int, default=None, help="Stop after this version.")
+def migrate_command(status: bool, target: Optional[int]) -> None:
+    """Apply pending schema migrations (run once per deploy, before starting workers)."""
+    if status:
+        applied = applied_migrations()
+        for version, (name, _) in sorted(MIGRATIONS.items()):
+            click.echo(f"{version:4d} {name:30s} {applied.get(version) or 'pending'}")
+        return
+    done = migrate(target)
+    click.echo(f"{now_str()} migrate: {', '.join(done) if done else 'up to date'}")
+
+
+# ----------------------
+# Application factory
+# ----------------------
+def create_app(config: Optional[dict] = None) -> Flask:
+    """
+    Build the Flask app: config, extensions, routes and request hooks.
+
+    Nothing here touches the database, so worker boots stay fast and never
+    race each other over the schema; run `flask migrate` before starting.
+
+    Args:
+        config: Overrides applied on top of the environment-based config,
+            e.g. {"SQLALCHEMY_DATABASE_URI": "sqlite://"}.
+    """
+    app = Flask(__name__)
+    app.config.update(default_config())
+    app.config.update(config or {})
+    in_memory = is_memory_sqlite(app.config["SQLALCHEMY_DATABASE_URI"])
+    if not in_memory:
+        # Pool sizing does not apply to the single connection of an in-memory database
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", dict(engine_profile["pool"]))
+    # Read-only routes get their own pool, on the primary unless a replica is
+    # given. A second pool on an in-memory primary would open a separate,
+    # empty database, so without a replica those reads use the primary.
+    if read_url or not in_memory:
+        app.config.setdefault("SQLALCHEMY_BINDS", {
+            "read": {
+                "url": read_url or app.config["SQLALCHEMY_DATABASE_URI"],
+                **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+            },
+        })
+
+    jinja_cache_dir = os.path.join(app.instance_path, "jinja_cache") if JINJA_CACHE_DIR is None else JINJA_CACHE_DIR
+    if jinja_cache_dir:
+        os.makedirs(jinja_cache_dir, exist_ok=True)
+        app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(jinja_cache_dir)}
+
+    db.init_app(app)
+    if RATE_LIMIT_ENABLED:
+        app.extensions["rate_limiter"] = SharedLimiter(RATE_LIMIT_DB or os.path.join(app.instance_path, "ratelimit.db"))
+    if TRUSTED_PROXIES:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+    if ASSETS_BUILD_ON_START:
+        app.extensions["asset_manifest"] = build_assets(STATIC_FOLDER, ASSET_BUILD_FOLDER)
+    else:
+        app.extensions["asset_manifest"] = load_manifest(ASSET_BUILD_FOLDER)
+        if not app.extensions["asset_manifest"]:
+            app.logger.warning("No asset manifest in %s; serving unversioned static files "
+                               "(run `flask build-assets`)", ASSET_BUILD_FOLDER)
+
+    if METRICS_ENABLED:
+        app.before_request(begin_request_timing)
+        # Added ahead of the blueprint's after_request hooks, so it runs last
+        # and times the whole response, compression included
+        app.after_request(record_request)
+    app.register_blueprint(routes)
+    app.view_functions["static"] = serve_static
+    return app
+
+
+# `gunicorn app:app` and `flask --app app` use this instance;
+# `gunicorn "app:create_app()"` builds one per call instead.
+app = create_app()
 
 
 # ----------------------
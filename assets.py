@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+assets.py
+
+Static asset pipeline: fingerprinting, precompression and response compression.
+
+- build_assets() copies each stylesheet/script to "<name>.<hash>.<ext>" and
+  writes .gz (and .br when the brotli package is installed) variants beside it
+- The manifest maps source names to fingerprinted names, so templates keep
+  calling url_for("static", filename="header.css") and get versioned URLs
+- Fingerprinted files never change content and can be cached as immutable
+- compress_body() compresses dynamic responses on the fly
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # pinned in requirements.txt; without it only gzip is served
+    brotli = None
+
+# Extensions that are fingerprinted and precompressed
+ASSET_EXTENSIONS = (".css", ".js", ".svg")
+
+# Preferred first: (Content-Encoding, file suffix)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz")) if brotli else (("gzip", ".gz"),)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Write via a temp file and rename, so concurrent builders never expose partial files."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_assets(source_folder: str, build_folder: str) -> Dict[str, str]:
+    """
+    Fingerprint and precompress the assets under ``source_folder``.
+
+    Files already built for the same content are left alone, so running this
+    on every start is cheap.
+
+    Args:
+        source_folder: The app's static folder.
+        build_folder: Output folder (inside the static folder so it is served).
+
+    Returns:
+        Manifest mapping source paths (relative, "/"-separated) to built paths.
+    """
+    manifest = {}
+    build_folder = os.path.abspath(build_folder)
+    os.makedirs(build_folder, exist_ok=True)
+    for root, dirs, files in os.walk(source_folder):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != build_folder]
+        for filename in files:
+            if not filename.endswith(ASSET_EXTENSIONS):
+                continue
+            source = os.path.join(root, filename)
+            rel = os.path.relpath(source, source_folder).replace(os.sep, "/")
+            with open(source, "rb") as fh:
+                data = fh.read()
+
+            stem, ext = os.path.splitext(rel)
+            built = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            target = os.path.join(build_folder, built)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                _write_atomic(target + ".gz", gzip.compress(data, 9, mtime=0))
+                if brotli:
+                    _write_atomic(target + ".br", brotli.compress(data, quality=11))
+                _write_atomic(target, data)  # last: its presence marks the set complete
+            manifest[rel] = built
+
+    _write_atomic(os.path.join(build_folder, MANIFEST_NAME), json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+
+def load_manifest(build_folder: str) -> Dict[str, str]:
+    """Return the manifest written by build_assets(), or {} if there is none."""
+    try:
+        with open(os.path.join(build_folder, MANIFEST_NAME), encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def pick_encoding(accept_encodings) -> Optional[tuple]:
+    """
+    Choose the best available encoding the client accepts.
+
+    Args:
+        accept_encodings: ``request.accept_encodings``.
+
+    Returns:
+        (Content-Encoding, file suffix), or None for identity.
+    """
+    for encoding, suffix in ENCODINGS:
+        if accept_encodings[encoding] > 0:
+            return encoding, suffix
+    return None
+
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """Compress a dynamic response body with a speed-oriented level."""
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, 6)
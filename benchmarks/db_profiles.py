@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/db_profiles.py
+
+Compare database engine profiles (DB_PROFILE) under a mixed workload.
+
+For each profile a fresh SQLite database is seeded, then writer processes
+buy bundles while reader processes load the dashboard and poll the wallet
+balance, like several gunicorn workers would. Reported per profile:
+throughput, read/write p50/p95 latency and the number of failed requests
+("database is locked" and friends).
+
+Usage:
+    python -m benchmarks.db_profiles --writers 2 --readers 4 --seconds 5
+    python -m benchmarks.db_profiles --profiles sqlite-wal
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+USERS = 50
+
+
+def load_app(db_file: str, profile: str):
+    """Import the app bound to the benchmark database and profile."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+    os.environ["DB_PROFILE"] = profile
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")  # measure the routes, not the limits
+    import app as app_module
+
+    return app_module
+
+
+def seed(db_file: str, profile: str) -> None:
+    """Create USERS funded users with some purchase history each."""
+    app_module = load_app(db_file, profile)
+    with app_module.app.app_context():
+        app_module.migrate()
+        for i in range(USERS):
+            user = app_module.User(username=f"user{i}", email=f"user{i}@example.com", password_hash="x")
+            app_module.db.session.add(user)
+            app_module.db.session.flush()
+            app_module.post_ledger_entry(user.id, 100_000_000, "adjustment")
+        for i in range(USERS * 40):
+            app_module.db.session.add(app_module.Purchase(
+                provider="MTN", bundle="1 GB - 5.40 GHS", number="0550000000", amount=5.4,
+                user_id=(i % USERS) + 1,
+            ))
+        app_module.db.session.commit()
+
+
+def run_worker(db_file: str, profile: str, role: str, index: int, seconds: float, results) -> None:
+    """Drive either purchases (writer) or dashboard/balance reads (reader)."""
+    app_module = load_app(db_file, profile)
+    client = app_module.app.test_client()
+    user_id = (index % USERS) + 1
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if role == "writer":
+            resp = client.post(
+                "/purchase",
+                data={"network": "MTN", "bundle_id": 1, "mobile": "0550000000"},
+                headers={"X-Requested-With": "fetch"},
+            )
+        elif n % 2:
+            resp = client.get("/dashboard")
+        else:
+            resp = client.get("/api/wallet_balance")
+        n += 1
+        if resp.status_code >= 500:
+            failures += 1
+        else:
+            latencies.append(time.perf_counter() - started)
+    results.put((role, latencies, failures))
+
+
+def percentile(values, pct: float) -> float:
+    """Return the pct-th percentile (0-100) in milliseconds."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000
+
+
+def bench_profile(profile: str, writers: int, readers: int, seconds: float) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        ctx = multiprocessing.get_context("spawn")
+        seeder = ctx.Process(target=seed, args=(db_file, profile))
+        seeder.start()
+        seeder.join()
+
+        results = ctx.Queue()
+        roles = ["writer"] * writers + ["reader"] * readers
+        procs = [
+            ctx.Process(target=run_worker, args=(db_file, profile, role, i, seconds, results))
+            for i, role in enumerate(roles)
+        ]
+        for proc in procs:
+            proc.start()
+        outcomes = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    by_role = {"writer": ([], 0), "reader": ([], 0)}
+    for role, latencies, failures in outcomes:
+        lat, fail = by_role[role]
+        by_role[role] = (lat + latencies, fail + failures)
+
+    total = sum(len(lat) for lat, _ in by_role.values())
+    print(f"{profile:15s} {total / seconds:8.1f} req/s", end="")
+    for role in ("writer", "reader"):
+        lat, fail = by_role[role]
+        median = statistics.median(lat) * 1000 if lat else float("nan")
+        print(f" | {role}s p50 {median:6.1f} ms p95 {percentile(lat, 95):6.1f} ms failed {fail}", end="")
+    print()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare DB_PROFILE settings under a mixed workload")
+    parser.add_argument("--profiles", nargs="+", default=["sqlite-default", "sqlite-wal"])
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        bench_profile(profile, args.writers, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/fake_paystack.py
+
+Local stand-in for the Paystack transaction API.
+
+Implements just what the app calls:
+- POST /transaction/initialize -> reference + authorization_url
+- GET  /transaction/verify/<reference> -> transaction status
+- GET  /pay/<reference> -> marks the transaction paid and redirects to the
+  callback_url, like the hosted checkout page would
+
+Latency and failure rate are configurable so timeouts, retries and the
+circuit breaker can be exercised. Point the app at it with
+PAYSTACK_BASE_URL=http://127.0.0.1:<port>.
+
+Usage:
+    python -m benchmarks.fake_paystack --port 8765 --latency 0.05 --fail-rate 0.1
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import urlencode
+
+
+class FakePaystackServer(ThreadingHTTPServer):
+    """HTTP server holding the fake transaction store and fault settings."""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, fail_rate: float = 0.0, auto_succeed: bool = False):
+        super().__init__(address, FakePaystackHandler)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.auto_succeed = auto_succeed
+        self.transactions = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        """Ignore clients that hang up early (e.g. after their read timeout)."""
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class FakePaystackHandler(BaseHTTPRequestHandler):
+    """Request handler emulating Paystack's JSON envelope ({status, message, data})."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def log_message(self, format, *args):  # noqa: A002 - silence per-request logging
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _faulty(self) -> bool:
+        """Apply the configured latency; return True if this call should fail."""
+        server = self.server
+        with server.lock:
+            server.calls += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_rate and random.random() < server.fail_rate:
+            self._send_json(503, {"status": False, "message": "Service unavailable"})
+            return True
+        return False
+
+    def do_POST(self):  # noqa: N802 - http.server naming
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self._faulty():
+            return
+        if self.path != "/transaction/initialize":
+            self._send_json(404, {"status": False, "message": "Not found"})
+            return
+
+        reference = uuid.uuid4().hex[:12]
+        with self.server.lock:
+            self.server.transactions[reference] = {
+                "status": "success" if self.server.auto_succeed else "abandoned",
+                "amount": body.get("amount"),
+                "email": body.get("email"),
+                "callback_url": body.get("callback_url"),
+            }
+        self._send_json(200, {
+            "status": True,
+            "message": "Authorization URL created",
+            "data": {
+                "reference": reference,
+                "authorization_url": f"{self.server.base_url}/pay/{reference}",
+                "access_code": reference,
+            },
+        })
+
+    def do_GET(self):  # noqa: N802 - http.server naming
+        if self.path.startswith("/pay/"):
+            reference = self.path.rsplit("/", 1)[1]
+            with self.server.lock:
+                txn = self.server.transactions.get(reference)
+                if txn:
+                    txn["status"] = "success"
+            self.send_response(302 if txn else 404)
+            if txn:
+                self.send_header("Location", f"{txn['callback_url']}?{urlencode({'reference': reference})}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self._faulty():
+            return
+        if not self.path.startswith("/transaction/verify/"):
+            self._send_json(404, {"status": False, "message": "Not found"})
+            return
+
+        reference = self.path.rsplit("/", 1)[1]
+        with self.server.lock:
+            txn = self.server.transactions.get(reference)
+        if not txn:
+            self._send_json(400, {"status": False, "message": "Transaction reference not found"})
+            return
+        self._send_json(200, {
+            "status": True,
+            "message": "Verification successful",
+            "data": {"reference": reference, "status": txn["status"], "amount": txn["amount"]},
+        })
+
+
+def start_fake_paystack(
+    port: int = 0, latency: float = 0.0, fail_rate: float = 0.0, auto_succeed: bool = False
+) -> Tuple[FakePaystackServer, threading.Thread]:
+    """Start the stand-in on a background thread; port 0 picks a free port."""
+    server = FakePaystackServer(("127.0.0.1", port), latency, fail_rate, auto_succeed)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Paystack API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each API call")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of API calls answering 503")
+    parser.add_argument("--auto-succeed", action="store_true", help="mark transactions paid on creation")
+    args = parser.parse_args()
+
+    server = FakePaystackServer(("127.0.0.1", args.port), args.latency, args.fail_rate, args.auto_succeed)
+    print(f"Fake Paystack listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
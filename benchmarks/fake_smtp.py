@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/fake_smtp.py
+
+Local SMTP stand-in that accepts and records messages.
+
+Speaks the small subset of SMTP that smtplib/Flask-Mail use (EHLO/HELO,
+MAIL, RCPT, DATA, RSET, NOOP, QUIT) without TLS or auth. Point the app at it
+with MAIL_SERVER=127.0.0.1 MAIL_PORT=<port> MAIL_USE_TLS=false.
+
+Usage:
+    python -m benchmarks.fake_smtp --port 8025 --latency 0.2
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+from typing import Tuple
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """SMTP server that stores received messages and counts connections."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency: float = 0.0, fail_every: int = 0):
+        super().__init__(address, FakeSMTPHandler)
+        self.latency = latency  # seconds added to the greeting, like a slow TLS handshake
+        self.fail_every = fail_every  # reject every Nth message (0 = never)
+        self.messages = []
+        self.received = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """One SMTP session."""
+
+    disable_nagle_algorithm = True
+
+    def reply(self, line: str) -> None:
+        self.wfile.write((line + "\r\n").encode("ascii"))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        if server.latency:
+            time.sleep(server.latency)
+        self.reply("220 fake-smtp ready")
+
+        sender, recipients = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command = raw.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 fake-smtp")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip(), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip())
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line)
+                with server.lock:
+                    server.received += 1
+                    rejected = server.fail_every and server.received % server.fail_every == 0
+                    if not rejected:
+                        server.messages.append(
+                            {"from": sender, "to": recipients, "data": b"".join(lines).decode("utf-8", "replace")}
+                        )
+                self.reply("554 Rejected" if rejected else "250 Queued")
+            elif verb == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+def start_fake_smtp(port: int = 0, latency: float = 0.0, fail_every: int = 0) -> Tuple[FakeSMTPServer, threading.Thread]:
+    """Start the stand-in on a background thread; port 0 picks a free port."""
+    server = FakeSMTPServer(("127.0.0.1", port), latency, fail_every)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local SMTP stand-in")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the greeting")
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(("127.0.0.1", args.port), args.latency)
+    print(f"Fake SMTP listening on 127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
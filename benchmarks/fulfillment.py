@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/fulfillment.py
+
+Throughput and correctness of the fulfillment engine (`flask fulfill`).
+
+A throwaway database is filled with paid purchases spread over the three
+networks, then run_fulfillment delivers them through StubAdapters that
+sleep for --latency and fail at the given transient and permanent rates.
+Reported: orders per minute, outcomes, and each network's peak number of
+concurrent deliveries against its limit. The run then checks that every
+order ended credited or refunded, that each refund has exactly one ledger
+entry, and that the wallet snapshots and sales rollups still match.
+
+Usage:
+    python -m benchmarks.fulfillment --orders 2000 --latency 0.2 --concurrency 16
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per provider call")
+    parser.add_argument("--concurrency", type=int, default=16, help="deliveries in flight per network")
+    parser.add_argument("--rate", type=float, default=200, help="deliveries started per second per network")
+    parser.add_argument("--transient", type=float, default=0.05, help="share of calls failing transiently")
+    parser.add_argument("--permanent", type=float, default=0.01, help="share of calls rejected")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault("ASSETS_BUILD_ON_START", "false")
+    os.environ["FULFILLMENT_RETRY_SECONDS"] = "0"  # retry at once; the backoff is not what is measured
+    import app as app_module
+    from fulfillment import Dispatcher, NetworkLimits, StubAdapter
+
+    db = app_module.db
+    rng = random.Random(args.seed)
+    with app_module.app.app_context():
+        app_module.migrate()
+        user = app_module.User(username="bench", email="bench@example.com")
+        user.set_password("bench")
+        db.session.add(user)
+        db.session.flush()
+        bundles = db.session.execute(db.select(app_module.Bundle)).scalars().all()
+        rows = []
+        for n in range(args.orders):
+            bundle = rng.choice(bundles)
+            rows.append({
+                "provider": bundle.provider,
+                "bundle": f"{bundle.size_mb // 1024} GB - {bundle.price:.2f} GHS",
+                "bundle_id": bundle.id,
+                "number": f"024{rng.randrange(10 ** 7):07d}",
+                "amount": bundle.price,
+                "status": "payment_completed",
+                "user_id": user.id,
+                "created_at": datetime.utcnow(),
+            })
+        db.session.execute(db.insert(app_module.Purchase), rows)
+        db.session.commit()
+        app_module.rebuild_sales_rollups()
+
+        adapters = {
+            network: StubAdapter(network, latency=args.latency, transient_rate=args.transient,
+                                 permanent_rate=args.permanent, seed=args.seed + i)
+            for i, network in enumerate(app_module.FULFILLMENT_NETWORKS)
+        }
+        limits = {network: NetworkLimits(args.concurrency, args.rate) for network in adapters}
+        dispatcher = Dispatcher(adapters, limits)
+        started = time.perf_counter()
+        try:
+            counts = app_module.run_fulfillment(dispatcher)
+        finally:
+            dispatcher.shutdown()
+        elapsed = time.perf_counter() - started
+
+        statuses = dict(db.session.execute(
+            db.select(app_module.Purchase.status, db.func.count()).group_by(app_module.Purchase.status)
+        ).all())
+        refunds = db.session.execute(
+            db.select(db.func.count()).select_from(app_module.LedgerEntry)
+            .where(app_module.LedgerEntry.kind == "refund")
+        ).scalar()
+        transitions = db.session.execute(
+            db.select(db.func.count()).select_from(app_module.PurchaseTransition)
+        ).scalar()
+        wallets = app_module.rebuild_wallet_balances(repair=False)
+        rollups = app_module.rebuild_sales_rollups(check_only=True)
+
+    print(f"orders: {args.orders}  latency: {args.latency}s  limits: {args.concurrency} in flight, "
+          f"{args.rate:g}/s per network")
+    print(f"elapsed: {elapsed:.2f}s  throughput: {args.orders / elapsed * 60:,.0f} orders/min")
+    print(f"outcomes: {counts}")
+    print(f"final statuses: {statuses}  transitions logged: {transitions}")
+    for network, adapter in adapters.items():
+        print(f"  {network:10s} peak in flight {adapter.peak_in_flight:3d} / {args.concurrency}")
+
+    problems = []
+    if set(statuses) - {"credited", "refunded"}:
+        problems.append("orders left undelivered")
+    if refunds != statuses.get("refunded", 0):
+        problems.append(f"{refunds} refund entries for {statuses.get('refunded', 0)} refunded orders")
+    if any(adapter.peak_in_flight > args.concurrency for adapter in adapters.values()):
+        problems.append("a network exceeded its concurrency limit")
+    if wallets["mismatched"]:
+        problems.append(f"{wallets['mismatched']} wallet snapshots drifted")
+    if rollups["mismatched"]:
+        problems.append(f"{rollups['mismatched']} sales rollup rows drifted")
+    print("consistency: " + ("; ".join(problems) if problems else "ok"))
+    if problems:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
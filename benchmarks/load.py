@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/load.py
+
+Concurrent route benchmarks with saved baselines.
+
+Worker processes (standing in for gunicorn workers) drive the app's routes
+through the Flask test client against a copy of a seeded database
+(benchmarks/seed.py), with top-ups going to the local Paystack stand-in.
+Each scenario reports throughput, p50/p95/p99 latency, error count and SQL
+statements per request. Results can be saved as a named baseline and later
+runs compared against it; a p95 regression beyond --threshold fails the run.
+
+Scenarios: dashboard, purchase, admin, api_purchases, topup, login.
+
+Usage:
+    python -m benchmarks.seed --db /tmp/bench.db --scale small
+    python -m benchmarks.load --db /tmp/bench.db --save-baseline main
+    python -m benchmarks.load --db /tmp/bench.db --compare main
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+
+import requests
+
+from benchmarks.fake_paystack import start_fake_paystack
+from benchmarks.seed import PASSWORD, user_email
+
+SCENARIOS = ("dashboard", "purchase", "admin", "api_purchases", "topup", "login")
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def load_app(db_file: str, paystack_url: str, profile: str):
+    """Import the app bound to the benchmark database (env must be set first)."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+    os.environ["DB_PROFILE"] = profile
+    os.environ["PAYSTACK_BASE_URL"] = paystack_url
+    os.environ.setdefault("ASSETS_BUILD_ON_START", "false")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")  # measure the routes, not the limits
+    import app as app_module
+
+    return app_module
+
+
+class SQLCounter:
+    """Counts statements sent to the database by this process."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+
+def run_request(client, scenario: str, rng: random.Random, users: int, bundle_ids: list) -> int:
+    """Issue one scenario request as a random seeded user; return the HTTP status."""
+    user_id = rng.randint(1, users)
+    if scenario == "login":
+        resp = client.post("/login", data={"email": user_email(user_id), "password": PASSWORD})
+        return 200 if resp.status_code == 302 and "dashboard" in resp.location else resp.status_code
+
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+    if scenario == "dashboard":
+        return client.get("/dashboard").status_code
+    if scenario == "api_purchases":
+        return client.get("/api/purchases").status_code
+    if scenario == "admin":
+        # First page, or a filtered page, like an operator clicking around
+        args = "" if rng.random() < 0.5 else f"?status=confirmed&provider={rng.choice(['MTN', 'Vodafone'])}"
+        return client.get(f"/admin{args}").status_code
+    if scenario == "purchase":
+        resp = client.post(
+            "/purchase",
+            data={"bundle_id": rng.choice(bundle_ids), "mobile": "0240000000"},
+            headers={"X-Requested-With": "fetch"},
+        )
+        return resp.status_code
+    if scenario == "topup":
+        resp = client.post("/initiate_payment", data={"amount": "10", "provider": "MTN", "number": "0240000000"})
+        if resp.status_code != 302:
+            return resp.status_code
+        # Pay on the stand-in's checkout page, then follow its redirect back to the app
+        paid = requests.get(resp.location, allow_redirects=False, timeout=5)
+        callback = paid.headers["Location"]
+        return client.get(callback[callback.index("/verify_payment"):]).status_code
+    raise ValueError(scenario)
+
+
+def worker(db_file, paystack_url, profile, scenario, index, users, seconds, warmup, results) -> None:
+    """Run one scenario for ``seconds`` and report latencies and SQL counts."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    app_module = load_app(db_file, paystack_url, profile)
+    counter = SQLCounter()
+    event.listen(Engine, "before_cursor_execute", counter)
+    with app_module.app.app_context():
+        bundle_ids = [b.id for b in app_module.Bundle.query.filter_by(active=True)]
+
+    client = app_module.app.test_client()
+    rng = random.Random(index)
+    latencies, statements, errors = [], [], 0
+    warm_until = time.perf_counter() + warmup
+    deadline = warm_until + seconds
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        before = counter.count
+        status = run_request(client, scenario, rng, users, bundle_ids)
+        elapsed = time.perf_counter() - now
+        if now < warm_until:
+            continue
+        if status >= 400:
+            errors += 1
+        latencies.append(elapsed)
+        statements.append(counter.count - before)
+    results.put((scenario, latencies, statements, errors))
+
+
+def percentile(values: list, pct: float) -> float:
+    """Return the pct-th percentile (0-100) of sorted ``values`` in milliseconds."""
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+def run_scenario(seed_db, scenario, workers, seconds, warmup, profile, paystack_url) -> dict:
+    """Run one scenario on a fresh copy of the seeded database."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        # The backup API includes pages still in the seed database's WAL file
+        source, target = sqlite3.connect(seed_db), sqlite3.connect(db_file)
+        source.backup(target)
+        users = target.execute("select count(*) from users").fetchone()[0]
+        source.close()
+        target.close()
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(target=worker, args=(db_file, paystack_url, profile, scenario, i, users, seconds, warmup, results))
+            for i in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+        outcomes = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    latencies = sorted(lat for o in outcomes for lat in o[1])
+    statements = [s for o in outcomes for s in o[2]]
+    return {
+        "requests": len(latencies),
+        "errors": sum(o[3] for o in outcomes),
+        "throughput": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "sql_per_request": round(sum(statements) / len(statements), 2) if statements else None,
+    }
+
+
+def git_commit() -> str:
+    """Return the current commit id, or "" outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print changes against a baseline; return False if any p95 regressed beyond ``threshold``."""
+    ok = True
+    print(f"\ncompared with baseline from {baseline['meta'].get('commit') or '?'} ({baseline['meta'].get('saved_at')}):")
+    for scenario, current in results.items():
+        before = baseline["results"].get(scenario)
+        if not before:
+            print(f"  {scenario:14s} (not in baseline)")
+            continue
+        p95_change = (current["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        tput_change = (current["throughput"] - before["throughput"]) / before["throughput"] if before["throughput"] else 0.0
+        regressed = p95_change > threshold
+        ok = ok and not regressed
+        print(f"  {scenario:14s} p95 {before['p95_ms']:8.2f} -> {current['p95_ms']:8.2f} ms ({p95_change:+.0%})  "
+              f"throughput {tput_change:+.0%}  sql/req {before['sql_per_request']} -> {current['sql_per_request']}"
+              f"{'  REGRESSED' if regressed else ''}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent route benchmarks with baselines")
+    parser.add_argument("--db", required=True, help="database made by benchmarks.seed (copied per scenario)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds per worker not measured")
+    parser.add_argument("--profile", default="sqlite-wal", help="DB_PROFILE for the app")
+    parser.add_argument("--paystack-latency", type=float, default=0.05, help="stand-in latency per API call")
+    parser.add_argument("--save-baseline", metavar="NAME", help="write results to benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with benchmarks/baselines/NAME.json")
+    parser.add_argument("--threshold", type=float, default=0.20, help="allowed p95 regression (fraction)")
+    args = parser.parse_args()
+
+    server, _ = start_fake_paystack(latency=args.paystack_latency)
+    results = {}
+    print(f"{'scenario':14s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'sql/req':>8s} {'errors':>7s}")
+    for scenario in args.scenarios:
+        r = run_scenario(args.db, scenario, args.workers, args.seconds, args.warmup, args.profile, server.base_url)
+        results[scenario] = r
+        print(f"{scenario:14s} {r['throughput']:8.1f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['p99_ms']:8.2f} "
+              f"{r['sql_per_request']!s:>8s} {r['errors']:7d}")
+    server.shutdown()
+
+    meta = {
+        "commit": git_commit(),
+        "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "workers": args.workers,
+        "seconds": args.seconds,
+        "profile": args.profile,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+    }
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({"meta": meta, "results": results}, fh, indent=2)
+        print(f"\nbaseline saved to {path}")
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json"), encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if not compare(results, baseline, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
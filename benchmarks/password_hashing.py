@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/password_hashing.py
+
+Password hashing cost per setting, and the worker pool under a login burst.
+
+For each method string the run reports how many password checks one core
+manages per second, which is the login ceiling per hashing worker. The burst
+scenario then fires more concurrent checks at a PasswordHasher than its
+queue holds and counts how many were turned away (PasswordHasherBusy)
+instead of piling up.
+
+Usage:
+    python -m benchmarks.password_hashing
+    python -m benchmarks.password_hashing --methods scrypt:16384:8:1 pbkdf2:sha256:600000 --seconds 3
+"""
+
+import argparse
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from passwords import PasswordHasher, PasswordHasherBusy
+
+DEFAULT_METHODS = [
+    "scrypt:16384:8:1",
+    "scrypt:32768:8:1",
+    "scrypt:65536:8:1",
+    "pbkdf2:sha256:600000",
+]
+
+
+def logins_per_core(method: str, seconds: float) -> float:
+    """Return check_password_hash calls per second on one core."""
+    stored = generate_password_hash("correct horse", method)
+    checks = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        check_password_hash(stored, "correct horse")
+        checks += 1
+    return checks / (time.perf_counter() - started)
+
+
+def scenario_burst(method: str, workers: int, queue_limit: int, clients: int, wait: float) -> None:
+    """Run ``clients`` concurrent checks against a bounded hasher."""
+    hasher = PasswordHasher(method, workers=workers, queue_limit=queue_limit, wait=wait)
+    stored = hasher.hash("correct horse")  # also starts the pool
+
+    outcomes = {"ok": 0, "busy": 0}
+    lock = threading.Lock()
+
+    def client() -> None:
+        try:
+            hasher.verify(stored, "correct horse")
+            key = "ok"
+        except PasswordHasherBusy:
+            key = "busy"
+        with lock:
+            outcomes[key] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+
+    print(f"[burst] {method}: {clients} concurrent logins, {workers} worker(s), queue {queue_limit}, "
+          f"wait {wait}s -> {outcomes['ok']} checked, {outcomes['busy']} turned away in {elapsed:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Password hashing cost and pool back-pressure")
+    parser.add_argument("--methods", nargs="+", default=DEFAULT_METHODS)
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent measuring each method")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--queue", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=40)
+    parser.add_argument("--wait", type=float, default=0.5)
+    args = parser.parse_args()
+
+    for method in args.methods:
+        rate = logins_per_core(method, args.seconds)
+        print(f"{method:24s} {rate:8.1f} logins/s per core ({1000 / rate:7.1f} ms per check)")
+
+    scenario_burst(args.methods[0], args.workers, args.queue, args.clients, args.wait)
+
+
+if __name__ == "__main__":
+    main()
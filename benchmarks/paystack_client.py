@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/paystack_client.py
+
+Exercise paystack.PaystackClient against the local Paystack stand-in.
+
+Scenarios:
+- pooled:   verify calls over one keep-alive session vs a new connection per call
+- slow:     a stand-in slower than the read timeout; calls must give up in bounded time
+- degraded: every call fails; the circuit breaker must open and later calls fail fast
+
+Usage:
+    python -m benchmarks.paystack_client --calls 200
+"""
+
+import argparse
+import time
+
+import requests
+
+from benchmarks.fake_paystack import start_fake_paystack
+from paystack import CircuitBreaker, PaystackClient, PaystackError, PaystackUnavailable
+
+
+def scenario_pooled(calls: int) -> None:
+    """Compare pooled-session verify latency with one-connection-per-call."""
+    server, _ = start_fake_paystack(auto_succeed=True)
+    client = PaystackClient("sk_test", base_url=server.base_url)
+    reference = client.initialize("bench@example.com", 100, "http://localhost/cb")["data"]["reference"]
+
+    started = time.perf_counter()
+    for _ in range(calls):
+        client.verify(reference)
+    pooled = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(calls):
+        requests.get(f"{server.base_url}/transaction/verify/{reference}", timeout=5).json()
+    unpooled = time.perf_counter() - started
+    server.shutdown()
+
+    print(f"[pooled]   {calls} verifies: pooled {pooled / calls * 1000:.2f} ms/call, "
+          f"new connection {unpooled / calls * 1000:.2f} ms/call")
+
+
+def scenario_slow() -> bool:
+    """A call to a stalled Paystack must end near the read timeout."""
+    server, _ = start_fake_paystack(latency=1.0)
+    client = PaystackClient("sk_test", base_url=server.base_url, read_timeout=0.2, max_retries=1, backoff=0.01)
+
+    started = time.perf_counter()
+    try:
+        client.verify("missing")
+        timed_out = False
+    except PaystackError:
+        timed_out = True
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    bounded = timed_out and elapsed < 1.0
+    print(f"[slow]     gave up after {elapsed:.2f}s (read timeout 0.2s, 1 retry): "
+          f"{'ok' if bounded else 'NOT BOUNDED'}")
+    return bounded
+
+
+def scenario_degraded(calls: int) -> bool:
+    """With every call failing, the breaker must open and short-circuit the rest."""
+    server, _ = start_fake_paystack(fail_rate=1.0)
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    client = PaystackClient("sk_test", base_url=server.base_url, max_retries=1, backoff=0.01, breaker=breaker)
+
+    fast_failures = 0
+    started = time.perf_counter()
+    for _ in range(calls):
+        try:
+            client.verify("any")
+        except PaystackUnavailable:
+            fast_failures += 1
+        except PaystackError:
+            pass
+    elapsed = time.perf_counter() - started
+    reached = server.calls
+    server.shutdown()
+
+    opened = breaker.state == "open" and fast_failures == calls - 3
+    print(f"[degraded] {calls} calls in {elapsed * 1000:.1f} ms, {reached} reached Paystack, "
+          f"{fast_failures} failed fast; breaker {breaker.state}: {'ok' if opened else 'UNEXPECTED'}")
+    return opened
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PaystackClient scenarios against the local stand-in")
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    scenario_pooled(args.calls)
+    ok = scenario_slow() and scenario_degraded(args.calls)
+    print("RESULT:", "ok" if ok else "FAILED")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
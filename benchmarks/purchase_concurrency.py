@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/purchase_concurrency.py
+
+Concurrency benchmark for the /purchase wallet debit path.
+
+Several worker processes (standing in for gunicorn workers) buy bundles from
+the same account at once against a throwaway SQLite database. The run checks
+that no update was lost (final balance == start - successful purchases), that
+the wallet never went negative, and that requests sharing an idempotency key
+created exactly one purchase. Throughput is reported in purchases per second.
+
+Usage:
+    python -m benchmarks.purchase_concurrency --workers 4 --requests 200
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+
+BUNDLE = "1 GB - 5.40 GHS"
+PRICE = 5.40
+EMAIL = "bench@example.com"
+
+
+def load_app(db_file: str):
+    """Import the app bound to the benchmark database (env must be set first)."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")  # measure the routes, not the limits
+    import app as app_module
+
+    return app_module
+
+
+def setup(db_file: str, balance: float) -> None:
+    """Create the schema and a single funded user."""
+    app_module = load_app(db_file)
+    with app_module.app.app_context():
+        app_module.migrate()
+        user = app_module.User(username="bench", email=EMAIL)
+        user.set_password("bench")
+        app_module.db.session.add(user)
+        app_module.db.session.flush()
+        app_module.post_ledger_entry(user.id, app_module.to_minor(balance), "adjustment")
+        app_module.db.session.commit()
+
+
+def worker(db_file: str, requests_per_worker: int, shared_key: str, results) -> None:
+    """Issue purchases through the Flask test client and record outcomes."""
+    app_module = load_app(db_file)
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["email"] = EMAIL
+
+    ok = rejected = errors = 0
+    for i in range(requests_per_worker):
+        # Every worker's first request reuses one key: a simulated double-click
+        key = shared_key if i == 0 else uuid.uuid4().hex
+        resp = client.post(
+            "/purchase",
+            data={"network": "MTN", "bundle": BUNDLE, "mobile": "0550000000"},
+            headers={"X-Requested-With": "fetch", "Idempotency-Key": key},
+        )
+        if resp.status_code == 200:
+            ok += 1
+        elif resp.status_code == 400:
+            rejected += 1
+        else:
+            errors += 1
+    results.put((ok, rejected, errors))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200, help="requests per worker")
+    parser.add_argument("--balance", type=float, default=None,
+                        help="starting balance (default: enough for 3/4 of all requests)")
+    args = parser.parse_args()
+
+    total = args.workers * args.requests
+    balance = args.balance if args.balance is not None else round(PRICE * total * 0.75, 2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        setup(db_file, balance)
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        shared_key = uuid.uuid4().hex
+        procs = [
+            ctx.Process(target=worker, args=(db_file, args.requests, shared_key, results))
+            for _ in range(args.workers)
+        ]
+        started = time.perf_counter()
+        for proc in procs:
+            proc.start()
+        outcomes = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - started
+
+        ok = sum(o[0] for o in outcomes)
+        rejected = sum(o[1] for o in outcomes)
+        errors = sum(o[2] for o in outcomes)
+
+        app_module = load_app(db_file)
+        with app_module.app.app_context():
+            user = app_module.User.query.filter_by(email=EMAIL).one()
+            drift = app_module.rebuild_wallet_balances(repair=False)["mismatched"]
+            purchases = app_module.Purchase.query.filter_by(user_id=user.id).count()
+            shared = app_module.Purchase.query.filter_by(idempotency_key=shared_key).count()
+            final_balance = user.wallet_balance
+
+    # Replayed double-clicks answer 200 without creating a purchase
+    replays = ok - purchases
+    expected_balance = round(balance - purchases * PRICE, 2)
+    print(f"workers={args.workers} requests={total} elapsed={elapsed:.2f}s "
+          f"throughput={total / elapsed:.1f} req/s")
+    print(f"purchases={purchases} replays={replays} rejected={rejected} errors={errors}")
+    print(f"balance start={balance:.2f} final={final_balance:.2f} expected={expected_balance:.2f}")
+    print(f"shared-key purchases={shared} (expected 1)")
+    print(f"ledger/snapshot mismatches={drift} (expected 0)")
+
+    consistent = (
+        abs(final_balance - expected_balance) < 0.005 and final_balance >= 0 and shared == 1 and drift == 0
+    )
+    print("RESULT:", "consistent" if consistent else "INCONSISTENT")
+    if not consistent:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
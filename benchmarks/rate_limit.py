@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/rate_limit.py
+
+Cross-worker accuracy and cost of the shared rate limiter.
+
+Several worker processes (standing in for gunicorn workers) post wrong
+passwords to /login for one account, each from its own client IP, as a
+credential-stuffing burst would. The per-account bucket is shared through
+the limiter file, so the number of attempts let through across all
+workers must stay within the bucket's capacity plus what refilled during
+the run. Also reported: the time one limiter check adds to a request.
+
+Usage:
+    python -m benchmarks.rate_limit --workers 4 --seconds 5
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+EMAIL = "bench@example.com"
+ACCOUNT_LIMIT = "30/minute"
+
+
+def load_app(tmp: str):
+    """Import the app bound to the benchmark database and limiter file (env must be set first)."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["RATE_LIMIT_DB"] = os.path.join(tmp, "ratelimit.db")
+    os.environ["RATE_LIMIT_LOGIN_ACCOUNT"] = ACCOUNT_LIMIT
+    os.environ["RATE_LIMIT_LOGIN_IP"] = "off"  # every worker is its own IP; only the account bucket counts
+    os.environ["RATE_LIMIT_MAX_IN_FLIGHT"] = "0"
+    os.environ["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"  # cheap: the limiter is what is measured
+    os.environ.setdefault("ASSETS_BUILD_ON_START", "false")
+    import app as app_module
+
+    return app_module
+
+
+def worker(tmp: str, n: int, seconds: float, ready, results) -> None:
+    """Post failing logins for ``seconds`` once all workers are ready; report counts and start/end times."""
+    app_module = load_app(tmp)
+    client = app_module.app.test_client()
+    allowed = limited = other = 0
+    app_module.password_hasher.hash("warm-up")  # start the hashing pool outside the window
+    ready.wait()  # the timed window starts only once every worker has imported the app
+    started = time.time()
+    deadline = started + seconds
+    while time.time() < deadline:
+        resp = client.post("/login", data={"email": EMAIL, "password": "wrong"},
+                           environ_base={"REMOTE_ADDR": f"10.0.0.{n + 1}"})
+        if resp.status_code == 200:
+            allowed += 1
+        elif resp.status_code == 429:
+            limited += 1
+            assert int(resp.headers["Retry-After"]) >= 1
+        else:
+            other += 1
+    results.put((allowed, limited, other, started, time.time()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module = load_app(tmp)
+        with app_module.app.app_context():
+            app_module.migrate()
+            user = app_module.User(username="bench", email=EMAIL)
+            user.set_password("bench")
+            app_module.db.session.add(user)
+            app_module.db.session.commit()
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        ready = ctx.Barrier(args.workers)
+        procs = [
+            ctx.Process(target=worker, args=(tmp, n, args.seconds, ready, results)) for n in range(args.workers)
+        ]
+        for proc in procs:
+            proc.start()
+        outcomes = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+        limiter = app_module.SharedLimiter(os.path.join(tmp, "rate_cost.db"))
+        limit = app_module.parse_limit("1000000/second")
+        runs = 2000
+        started = time.perf_counter()
+        for i in range(runs):
+            limiter.take(f"key{i % 100}", limit)
+        take_us = (time.perf_counter() - started) / runs * 1e6
+
+    allowed = sum(o[0] for o in outcomes)
+    limited = sum(o[1] for o in outcomes)
+    other = sum(o[2] for o in outcomes)
+    # From the first worker's first request to the last worker's last one
+    window = max(o[4] for o in outcomes) - min(o[3] for o in outcomes)
+    account = app_module.parse_limit(ACCOUNT_LIMIT)
+    # The bucket starts full and refills for as long as the window lasted
+    ceiling = account.capacity + account.rate * window
+    print(f"workers: {args.workers}  run: {args.seconds:g}s (measured {window:.2f}s)  account limit: {ACCOUNT_LIMIT}")
+    print(f"allowed: {allowed}  limited (429): {limited}  other: {other}  ceiling: {ceiling:.0f}")
+    print(f"limiter check: {take_us:.0f} us")
+    ok = allowed <= ceiling and limited > 0 and not other
+    print("consistency: " + ("ok" if ok else "FAILED"))
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/search.py
+
+Latency of the admin search (admin_search, /admin/api/search) on a seeded
+database.
+
+Query classes go from selective (a full recipient number, a Paystack
+reference) to broad (a three-character prefix matching most rows), since a
+broad prefix is where an index walk could degrade. Each query runs the
+whole search: all three indexes plus the row lookups.
+
+Usage:
+    python -m benchmarks.seed --db /tmp/bench.db --scale large
+    python -m benchmarks.search --db /tmp/bench.db
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--db", required=True, help="database made by benchmarks.seed")
+    parser.add_argument("--queries", type=int, default=200, help="queries per class")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    os.environ.setdefault("ASSETS_BUILD_ON_START", "false")
+    import app as app_module
+
+    db = app_module.db
+    rng = random.Random(args.seed)
+    with app_module.app.app_context():
+        app_module.migrate()  # builds the index on databases seeded before it existed
+        numbers = db.session.execute(
+            db.select(app_module.Purchase.number).order_by(db.func.random()).limit(args.queries)
+        ).scalars().all()
+        references = db.session.execute(
+            db.select(app_module.Transaction.reference).order_by(db.func.random()).limit(args.queries)
+        ).scalars().all()
+        users = db.session.execute(db.select(db.func.max(app_module.User.id))).scalar()
+
+        classes = {
+            "full number": numbers,
+            "number prefix (6)": [n[:6] for n in numbers],
+            "email": [f"user{rng.randint(1, users)}@bench.local" for _ in range(args.queries)],
+            "username prefix": [f"user{rng.randint(1, users)}"[:6] for _ in range(args.queries)],
+            "reference": references,
+            "broad prefix (3)": [rng.choice(("024", "020", "use", "mtn")) for _ in range(args.queries)],
+            "two words": [f"{rng.choice(('mtn', 'vodafone', 'airteltigo'))} {n[:5]}" for n in numbers],
+        }
+        print(f"{'query class':20s} {'p50 ms':>8s} {'p95 ms':>8s} {'max ms':>8s} {'hits':>6s}")
+        for name, queries in classes.items():
+            timings, hits = [], []
+            for query in queries:
+                started = time.perf_counter()
+                result = app_module.admin_search(query)
+                timings.append((time.perf_counter() - started) * 1000)
+                hits.append(len(result["purchases"]) + len(result["users"]) + len(result["transactions"]))
+                db.session.rollback()
+            print(f"{name:20s} {statistics.median(timings):8.2f} {percentile(timings, 95):8.2f} "
+                  f"{max(timings):8.2f} {statistics.mean(hits):6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/seed.py
+
+Deterministic synthetic data for load tests.
+
+Creates a SQLite database with users (funded wallets), purchases spread
+over the last year and top-up transactions. The same --seed and sizes
+always produce the same rows, so runs against it can be compared. All users
+share the password "bench" (one hash made with PASSWORD_HASH_METHOD) and
+the emails user<N>@bench.local, N starting at 1.
+
+Usage:
+    python -m benchmarks.seed --db /tmp/bench.db --scale small
+    python -m benchmarks.seed --db /tmp/bench.db --users 100000 --purchases 1000000 --transactions 1000000
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+SCALES = {
+    "small": {"users": 2_000, "purchases": 20_000, "transactions": 10_000},
+    "medium": {"users": 20_000, "purchases": 200_000, "transactions": 100_000},
+    "large": {"users": 100_000, "purchases": 1_000_000, "transactions": 1_000_000},
+}
+PASSWORD = "bench"
+OPENING_BALANCE_MINOR = 10_000_000  # 100,000 GHS: purchases never run out during a run
+BATCH = 10_000
+# Fixed "now" so created_at values do not depend on when seeding ran
+EPOCH = datetime(2025, 1, 1)
+# Fixed so seeded databases stay identical as statuses are added to the app
+SEED_STATUSES = ("pending", "payment_completed", "confirmed", "credited")
+
+
+def user_email(n: int) -> str:
+    """Email of the n-th seeded user (1-based, equal to the user id)."""
+    return f"user{n}@bench.local"
+
+
+def insert_batches(app_module, model, rows) -> None:
+    """Insert an iterable of row dicts in multi-row batches, one commit per batch."""
+    db = app_module.db
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            db.session.execute(db.insert(model), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(db.insert(model), batch)
+        db.session.commit()
+
+
+def seed(db_file: str, users: int, purchases: int, transactions: int, seed_value: int = 42) -> dict:
+    """
+    Create and fill ``db_file`` (which must not exist yet).
+
+    Returns:
+        The row counts written, for recording alongside results.
+    """
+    if os.path.exists(db_file):
+        raise SystemExit(f"{db_file} already exists; seed into a new file")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(db_file)}"
+    os.environ.setdefault("ASSETS_BUILD_ON_START", "false")
+    import app as app_module
+
+    rng = random.Random(seed_value)
+    db = app_module.db
+    started = time.perf_counter()
+    with app_module.app.app_context():
+        app_module.migrate()
+        password_hash = app_module.password_hasher.hash(PASSWORD)
+        insert_batches(app_module, app_module.User, (
+            {"id": n, "username": f"user{n}", "email": user_email(n), "mobile": f"055{n:07d}",
+             "gender": rng.choice(("male", "female")), "password_hash": password_hash, "legacy_wallet_balance": 0.0}
+            for n in range(1, users + 1)
+        ))
+        # Core inserts skip the open_wallet event; open funded wallets directly
+        insert_batches(app_module, app_module.LedgerEntry, (
+            {"id": n, "user_id": n, "amount_minor": OPENING_BALANCE_MINOR, "kind": "opening",
+             "reference": f"opening:{n}", "created_at": EPOCH}
+            for n in range(1, users + 1)
+        ))
+        insert_batches(app_module, app_module.WalletBalance, (
+            {"user_id": n, "balance_minor": OPENING_BALANCE_MINOR, "last_entry_id": n, "updated_at": EPOCH}
+            for n in range(1, users + 1)
+        ))
+
+        bundles = db.session.execute(
+            db.select(app_module.Bundle.id, app_module.Bundle.provider, app_module.Bundle.size_mb,
+                      app_module.Bundle.price).order_by(app_module.Bundle.id)
+        ).all()
+
+        def purchase_rows():
+            for n in range(1, purchases + 1):
+                bundle = rng.choice(bundles)
+                yield {
+                    "id": n,
+                    "provider": bundle.provider,
+                    "bundle": f"{bundle.size_mb // 1024} GB - {bundle.price:.2f} GHS",
+                    "number": f"024{rng.randrange(10 ** 7):07d}",
+                    "amount": bundle.price,
+                    "created_at": EPOCH - timedelta(seconds=rng.randrange(365 * 86400)),
+                    "status": rng.choice(SEED_STATUSES),
+                    "user_id": rng.randint(1, users),
+                    "bundle_id": bundle.id,
+                }
+
+        insert_batches(app_module, app_module.Purchase, purchase_rows())
+
+        def transaction_rows():
+            for n in range(1, transactions + 1):
+                yield {
+                    "id": n,
+                    "amount": float(rng.choice((5, 10, 20, 50, 100))),
+                    "provider": rng.choice(("MTN", "Vodafone", "AirtelTigo")),
+                    "number": f"020{rng.randrange(10 ** 7):07d}",
+                    "reference": f"bench-{n}",
+                    "status": "success",
+                    "at": EPOCH - timedelta(seconds=rng.randrange(365 * 86400)),
+                    "user_id": rng.randint(1, users),
+                }
+
+        insert_batches(app_module, app_module.Transaction, transaction_rows())
+        app_module.rebuild_sales_rollups()
+
+    counts = {"users": users, "purchases": purchases, "transactions": transactions, "seed": seed_value}
+    print(f"seeded {db_file}: {counts} in {time.perf_counter() - started:.1f}s")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed a deterministic benchmark database")
+    parser.add_argument("--db", required=True, help="SQLite file to create")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--users", type=int, help="override the scale's user count")
+    parser.add_argument("--purchases", type=int)
+    parser.add_argument("--transactions", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = dict(SCALES[args.scale])
+    for name in sizes:
+        if getattr(args, name) is not None:
+            sizes[name] = getattr(args, name)
+    seed(args.db, seed_value=args.seed, **sizes)
+
+
+if __name__ == "__main__":
+    main()
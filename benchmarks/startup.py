@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+benchmarks/startup.py
+
+Cold-start time and memory of one app worker.
+
+Each run starts a fresh interpreter (as gunicorn does on boot and on every
+worker recycle), imports the app and serves the first requests for a few
+pages through the test client. Reported per phase: wall time of the whole
+process, time to import the app (create_app included), time for the first
+requests (template compilation included), peak RSS and modules loaded.
+Runs alternate between an empty and a filled Jinja bytecode cache, so the
+effect of JINJA_CACHE_DIR shows directly.
+
+Usage:
+    python -m benchmarks.startup --runs 5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PAGES = ("/", "/login", "/register", "/faq", "/contact")
+
+# Runs in the child process; prints one JSON line
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+client = app_module.app.test_client()
+for page in {pages!r}:
+    assert client.get(page).status_code == 200, page
+served = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "first_requests_ms": (served - imported) * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "lazy_not_loaded": [name for name in ("requests", "flask_mail") if name not in sys.modules],
+}}))
+"""
+
+
+def run_child(env: dict) -> dict:
+    """Start one worker-like process and return its measurements."""
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(pages=PAGES)], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="runs per cache state")
+    parser.add_argument("--build-assets", action="store_true", help="turn ASSETS_BUILD_ON_START on")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    cache_dir = os.path.join(tmp, "jinja_cache")
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        JINJA_CACHE_DIR=cache_dir,
+        ASSETS_BUILD_ON_START="true" if args.build_assets else "false",
+    )
+    subprocess.run([sys.executable, "-m", "flask", "--app", "app", "migrate"], env=env, check=True,
+                   capture_output=True)
+
+    results = {"cold cache": [], "warm cache": []}
+    for _ in range(args.runs):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        results["cold cache"].append(run_child(env))
+        results["warm cache"].append(run_child(env))  # reuses what the cold run wrote
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"{'medians':12s} {'process ms':>11s} {'import ms':>10s} {'first req ms':>13s} {'rss MB':>7s} {'modules':>8s}")
+    for state, runs in results.items():
+        def median(key):
+            return statistics.median(r[key] for r in runs)
+
+        print(f"{state:12s} {median('process_ms'):11.0f} {median('import_ms'):10.0f} "
+              f"{median('first_requests_ms'):13.1f} {median('rss_mb'):7.1f} {median('modules'):8.0f}")
+    print(f"not imported at start: {', '.join(results['warm cache'][0]['lazy_not_loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+fulfillment.py
+
+Delivery of purchased bundles through network provider APIs (`flask fulfill`).
+
+- A provider adapter delivers one order and either returns the provider's
+  reference or raises TransientFulfillmentError (worth retrying) or
+  PermanentFulfillmentError (refund the customer)
+- HTTPProviderAdapter speaks a small JSON contract, configured per network
+  (MTN, Vodafone, AirtelTigo); StubAdapter fakes a provider for development
+  and benchmarks
+- Dispatcher runs each network's deliveries on its own thread pool, so its
+  concurrency limit and token-bucket rate limit never slow other networks
+- Every order carries a unique reference; a provider must treat a repeated
+  reference as the same order, which makes redelivery after a crash safe
+- An order whose bundle size is unknown is never sent (UnresolvedOrderError)
+"""
+
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional
+
+
+class FulfillmentError(Exception):
+    """Raised by an adapter when an order could not be delivered."""
+
+
+class TransientFulfillmentError(FulfillmentError):
+    """The provider may accept the order later (timeout, throttling, outage)."""
+
+
+class PermanentFulfillmentError(FulfillmentError):
+    """The provider rejected the order; retrying cannot help."""
+
+
+class UnresolvedOrderError(FulfillmentError):
+    """The order lacks something a provider needs (e.g. the bundle size); it is held for an admin, not refunded."""
+
+
+class Order(NamedTuple):
+    """One bundle to deliver."""
+
+    purchase_id: int
+    reference: str
+    network: str
+    number: str
+    size_mb: Optional[int]
+    bundle: str
+
+
+SIZE_LABEL = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(GB|MB)\b", re.IGNORECASE)
+
+
+def parse_size_mb(label: Optional[str]) -> Optional[int]:
+    """Return the size in MB of a bundle label such as "1 GB - 5.40 GHS" or "500MB", or None."""
+    match = SIZE_LABEL.match(label or "")
+    if not match:
+        return None
+    size = float(match.group(1)) * (1024 if match.group(2).upper() == "GB" else 1)
+    return int(round(size)) or None
+
+
+def normalize_msisdn(number: str) -> str:
+    """Return a Ghana number in international form (233XXXXXXXXX), or raise PermanentFulfillmentError."""
+    digits = "".join(ch for ch in number or "" if ch.isdigit())
+    if len(digits) == 10 and digits.startswith("0"):
+        digits = "233" + digits[1:]
+    if len(digits) != 12 or not digits.startswith("233"):
+        raise PermanentFulfillmentError(f"Invalid recipient number {number!r}")
+    return digits
+
+
+class ProviderAdapter:
+    """Delivers orders for one network; subclasses implement ``deliver``."""
+
+    def __init__(self, network: str) -> None:
+        self.network = network
+
+    def deliver(self, order: Order) -> str:
+        """Deliver ``order`` and return the provider's reference for it."""
+        raise NotImplementedError
+
+
+class HTTPProviderAdapter(ProviderAdapter):
+    """
+    Provider reached over HTTPS with a JSON API.
+
+    POSTs ``{"reference", "msisdn", "bundle_mb", "network"}`` with a Bearer
+    key and expects a 2xx JSON body with the provider's "reference". A 409
+    means the reference was already delivered and counts as success. 408,
+    429, 5xx and network errors are transient; other 4xx are permanent.
+
+    Args:
+        network: Network name as stored on purchases ("MTN", ...).
+        url: Order endpoint.
+        api_key: Sent as a Bearer token.
+        timeout: (connect, read) seconds.
+    """
+
+    TRANSIENT_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+    def __init__(self, network: str, url: str, api_key: str, timeout: tuple = (3.05, 15.0)) -> None:
+        super().__init__(network)
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """Return this thread's pooled session (requests is loaded on first use)."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+
+            session = self._local.session = requests.Session()
+            session.headers["Authorization"] = f"Bearer {self.api_key}"
+        return session
+
+    def deliver(self, order: Order) -> str:
+        import requests
+
+        payload = {
+            "reference": order.reference,
+            "msisdn": normalize_msisdn(order.number),
+            "bundle_mb": order.size_mb,
+            "network": self.network,
+        }
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as exc:
+            raise TransientFulfillmentError(f"{self.network}: {exc}") from exc
+        if response.status_code == 409:
+            return order.reference
+        if response.status_code in self.TRANSIENT_STATUSES:
+            raise TransientFulfillmentError(f"{self.network} returned HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise PermanentFulfillmentError(f"{self.network} rejected the order: HTTP {response.status_code} "
+                                            f"{response.text[:200]}")
+        try:
+            return str(response.json().get("reference") or order.reference)
+        except ValueError:
+            raise TransientFulfillmentError(f"{self.network} returned an unreadable response") from None
+
+
+class StubAdapter(ProviderAdapter):
+    """
+    Local stand-in provider: sleeps for ``latency`` and fails at the given rates.
+
+    Numbers that are not valid Ghana numbers are rejected permanently, like a
+    real provider would. Tracks the peak number of concurrent deliveries.
+    """
+
+    def __init__(self, network: str, latency: float = 0.05, transient_rate: float = 0.0,
+                 permanent_rate: float = 0.0, seed: Optional[int] = None) -> None:
+        super().__init__(network)
+        self.latency = latency
+        self.transient_rate = transient_rate
+        self.permanent_rate = permanent_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.delivered = 0
+
+    def deliver(self, order: Order) -> str:
+        normalize_msisdn(order.number)
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            roll = self._rng.random()
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if roll < self.permanent_rate:
+            raise PermanentFulfillmentError(f"{self.network} stub: bundle not available for this number")
+        if roll < self.permanent_rate + self.transient_rate:
+            raise TransientFulfillmentError(f"{self.network} stub: gateway timeout")
+        with self._lock:
+            self.delivered += 1
+        return f"stub-{self.network.lower()}-{order.purchase_id}"
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: ``rate`` tokens per second, up to ``burst`` saved.
+
+    ``acquire`` blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class NetworkLimits(NamedTuple):
+    """Per-network dispatch limits."""
+
+    concurrency: int
+    rate: float  # deliveries started per second
+
+
+class Dispatcher:
+    """
+    Runs deliveries on one bounded thread pool per network.
+
+    Args:
+        adapters: Network name -> adapter.
+        limits: Network name -> NetworkLimits.
+    """
+
+    def __init__(self, adapters: Dict[str, ProviderAdapter], limits: Dict[str, NetworkLimits]) -> None:
+        self.adapters = adapters
+        self.limits = limits
+        self._pools = {
+            network: ThreadPoolExecutor(max_workers=limits[network].concurrency,
+                                        thread_name_prefix=f"fulfill-{network}")
+            for network in adapters
+        }
+        self._buckets = {network: TokenBucket(limits[network].rate) for network in adapters}
+
+    def submit(self, order: Order) -> Future:
+        """Queue ``order`` on its network's pool; the future yields the provider reference."""
+        return self._pools[order.network].submit(self._deliver, order)
+
+    def _deliver(self, order: Order) -> str:
+        if order.size_mb is None:
+            raise UnresolvedOrderError(f"Unknown bundle size for {order.bundle!r}; deliver it manually")
+        self._buckets[order.network].acquire()
+        return self.adapters[order.network].deliver(order)
+
+    def shutdown(self) -> None:
+        for pool in self._pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
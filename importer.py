@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+importer.py
+
+Streaming record readers for bulk imports (`flask import-data`).
+
+- JSON arrays are decoded one element at a time from a rolling buffer, so
+  a file of a few hundred thousand users never sits in memory whole
+- NDJSON (.ndjson/.jsonl) is read line by line, CSV with csv.DictReader
+- Records come out as plain dicts; batching and database writes are the
+  caller's job
+"""
+
+import csv
+import json
+import os
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+READ_SIZE = 64 * 1024
+
+FORMATS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+
+
+def detect_format(path: str) -> str:
+    """Return "json", "ndjson" or "csv" from the file extension."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Cannot tell the format of {path}; use .json, .ndjson, .jsonl or .csv")
+    return FORMATS[ext]
+
+
+def iter_json_array(fh) -> Iterator[dict]:
+    """Yield the elements of a top-level JSON array without loading it all."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace and separators between elements
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if not started and pos < len(buffer):
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if started and pos < len(buffer) and buffer[pos] == "]":
+            return
+        if pos < len(buffer):
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield record
+                pos = end
+                continue
+        if eof:
+            if started:
+                raise ValueError("Unterminated JSON array")
+            return
+        # Need more input: drop what has been consumed and read another block
+        chunk = fh.read(READ_SIZE)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def iter_records(path: str, fmt: Optional[str] = None) -> Iterator[dict]:
+    """
+    Stream records from a JSON array, NDJSON or CSV file.
+
+    Args:
+        path: Input file.
+        fmt: "json", "ndjson" or "csv"; detected from the extension if omitted.
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, "r", encoding="utf-8", newline="" if fmt == "csv" else None) as fh:
+        if fmt == "json":
+            yield from iter_json_array(fh)
+        elif fmt == "ndjson":
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            for row in csv.DictReader(fh):
+                # Empty CSV cells mean "not given", like a missing JSON key
+                yield {key: value for key, value in row.items() if value != ""}
+
+
+def chunked(records: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    """Group an iterable into lists of at most ``size`` items."""
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
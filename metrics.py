@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+metrics.py
+
+In-process metrics in the Prometheus text format, and a buffered JSONL
+access log.
+
+- Counters and histograms keep one value set per label combination behind
+  a lock; recording is a dict lookup, a bisect and a few additions, cheap
+  enough to run on every request and every SQL statement
+- Values are per process (one gunicorn worker); scrape each worker or sum
+  them in Prometheus, as with any multi-process exporter
+- Gauges are read from a callback at scrape time, for numbers other
+  objects already keep (cache sizes, queue lengths)
+- AccessLog buffers lines in memory and writes them in batches, so logging
+  costs one write() per batch rather than one per request
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; suits request and query latencies from sub-millisecond to 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """Render {name="value",...}; ``extra`` is an already rendered pair such as le="0.5"."""
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    """Format a sample value (integers without a trailing .0)."""
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels.
+
+    Args:
+        name: Metric name, e.g. "http_requests_total".
+        documentation: HELP text.
+        labelnames: Label names; ``inc`` takes the values in the same order.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        """Add ``amount`` to the series for ``labelvalues``."""
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        """Return the current value of one series."""
+        with self._lock:
+            return self._values.get(labelvalues, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in items]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with optional labels.
+
+    Args:
+        name: Metric name, e.g. "http_request_duration_seconds".
+        documentation: HELP text.
+        labelnames: Label names; ``observe`` takes the values in the same order.
+        buckets: Upper bounds, ascending; +Inf is added automatically.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [count per bucket (last is +Inf, not cumulative), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        """Record one observation for the series ``labelvalues``."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                series = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """
+    Metric whose value is read from a callback at scrape time.
+
+    Args:
+        name: Metric name.
+        documentation: HELP text.
+        read: Returns a number, or a dict of {label value: number} when
+            ``labelname`` is given.
+        labelname: Single label for dict results.
+        kind: "gauge", or "counter" for monotonic totals kept elsewhere.
+    """
+
+    def __init__(self, name: str, documentation: str, read: Callable, labelname: Optional[str] = None,
+                 kind: str = "gauge") -> None:
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.labelname = labelname
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        value = self.read()
+        if value is None:
+            return []
+        if self.labelname is None:
+            return [f"{self.name} {_number(value)}"]
+        return [
+            f"{self.name}{_labels((self.labelname,), (key,))} {_number(number)}"
+            for key, number in sorted(value.items())
+        ]
+
+
+class Registry:
+    """A set of metrics rendered together by ``render()``."""
+
+    def __init__(self) -> None:
+        self._metrics: List = []
+
+    def register(self, metric):
+        """Add a metric and return it."""
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable, labelname: Optional[str] = None,
+              kind: str = "gauge") -> Gauge:
+        return self.register(Gauge(name, documentation, read, labelname, kind))
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class AccessLog:
+    """
+    Buffered JSON Lines writer.
+
+    Lines are appended to an in-memory buffer and written in one go once
+    ``max_lines`` are waiting or ``max_delay`` seconds have passed since the
+    last write (checked on each call), and at process exit. The file is
+    opened in append mode, so several worker processes can share it: each
+    batch is a single write of whole lines.
+
+    Args:
+        path: File to append to.
+        max_lines: Buffered lines that trigger a write.
+        max_delay: Seconds after which a waiting buffer is written anyway.
+    """
+
+    def __init__(self, path: str, max_lines: int = 200, max_delay: float = 2.0) -> None:
+        self.path = path
+        self.max_lines = max_lines
+        self.max_delay = max_delay
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._fh = None
+        self._fh_pid: Optional[int] = None
+        atexit.register(self.flush)
+
+    def write(self, record: dict) -> None:
+        """Queue one record; writes the batch if it is due."""
+        line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) < self.max_lines and time.monotonic() - self._last_flush < self.max_delay:
+                return
+            lines, self._buffer = self._buffer, []
+            self._write(lines)
+
+    def flush(self) -> None:
+        """Write whatever is buffered."""
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            self._write(lines)
+
+    def _write(self, lines: List[str]) -> None:
+        """Append lines to the file (lock held)."""
+        self._last_flush = time.monotonic()
+        if not lines:
+            return
+        # A handle inherited across fork would interleave with the parent's buffer
+        if self._fh is None or self._fh_pid != os.getpid():
+            self._fh = open(self.path, "a", encoding="utf-8", buffering=1024 * 1024)
+            self._fh_pid = os.getpid()
+        self._fh.write("".join(lines))
+        self._fh.flush()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+passwords.py
+
+Password hashing off the request thread.
+
+- Werkzeug's KDFs (scrypt, pbkdf2) run in a small process pool, so a burst
+  of logins cannot starve other routes of CPU or the GIL
+- A bounded number of hashes may be running or queued at once; callers
+  beyond that wait briefly and then get PasswordHasherBusy (back-pressure),
+  which also caps the KDF's memory use (scrypt n=32768 needs ~32 MB each)
+- The hash method and cost are configurable, and needs_rehash() tells the
+  caller when a stored hash was made with different parameters
+"""
+
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from typing import List, Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full and no slot freed up in time."""
+
+
+def _pool_context():
+    """
+    Spawn, never fork, the hashing workers.
+
+    The pool is created lazily inside a running worker that may already have
+    threads (gthread, the Paystack pool, ...); a forked child could inherit a
+    lock some other thread was holding and hang. Spawned workers start from
+    a fresh interpreter, once per pool.
+    """
+    return multiprocessing.get_context("spawn")
+
+
+class PasswordHasher:
+    """
+    Hash and verify passwords in a bounded worker pool.
+
+    Args:
+        method: Werkzeug method string, e.g. "scrypt:32768:8:1" or
+            "pbkdf2:sha256:600000". Omitted parameters take werkzeug's defaults.
+        workers: Hashing processes per app process; 0 hashes inline.
+        queue_limit: Hashes allowed to wait for a free worker.
+        wait: Seconds a caller waits for a queue slot before giving up.
+    """
+
+    def __init__(self, method: str = "scrypt", workers: int = 1, queue_limit: int = 16, wait: float = 2.0) -> None:
+        self.method = method
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_limit)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+        self._pool_lock = threading.Lock()
+        self._canonical: Optional[str] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        """Return this process's worker pool, creating it on first use."""
+        # A pool inherited across a fork has no live workers in the child
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+                    self._pool_pid = os.getpid()
+                    # Inside a multiprocessing child, exit joins child processes before
+                    # the executor's own atexit hook runs. Stop the workers first, ahead
+                    # of the finalizers that close the executor's queues (priority 10).
+                    multiprocessing.util.Finalize(None, self.shutdown, exitpriority=100)
+        return self._pool
+
+    def hash(self, password: str) -> str:
+        """Return a salted hash of ``password`` using the configured method."""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash: str, password: str) -> bool:
+        """Return True if ``password`` matches ``stored_hash``."""
+        return self._run(check_password_hash, stored_hash, password)
+
+    def hash_many(self, passwords: List[str]) -> List[str]:
+        """
+        Hash a batch across all workers (bulk imports; skips the request queue limit).
+
+        Args:
+            passwords: Plaintext passwords.
+
+        Returns:
+            Hashes in the same order.
+        """
+        if self.workers <= 0 or len(passwords) < 2:
+            return [generate_password_hash(password, self.method) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self.pool.map(generate_password_hash, passwords, repeat(self.method), chunksize=chunksize))
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        """Return True if ``stored_hash`` was not made with the configured method and cost."""
+        return stored_hash.split("$", 1)[0] != self.canonical_method
+
+    @property
+    def canonical_method(self) -> str:
+        """The configured method with werkzeug's defaults filled in, as stored in hashes."""
+        if self._canonical is None:
+            # Werkzeug records the full parameters in the hash prefix
+            self._canonical = self.hash("").split("$", 1)[0]
+        return self._canonical
+
+    def _run(self, fn, *args):
+        """Run ``fn`` in the pool, holding a queue slot for the duration."""
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.wait):
+            raise PasswordHasherBusy("Too many password checks in progress")
+        try:
+            return self.pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool next time
+            with self._pool_lock:
+                self._pool = None
+            raise
+        finally:
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        """Stop this process's workers (they are restarted on next use)."""
+        with self._pool_lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+            self._pool_pid = None
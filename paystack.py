@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+paystack.py
+
+Minimal Paystack API client used by the wallet top-up flow.
+
+- One pooled HTTP session (keep-alive) per process, recreated after fork
+- Connect and read timeouts on every call so a slow Paystack response
+  cannot hold a worker indefinitely
+- Retries with jittered exponential backoff, only where repeating the call
+  is safe (idempotent GETs; POSTs only when the connection never opened)
+- A circuit breaker that fails fast while Paystack is degraded
+- An optional observer callback timing each call, for metrics
+- ``requests`` is imported on first use, keeping it out of worker start-up
+"""
+
+import os
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+
+class PaystackError(Exception):
+    """Raised when Paystack cannot be reached or returns an unusable response."""
+
+
+class PaystackUnavailable(PaystackError):
+    """Raised without calling Paystack while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    rejects calls for ``reset_timeout`` seconds. It then lets a single trial
+    call through (half-open); success closes it, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Return 'closed', 'open' or 'half-open'."""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Return True if a call may be attempted now."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        """Close the breaker and reset the failure count."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failure, opening (or re-opening) the breaker at the threshold."""
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class PaystackClient:
+    """
+    Thin client for the Paystack transaction initialize/verify endpoints.
+
+    Args:
+        secret_key: Paystack secret key (sent as a Bearer token).
+        base_url: API root; point it at a local stand-in for development.
+        connect_timeout: Seconds allowed to open the TCP/TLS connection.
+        read_timeout: Seconds allowed between bytes of the response.
+        max_retries: Extra attempts for retryable failures.
+        backoff: Base delay in seconds for jittered exponential backoff.
+        breaker: Circuit breaker shared by all calls of this client.
+        observer: Called as ``observer(operation, outcome, seconds)`` after
+            each call, retries included; outcome is "ok", "error" or
+            "unavailable" (rejected by the open breaker).
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(
+        self,
+        secret_key: str,
+        base_url: str = "https://api.paystack.co",
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff: float = 0.25,
+        breaker: Optional[CircuitBreaker] = None,
+        observer: Optional[Callable[[str, str, float], None]] = None,
+    ) -> None:
+        self.secret_key = secret_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.observer = observer
+        self._session: Optional["requests.Session"] = None
+        self._session_pid: Optional[int] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> "requests.Session":
+        """Return this process's pooled session, creating it on first use."""
+        # Sockets must not be shared across a fork (e.g. gunicorn --preload)
+        if self._session is None or self._session_pid != os.getpid():
+            with self._session_lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers["Authorization"] = f"Bearer {self.secret_key}"
+                    self._session = session
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def initialize(self, email: str, amount: int, callback_url: str) -> dict:
+        """
+        Start a transaction; ``amount`` is in the smallest currency unit.
+
+        Not retried once the request may have reached Paystack, since a
+        repeat would create a second transaction.
+        """
+        payload = {"email": email, "amount": amount, "callback_url": callback_url}
+        return self._request("initialize", "POST", "/transaction/initialize", idempotent=False, json=payload)
+
+    def verify(self, reference: str) -> dict:
+        """Look up the outcome of a transaction by its reference."""
+        return self._request("verify", "GET", f"/transaction/verify/{reference}", idempotent=True)
+
+    def _request(self, operation: str, method: str, path: str, idempotent: bool, **kwargs) -> dict:
+        """Send one logical request and report its duration and outcome to the observer."""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = self._send(method, path, idempotent, **kwargs)
+            outcome = "ok"
+            return result
+        except PaystackUnavailable:
+            outcome = "unavailable"
+            raise
+        finally:
+            if self.observer is not None:
+                self.observer(operation, outcome, time.perf_counter() - started)
+
+    def _send(self, method: str, path: str, idempotent: bool, **kwargs) -> dict:
+        """Send one logical request with timeouts, retries and breaker accounting."""
+        import requests
+
+        if not self.breaker.allow():
+            raise PaystackUnavailable("Paystack is temporarily unavailable")
+
+        url = self.base_url + path
+        attempt = 0
+        while True:
+            retryable = False
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.ConnectTimeout as exc:
+                # The request was never sent, so even a POST is safe to repeat
+                error: Exception = exc
+                retryable = True
+            except requests.RequestException as exc:
+                error = exc
+                retryable = idempotent
+            else:
+                if response.status_code in self.RETRY_STATUSES:
+                    error = PaystackError(f"Paystack returned HTTP {response.status_code}")
+                    retryable = idempotent
+                else:
+                    self.breaker.record_success()
+                    try:
+                        return response.json()
+                    except ValueError:
+                        raise PaystackError("Invalid response from Paystack") from None
+
+            if not retryable or attempt >= self.max_retries:
+                self.breaker.record_failure()
+                raise PaystackError(str(error)) from error
+
+            # Full jitter keeps retries from many workers from synchronising
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+            attempt += 1
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+"""
+ratelimit.py
+
+Rate limits and a concurrency cap shared by every worker process on a host.
+
+- Token buckets are rows in a small SQLite file of their own (not the app
+  database, which may be remote and should not take a write per login):
+  one IMMEDIATE transaction reads and updates a bucket, so gunicorn workers
+  see the same counts without a separate server
+- Buckets are keyed by any string (e.g. "login:ip:1.2.3.4"); a missing row
+  is a full bucket, so rows that have refilled are simply deleted
+- The concurrency cap counts in-flight requests per process id; slots of
+  processes that died without releasing them are reclaimed when the cap
+  is hit
+- The file uses WAL with synchronous=OFF: losing the last few updates in a
+  power cut only forgets some recent requests
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0, "day": 86400.0}
+PURGE_EVERY = 1000  # takes between deletions of refilled buckets
+
+
+class RateLimited(Exception):
+    """Raised when a bucket is empty; ``retry_after`` is in seconds."""
+
+    def __init__(self, scope: str, retry_after: float) -> None:
+        super().__init__(f"Rate limit exceeded ({scope})")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """Raised when the shared concurrency cap is reached."""
+
+
+class Limit(NamedTuple):
+    """``capacity`` requests per ``period`` seconds, with bursts up to ``capacity``."""
+
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        """Tokens added per second."""
+        return self.capacity / self.period
+
+
+def parse_limit(value: str) -> Optional[Limit]:
+    """
+    Parse "10/minute" (or "10/second", "/hour", "/day") into a Limit.
+
+    Returns None for an empty value or "off", which disables the limit.
+
+    Raises:
+        ValueError: For anything else that is not a valid limit.
+    """
+    value = (value or "").strip().lower()
+    if value in ("", "off", "0"):
+        return None
+    count, _, period = value.partition("/")
+    if period not in PERIODS or int(count) < 1:
+        raise ValueError(f"Invalid rate limit {value!r}; use e.g. '10/minute'")
+    return Limit(int(count), PERIODS[period])
+
+
+class SharedLimiter:
+    """
+    Token buckets and an in-flight counter in one SQLite file.
+
+    Args:
+        path: Database file; every worker on the host must use the same one.
+        timeout: Seconds to wait for another process's transaction.
+    """
+
+    def __init__(self, path: str, timeout: float = 2.0) -> None:
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._slots_pid: Optional[int] = None
+        self._takes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, creating the tables on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():  # never share a connection across fork
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL) "
+                "WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_buckets_full_at ON buckets (full_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS slots (pid INTEGER PRIMARY KEY, busy INTEGER NOT NULL)")
+            with self._lock:
+                if self._slots_pid != os.getpid():
+                    # A reused pid must not inherit the slots of a dead process
+                    conn.execute("DELETE FROM slots WHERE pid = ?", (os.getpid(),))
+                    self._slots_pid = os.getpid()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key: str, limit: Limit, now: Optional[float] = None) -> float:
+        """
+        Take one token from the bucket ``key``.
+
+        Returns:
+            0.0 if the request may proceed, else the seconds until a token
+            will be available (the bucket is left unchanged).
+        """
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = float(limit.capacity) if row is None else min(
+                float(limit.capacity), row[0] + max(now - row[1], 0.0) * limit.rate
+            )
+            if tokens < 1.0:
+                conn.execute("COMMIT")
+                return (1.0 - tokens) / limit.rate
+            tokens -= 1.0
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated, "
+                "full_at = excluded.full_at",
+                (key, tokens, now, now + (limit.capacity - tokens) / limit.rate),
+            )
+            self._takes += 1
+            if self._takes % PURGE_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+            conn.execute("COMMIT")
+            return 0.0
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire_slot(self, cap: int) -> None:
+        """
+        Count one more in-flight request for this process.
+
+        Raises:
+            Overloaded: If ``cap`` requests are already in flight host-wide.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            busy = conn.execute("SELECT COALESCE(SUM(busy), 0) FROM slots").fetchone()[0]
+            if busy >= cap and self._reclaim_dead(conn):
+                busy = conn.execute("SELECT COALESCE(SUM(busy), 0) FROM slots").fetchone()[0]
+            if busy < cap:
+                conn.execute(
+                    "INSERT INTO slots (pid, busy) VALUES (?, 1) ON CONFLICT (pid) DO UPDATE SET busy = busy + 1",
+                    (os.getpid(),),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if busy >= cap:
+            raise Overloaded(f"{busy} requests in flight (cap {cap})")
+
+    def release_slot(self) -> None:
+        """Give back a slot taken by acquire_slot in this process."""
+        self._connect().execute("UPDATE slots SET busy = MAX(busy - 1, 0) WHERE pid = ?", (os.getpid(),))
+
+    def in_flight(self) -> int:
+        """Return the number of in-flight requests across all processes."""
+        return self._connect().execute("SELECT COALESCE(SUM(busy), 0) FROM slots").fetchone()[0]
+
+    @staticmethod
+    def _reclaim_dead(conn: sqlite3.Connection) -> bool:
+        """Drop the slots of processes that no longer exist; True if any were dropped."""
+        dead = []
+        for (pid,) in conn.execute("SELECT pid FROM slots WHERE busy > 0 AND pid != ?", (os.getpid(),)).fetchall():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                dead.append((pid,))
+            except PermissionError:
+                pass  # alive, owned by another user
+        conn.executemany("DELETE FROM slots WHERE pid = ?", dead)
+        return bool(dead)
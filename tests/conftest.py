@@ -0,0 +1,76 @@
+"""
+Shared fixtures: a migrated SQLite database per test and helpers for users.
+
+The environment is set before the app module is imported, so importing it
+never touches instance/ or builds assets.
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+_IMPORT_DIR = tempfile.mkdtemp(prefix="app-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_IMPORT_DIR, 'import.db')}")
+os.environ["ASSETS_BUILD_ON_START"] = "false"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["JINJA_CACHE_DIR"] = ""
+os.environ["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"  # fast; hashing itself is not under test
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+
+import pytest  # noqa: E402
+
+import app as app_module  # noqa: E402
+
+
+def reset_caches() -> None:
+    """Forget per-process caches, which would carry rows over from another test's database."""
+    app_module.bundle_catalog.version = None
+    app_module.profile_cache._entries.clear()
+    app_module.page_cache._entries.clear()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a fresh, migrated database file."""
+    application = app_module.create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "TESTING": True,
+    })
+    reset_caches()
+    with application.app_context():
+        app_module.migrate()
+        yield application
+        app_module.db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user with a funded wallet: make_user(email=..., balance=...)."""
+
+    def create(email: str = "buyer@example.com", balance: float = 100.0, username: str = "buyer"):
+        db = app_module.db
+        user = app_module.User(username=username, email=email, mobile="0240000000")
+        user.set_password("secret")
+        db.session.add(user)
+        db.session.flush()
+        if balance:
+            app_module.post_ledger_entry(user.id, app_module.to_minor(balance), "adjustment")
+        db.session.commit()
+        return user
+
+    return create
+
+
+def login(client, user) -> None:
+    """Sign ``client`` in as ``user`` without going through the form."""
+    with client.session_transaction() as sess:
+        sess["user_id"] = user.id
+        sess["email"] = user.email
+        sess["username"] = user.username
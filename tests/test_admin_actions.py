@@ -0,0 +1,115 @@
+"""Status changes and deletions from the admin panel (apply_purchase_action)."""
+
+import sqlite3
+import threading
+
+import app as app_module
+from conftest import login
+
+Purchase = app_module.Purchase
+
+
+def buy(client, count: int) -> list:
+    bundle = app_module.bundle_catalog.refresh().by_id[min(app_module.bundle_catalog.by_id)]
+    ids = []
+    for i in range(count):
+        resp = client.post("/purchase", data={"bundle_id": bundle.id, "mobile": f"02400000{i:02d}"},
+                           headers={"X-Requested-With": "fetch"})
+        ids.append(resp.json["id"])
+    return ids
+
+
+def batch(client, ids, action):
+    return client.post("/admin/purchases/batch", json={"ids": ids, "action": action})
+
+
+def rollup_is_consistent() -> bool:
+    app_module.db.session.expire_all()
+    return app_module.rebuild_sales_rollups(check_only=True)["mismatched"] == 0
+
+
+def test_batch_actions_keep_rollup_consistent(client, make_user):
+    login(client, make_user(balance=500))
+    ids = buy(client, 4)
+
+    confirmed = batch(client, ids[:2], "confirmed").json["results"]
+    credited = batch(client, ids[1:] + [999999], "credited").json["results"]
+    deleted = batch(client, ids[:1], "delete").json["results"]
+
+    assert confirmed == {str(ids[0]): "updated", str(ids[1]): "updated"}
+    assert credited == {str(ids[1]): "updated", str(ids[2]): "updated", str(ids[3]): "updated", "999999": "not_found"}
+    assert batch(client, ids[1:2], "confirmed").json["results"] == {str(ids[1]): "invalid_transition"}
+    assert deleted == {str(ids[0]): "deleted"}
+    assert rollup_is_consistent()
+
+    moves = app_module.db.session.execute(
+        app_module.db.select(app_module.PurchaseTransition.from_status, app_module.PurchaseTransition.to_status)
+        .where(app_module.PurchaseTransition.purchase_id == ids[1])
+        .order_by(app_module.PurchaseTransition.id)
+    ).all()
+    assert [tuple(m) for m in moves] == [
+        (None, "payment_completed"), ("payment_completed", "confirmed"), ("confirmed", "credited"),
+    ]
+
+
+def test_concurrent_actions_move_each_purchase_once(app, client, make_user):
+    login(client, make_user(balance=500))
+    ids = buy(client, 10)
+    start = threading.Barrier(2)
+    results = []
+
+    def admin(action):
+        with app.app_context():
+            start.wait()
+            results.append(app_module.apply_purchase_action(ids, action))
+            app_module.db.session.commit()
+            app_module.db.session.remove()
+
+    threads = [threading.Thread(target=admin, args=(action,)) for action in ("credited", "confirmed")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert rollup_is_consistent()
+    for pid in ids:
+        outcomes = sorted(r[pid] for r in results)
+        # Either credit wins outright, or confirm runs first and credit follows
+        assert outcomes in (["invalid_transition", "updated"], ["updated", "updated"])
+    transitions = app_module.PurchaseTransition.query.filter(
+        app_module.PurchaseTransition.purchase_id.in_(ids), app_module.PurchaseTransition.from_status.isnot(None)
+    ).count()
+    assert transitions == sum(outcome == "updated" for r in results for outcome in r.values())
+
+
+def test_lock_timeout_answers_503(app, client, make_user, monkeypatch):
+    login(client, make_user())
+    ids = buy(client, 1)
+    monkeypatch.setitem(app_module.engine_profile["pragmas"], "busy_timeout", 50)
+    app_module.db.session.remove()
+    app_module.db.engine.dispose()  # new connections pick up the short timeout
+
+    holder = sqlite3.connect(app.config["SQLALCHEMY_DATABASE_URI"].removeprefix("sqlite:///"), isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        resp = batch(client, ids, "credited")
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    assert batch(client, ids, "credited").json["results"] == {str(ids[0]): "updated"}
+
+
+def test_batch_rejects_ids_that_are_not_a_list_of_integers(client, make_user):
+    login(client, make_user(balance=500))
+    ids = buy(client, 2)
+
+    for bad in ("12", {"1": 1, "2": 2}, [True], [1, "2"], [1.0], None):
+        resp = client.post("/admin/purchases/batch", json={"ids": bad, "action": "confirmed"})
+        assert resp.status_code == 400, bad
+    assert client.post("/admin/purchases/batch", json=["confirmed"]).status_code == 400
+
+    app_module.db.session.expire_all()
+    assert {p.status for p in Purchase.query.filter(Purchase.id.in_(ids))} == {"payment_completed"}
@@ -0,0 +1,86 @@
+"""The /admin/events Server-Sent Events feed and its resume cursor."""
+
+import json
+
+import pytest
+
+import app as app_module
+from conftest import login
+
+
+@pytest.fixture(autouse=True)
+def short_streams(monkeypatch):
+    # Streams end on their own almost at once, as after ADMIN_EVENTS_MAX_SECONDS
+    monkeypatch.setattr(app_module, "ADMIN_EVENTS_POLL", 0.01)
+    monkeypatch.setattr(app_module, "ADMIN_EVENTS_MAX_SECONDS", 0.05)
+
+
+def buy(client, count: int) -> list:
+    bundle = app_module.bundle_catalog.refresh().by_id[min(app_module.bundle_catalog.by_id)]
+    return [
+        client.post("/purchase", data={"bundle_id": bundle.id, "mobile": "0241234567"},
+                    headers={"X-Requested-With": "fetch"}).json["id"]
+        for _ in range(count)
+    ]
+
+
+def events(client, **kwargs) -> list:
+    """Read one stream to its end and return its events as (id, data) pairs."""
+    resp = client.get("/admin/events", **kwargs)
+    assert resp.status_code == 200 and resp.mimetype == "text/event-stream"
+    assert resp.headers["Cache-Control"] == "no-store"
+    parsed = []
+    for block in resp.data.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields.get("event") == "purchase":
+            parsed.append((int(fields["id"]), json.loads(fields["data"])))
+    return parsed
+
+
+def test_after_cursor_replays_what_was_missed(client, make_user):
+    login(client, make_user())
+    ids = buy(client, 3)
+    client.post("/admin/purchases/batch", json={"ids": ids[:1], "action": "confirmed"})
+    client.post("/admin/purchases/batch", json={"ids": ids[1:2], "action": "delete"})
+
+    replay = events(client, query_string={"after": 0})
+
+    assert [(e["purchase_id"], e["from"], e["to"]) for _, e in replay] == [
+        (ids[0], None, "payment_completed"), (ids[1], None, "payment_completed"), (ids[2], None, "payment_completed"),
+        (ids[0], "payment_completed", "confirmed"), (ids[1], "payment_completed", "deleted"),
+    ]
+    assert [event_id for event_id, _ in replay] == sorted(event_id for event_id, _ in replay)
+    assert replay[3][1]["purchase"]["status"] == "confirmed"
+    assert replay[1][1]["purchase"] is None  # deleted since
+
+    # Only entries after the cursor
+    later = events(client, query_string={"after": replay[2][0]})
+    assert [event_id for event_id, _ in later] == [event_id for event_id, _ in replay[3:]]
+
+
+def test_reconnect_resumes_from_last_event_id(client, make_user):
+    login(client, make_user())
+    buy(client, 2)
+    first = events(client, query_string={"after": 0})
+
+    buy(client, 2)
+    # EventSource sends the last id it saw; it wins over the page's original ?after=
+    resumed = events(client, query_string={"after": 0}, headers={"Last-Event-ID": str(first[-1][0])})
+
+    assert len(first) == 2 and len(resumed) == 2
+    assert {event_id for event_id, _ in first}.isdisjoint(event_id for event_id, _ in resumed)
+
+
+def test_without_a_cursor_only_new_entries_are_sent(client, make_user):
+    login(client, make_user())
+    buy(client, 2)
+
+    assert events(client) == []
+
+
+def test_backlog_is_sent_in_batches(client, make_user, monkeypatch):
+    monkeypatch.setattr(app_module, "ADMIN_EVENTS_BATCH", 2)
+    login(client, make_user())
+    ids = buy(client, 5)
+
+    assert [e["purchase_id"] for _, e in events(client, query_string={"after": 0})] == ids
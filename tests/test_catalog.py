@@ -0,0 +1,50 @@
+"""The per-worker bundle catalog and its CatalogVersion invalidation."""
+
+import sqlite3
+
+import app as app_module
+from conftest import login
+
+db = app_module.db
+
+
+def mtn_1gb(client) -> dict:
+    return next(b for b in client.get("/api/bundles").json["bundles"]["MTN"] if b["size"] == "1 GB")
+
+
+def test_repriced_bundle_is_served_on_the_next_request(app, client, make_user):
+    user = make_user(balance=100)
+    login(client, user)
+    before = mtn_1gb(client)
+    etag = client.get("/api/bundles").headers["ETag"]
+
+    result = app.test_cli_runner().invoke(args=["set-bundle-price", "MTN", "1", "7.25"])
+
+    assert result.exit_code == 0, result.output
+    assert client.get("/api/bundles", headers={"If-None-Match": etag}).status_code == 200
+    after = mtn_1gb(client)
+    assert after["id"] == before["id"] and after["price"] == 7.25 and after["price"] != before["price"]
+
+    # The charge uses the new price too, and the old display string no longer resolves
+    resp = client.post("/purchase", data={"bundle_id": after["id"], "mobile": "0241234567"},
+                       headers={"X-Requested-With": "fetch"})
+    assert db.session.get(app_module.Purchase, resp.json["id"]).amount == 7.25
+    assert app_module.wallet_balance_minor(user.id) == 100_00 - 7_25
+    stale = client.post("/purchase", data={"network": "MTN", "bundle": before["label"], "mobile": "0241234567"},
+                        headers={"X-Requested-With": "fetch"})
+    assert stale.status_code == 400
+
+
+def test_change_made_by_another_worker_is_picked_up(app, client):
+    before = mtn_1gb(client)
+
+    # Another process writes the catalog; this worker only sees the version counter move
+    path = app.config["SQLALCHEMY_DATABASE_URI"].removeprefix("sqlite:///")
+    with sqlite3.connect(path) as other:
+        other.execute("UPDATE bundles SET active = 0 WHERE id = ?", (before["id"],))
+        other.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    other.close()  # the with block commits but does not close
+    db.session.rollback()
+
+    assert before["id"] not in [b["id"] for b in client.get("/api/bundles").json["bundles"]["MTN"]]
+    assert app_module.bundle_catalog.get(before["id"]) is None
@@ -0,0 +1,57 @@
+"""create_app() configurations."""
+
+import app as app_module
+from conftest import login, reset_caches
+
+
+def test_in_memory_database_serves_read_only_routes():
+    application = app_module.create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "TESTING": True})
+    reset_caches()
+    with application.app_context():
+        app_module.migrate()
+        user = app_module.User(username="mem", email="mem@example.com")
+        user.set_password("secret")
+        app_module.db.session.add(user)
+        app_module.db.session.commit()
+
+        # Without a replica, reads share the primary's single in-memory connection
+        assert "read" not in app_module.db.engines
+        assert app_module.read_engine() is app_module.db.engine
+
+        client = application.test_client()
+        login(client, user)
+        resp = client.get("/dashboard")
+        app_module.db.session.remove()
+
+    assert resp.status_code == 200
+    assert b"mem" in resp.data
+
+
+def test_file_database_has_read_pool(app):
+    assert app_module.read_engine() is app_module.db.engines["read"]
+    assert app_module.read_engine() is not app_module.db.engine
+
+
+def test_workers_load_the_assets_built_at_deploy(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "ASSET_BUILD_FOLDER", str(tmp_path / "dist"))
+    assert not app_module.ASSETS_BUILD_ON_START
+
+    unbuilt = app_module.create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "TESTING": True})
+    assert unbuilt.extensions["asset_manifest"] == {}
+
+    result = unbuilt.test_cli_runner().invoke(args=["build-assets"])
+    worker = app_module.create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "TESTING": True})
+
+    assert result.exit_code == 0, result.output
+    manifest = worker.extensions["asset_manifest"]
+    assert "header.css" in manifest and (tmp_path / "dist" / manifest["header.css"]).exists()
+
+
+def test_read_only_mark_ends_with_the_request(app, client, make_user):
+    login(client, make_user())
+    assert client.get("/api/wallet_balance").status_code == 200
+
+    # The fixture's app context is shared with the request; later writes use the primary
+    assert app_module.db.session.get_bind() is app_module.db.engine
+    app_module.bump_catalog_version()
+    app_module.db.session.commit()
@@ -0,0 +1,210 @@
+"""The fulfillment engine (claim, deliver, settle) with StubAdapter providers."""
+
+import time
+from datetime import timedelta
+
+import pytest
+
+import app as app_module
+from conftest import login
+from fulfillment import (Dispatcher, NetworkLimits, Order, PermanentFulfillmentError, StubAdapter, TokenBucket,
+                         parse_size_mb)
+
+db = app_module.db
+Purchase = app_module.Purchase
+
+
+@pytest.fixture
+def buyer(client, make_user):
+    user = make_user(balance=500)
+    login(client, user)
+    return user
+
+
+def buy(client, network="MTN", count=1, mobile="0241234567") -> list:
+    bundle = next(b for b in app_module.bundle_catalog.refresh().by_id.values() if b.provider == network)
+    ids = []
+    for _ in range(count):
+        resp = client.post("/purchase", data={"bundle_id": bundle.id, "mobile": mobile},
+                           headers={"X-Requested-With": "fetch"})
+        ids.append(resp.json["id"])
+    return ids
+
+
+def stub_dispatcher(network="MTN", **stub) -> Dispatcher:
+    stub.setdefault("latency", 0)
+    return Dispatcher({network: StubAdapter(network, seed=1, **stub)}, {network: NetworkLimits(4, 1000)})
+
+
+def fulfill(dispatcher) -> dict:
+    try:
+        return app_module.run_fulfillment(dispatcher)
+    finally:
+        dispatcher.shutdown()
+
+
+def purchase(pid) -> Purchase:
+    db.session.expire_all()
+    return db.session.get(Purchase, pid)
+
+
+def refunds(user) -> int:
+    return db.session.execute(
+        db.select(db.func.count()).select_from(app_module.LedgerEntry)
+        .where(app_module.LedgerEntry.user_id == user.id, app_module.LedgerEntry.kind == "refund")
+    ).scalar()
+
+
+def books_balance() -> None:
+    db.session.expire_all()
+    assert app_module.rebuild_sales_rollups(check_only=True)["mismatched"] == 0
+    assert app_module.rebuild_wallet_balances(repair=False)["mismatched"] == 0
+
+
+def test_delivered_orders_are_credited(client, buyer):
+    ids = buy(client, count=3)
+
+    assert fulfill(stub_dispatcher()) == {"credited": 3}
+
+    for pid in ids:
+        row = purchase(pid)
+        assert row.status == "credited" and row.provider_reference == f"stub-mtn-{pid}" and row.attempts == 1
+    books_balance()
+
+
+def test_rejected_order_is_refunded_once(client, buyer):
+    (pid,) = buy(client)
+    paid = app_module.wallet_balance_minor(buyer.id)
+
+    assert fulfill(stub_dispatcher(permanent_rate=1.0)) == {"refunded": 1}
+    assert fulfill(stub_dispatcher(permanent_rate=1.0)) == {}
+
+    assert purchase(pid).status == "refunded"
+    assert refunds(buyer) == 1
+    assert app_module.wallet_balance_minor(buyer.id) == paid + app_module.to_minor(purchase(pid).amount)
+    books_balance()
+
+
+def test_transient_failures_back_off_then_refund(client, buyer):
+    (pid,) = buy(client)
+    base = app_module.FULFILLMENT_RETRY_BASE
+
+    waits = []
+    for attempt in range(1, app_module.FULFILLMENT_MAX_ATTEMPTS):
+        assert fulfill(stub_dispatcher(transient_rate=1.0)) == {"retry": 1}
+        row = purchase(pid)
+        assert row.status == "fulfilling" and row.attempts == attempt
+        waits.append(row.next_attempt_at - app_module.datetime.utcnow())
+        assert fulfill(stub_dispatcher(transient_rate=1.0)) == {}  # not due yet
+        row.next_attempt_at = app_module.datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+    assert fulfill(stub_dispatcher(transient_rate=1.0)) == {"refunded": 1}
+    assert purchase(pid).attempts == app_module.FULFILLMENT_MAX_ATTEMPTS
+    assert refunds(buyer) == 1
+    for n, wait in enumerate(waits):
+        assert base * 2 ** n - timedelta(seconds=5) < wait <= base * 2 ** n
+    books_balance()
+
+
+def test_claim_is_a_lease(client, buyer):
+    ids = buy(client, count=2)
+
+    first = app_module.claim_fulfillment_orders("MTN", 10)
+    assert [order.purchase_id for order in first] == ids
+    assert app_module.claim_fulfillment_orders("MTN", 10) == []
+    assert app_module.claim_fulfillment_orders("Vodafone", 10) == []
+
+    # The engine crashed: once the lease lapses, the order is claimed again without a second transition
+    db.session.execute(db.update(Purchase).where(Purchase.id == ids[0])
+                       .values(next_attempt_at=app_module.datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    again = app_module.claim_fulfillment_orders("MTN", 10)
+    assert [order.purchase_id for order in again] == ids[:1]
+    assert app_module.PurchaseTransition.query.filter_by(purchase_id=ids[0], to_status="fulfilling").count() == 1
+    books_balance()
+
+
+def test_admin_change_supersedes_in_flight_order(client, buyer):
+    (pid,) = buy(client)
+    (order,) = app_module.claim_fulfillment_orders("MTN", 10)
+    app_module.apply_purchase_action([pid], "credited")
+    db.session.commit()
+
+    assert app_module.settle_fulfillment(order, error=PermanentFulfillmentError("rejected")) == "superseded"
+    assert refunds(buyer) == 0
+    books_balance()
+
+
+def test_imported_history_is_never_delivered(app, buyer):
+    records = [
+        {"email": buyer.email, "provider": "MTN", "bundle": "1 GB - 5.00 GHS", "number": "0241234567", "amount": 5},
+        {"email": buyer.email, "provider": "MTN", "bundle": "2 GB - 10.00 GHS", "number": "0241234567",
+         "amount": 10, "status": "payment_completed"},
+    ]
+    app_module.import_purchase_batch(records)
+    db.session.commit()
+
+    assert sorted(p.status for p in Purchase.query) == ["confirmed", "credited"]
+    assert app_module.claim_fulfillment_orders("MTN", 10) == []
+
+
+def add_legacy_purchase(user, bundle: str) -> int:
+    row = Purchase(provider="MTN", bundle=bundle, number="0241234567", amount=5.0, status="payment_completed",
+                   user_id=user.id, created_at=app_module.datetime.utcnow())
+    db.session.add(row)
+    db.session.commit()
+    app_module.rebuild_sales_rollups()
+    return row.id
+
+
+def test_legacy_purchase_is_sized_from_its_label(app, buyer):
+    pid = add_legacy_purchase(buyer, "1.5 GB - 8.00 GHS")
+
+    (order,) = app_module.claim_fulfillment_orders("MTN", 10)
+
+    assert order.purchase_id == pid and order.size_mb == 1536
+
+
+def test_unsized_order_is_held_not_refunded(client, buyer):
+    pid = add_legacy_purchase(buyer, "Weekly special")
+
+    assert fulfill(stub_dispatcher()) == {"held": 1}
+    assert fulfill(stub_dispatcher()) == {}
+
+    row = purchase(pid)
+    assert row.status == "fulfilling" and row.next_attempt_at is None and "bundle size" in row.last_error
+    assert refunds(buyer) == 0
+    # An admin settles it by hand
+    assert app_module.apply_purchase_action([pid], "credited") == {pid: "updated"}
+    db.session.commit()
+    books_balance()
+
+
+def test_parse_size_mb():
+    assert parse_size_mb("1 GB - 5.40 GHS") == 1024
+    assert parse_size_mb("500MB") == 500
+    assert parse_size_mb("0.5 gb") == 512
+    assert parse_size_mb("Weekly special") is None
+    assert parse_size_mb(None) is None
+
+
+def test_token_bucket_paces_deliveries():
+    bucket = TokenBucket(rate=50, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # The first token is saved up; the other five are spaced 20 ms apart
+    assert time.monotonic() - started >= 5 / 50 * 0.9
+
+
+def test_dispatcher_respects_concurrency_limit():
+    adapter = StubAdapter("MTN", latency=0.02)
+    dispatcher = Dispatcher({"MTN": adapter}, {"MTN": NetworkLimits(concurrency=3, rate=1000)})
+    try:
+        futures = [dispatcher.submit(Order(n, f"purchase:{n}", "MTN", "0241234567", 1024, "1 GB"))
+                   for n in range(12)]
+        assert [f.result() for f in futures] == [f"stub-mtn-{n}" for n in range(12)]
+    finally:
+        dispatcher.shutdown()
+    assert adapter.peak_in_flight == 3
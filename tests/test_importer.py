@@ -0,0 +1,137 @@
+"""`flask import-data`: streaming readers, batch inserts and checkpointed resume."""
+
+import io
+import json
+
+import pytest
+
+import app as app_module
+from importer import chunked, iter_json_array, iter_records
+from passwords import PasswordHasher
+
+db = app_module.db
+User = app_module.User
+Purchase = app_module.Purchase
+
+hasher = PasswordHasher("pbkdf2:sha256:1000", workers=0)
+
+
+class Interrupted(Exception):
+    pass
+
+
+def write_ndjson(path, records) -> str:
+    path.write_text("".join(json.dumps(r) + "\n" for r in records))
+    return str(path)
+
+
+def users(count: int) -> list:
+    return [{"username": f"user{i}", "email": f"user{i}@example.com", "password": "pw", "wallet_balance": 1.5}
+            for i in range(count)]
+
+
+def stop_after(batches: int):
+    """A progress callback that aborts the run after ``batches`` committed batches."""
+    seen = []
+
+    def progress(counts, elapsed):
+        seen.append(dict(counts))
+        if len(seen) == batches:
+            raise Interrupted
+
+    return progress
+
+
+def test_interrupted_user_import_resumes_without_duplicates(app, tmp_path):
+    path = write_ndjson(tmp_path / "users.ndjson", users(7))
+
+    with pytest.raises(Interrupted):
+        app_module.import_data("users", path, batch_size=3, hasher=hasher, progress=stop_after(1))
+    assert User.query.count() == 3
+
+    counts = app_module.import_data("users", path, batch_size=3, hasher=hasher)
+
+    assert counts == {"read": 4, "inserted": 4, "skipped": 0, "resumed": 3}
+    assert sorted(u.email for u in User.query) == sorted(u["email"] for u in users(7))
+    assert app_module.LedgerEntry.query.filter_by(kind="opening").count() == 7
+    assert app_module.rebuild_wallet_balances(repair=False)["mismatched"] == 0
+    # A finished file is not read again
+    assert app_module.import_data("users", path, batch_size=3, hasher=hasher)["read"] == 0
+
+
+def test_interrupted_purchase_import_resumes_without_duplicates(app, tmp_path):
+    app_module.import_data("users", write_ndjson(tmp_path / "users.ndjson", users(1)), hasher=hasher)
+    purchases = [{"email": "user0@example.com", "provider": "MTN", "bundle": "1GB", "number": f"024000{i:04d}",
+                  "amount": "5.00", "created_at": "2024-01-02 10:00:00"} for i in range(5)]
+    path = write_ndjson(tmp_path / "purchases.ndjson", purchases)
+
+    with pytest.raises(Interrupted):
+        app_module.import_data("purchases", path, batch_size=2, progress=stop_after(2))
+    counts = app_module.import_data("purchases", path, batch_size=2)
+
+    # Purchases have no natural key, so only the checkpoint keeps them from doubling
+    assert counts["resumed"] == 4 and counts["inserted"] == 1
+    assert sorted(p.number for p in Purchase.query) == [p["number"] for p in purchases]
+    assert app_module.rebuild_sales_rollups(check_only=True)["mismatched"] == 0
+
+
+def test_restart_ignores_the_checkpoint(app, tmp_path):
+    path = write_ndjson(tmp_path / "users.ndjson", users(4))
+    with pytest.raises(Interrupted):
+        app_module.import_data("users", path, batch_size=2, hasher=hasher, progress=stop_after(1))
+
+    counts = app_module.import_data("users", path, batch_size=2, hasher=hasher, resume=False)
+
+    # Everything is read again; the users already committed are recognised by email
+    assert counts == {"read": 4, "inserted": 2, "skipped": 2, "resumed": 0}
+    assert User.query.count() == 4
+
+
+def test_incomplete_rows_are_skipped(app, tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "username,email,password,wallet_balance\n"
+        "ann,ann@example.com,pw,2\n"
+        "nomail,,pw,3\n"                   # no email
+        "ann2,ANN@example.com,pw,4\n"      # same email as the first row
+        "bob,bob@example.com,,\n"          # empty cells mean not given
+    )
+    counts = app_module.import_data("users", str(path), batch_size=10, hasher=hasher)
+
+    assert counts == {"read": 4, "inserted": 2, "skipped": 2, "resumed": 0}
+    bob = User.query.filter_by(email="bob@example.com").one()
+    assert bob.check_password(app_module.IMPORT_DEFAULT_PASSWORD)
+    assert app_module.wallet_balance_minor(bob.id) == 0
+    assert app_module.wallet_balance_minor(User.query.filter_by(email="ann@example.com").one().id) == 200
+
+    purchases = write_ndjson(tmp_path / "purchases.ndjson", [
+        {"email": "ann@example.com", "provider": "MTN", "bundle": "1GB", "number": "0240000001", "amount": "5"},
+        {"email": "nobody@example.com", "provider": "MTN", "bundle": "1GB", "number": "0240000002", "amount": "5"},
+        {"provider": "MTN", "bundle": "1GB", "number": "0240000003", "amount": "5"},
+        {"email": "ann@example.com", "provider": "MTN", "bundle": "1GB", "amount": "5"},
+        {"email": "ann@example.com", "provider": "MTN", "bundle": "1GB", "number": "0240000004", "amount": "five"},
+        {"email": "ann@example.com", "provider": "MTN", "bundle": "1GB", "number": "0240000005",
+         "created_at": "yesterday"},
+    ])
+    assert app_module.import_data("purchases", purchases) == {"read": 6, "inserted": 1, "skipped": 5, "resumed": 0}
+    assert Purchase.query.one().status == "credited"
+
+
+def test_json_array_is_streamed_across_reads(monkeypatch):
+    monkeypatch.setattr("importer.READ_SIZE", 7)  # split elements across reads
+    records = [{"email": f"u{i}@example.com", "note": "a, [b] {c}"} for i in range(20)]
+
+    assert list(iter_json_array(io.StringIO(json.dumps(records, indent=1)))) == records
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('[{"a": 1}, {"b": 2}')))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"a": 1}')))
+
+
+def test_readers_and_chunking(tmp_path):
+    (tmp_path / "rows.jsonl").write_text('{"a": 1}\n\n{"a": 2}\n')
+
+    assert list(iter_records(str(tmp_path / "rows.jsonl"))) == [{"a": 1}, {"a": 2}]
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    with pytest.raises(ValueError):
+        list(iter_records(str(tmp_path / "rows.txt")))
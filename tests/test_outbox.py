@@ -0,0 +1,151 @@
+"""The mail outbox and its background sender, against the local SMTP stand-in."""
+
+import threading
+from datetime import timedelta
+
+import pytest
+
+import app as app_module
+from benchmarks.fake_smtp import start_fake_smtp
+
+OutboxMessage = app_module.OutboxMessage
+
+
+@pytest.fixture
+def fake_smtp(app):
+    """Start a stand-in and point the app's mail settings at it: fake_smtp(fail_every=...)."""
+    servers = []
+
+    def start(**settings):
+        server, _ = start_fake_smtp(**settings)
+        servers.append(server)
+        app.extensions.pop("mail", None)
+        app.config.update(
+            MAIL_SERVER="127.0.0.1",
+            MAIL_PORT=server.server_address[1],
+            MAIL_USE_TLS=False,
+            MAIL_USE_SSL=False,
+            MAIL_USERNAME=None,
+            MAIL_PASSWORD=None,
+            MAIL_SUPPRESS_SEND=False,  # Flask-Mail suppresses sending under TESTING
+        )
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def queue(count: int) -> None:
+    for i in range(count):
+        app_module.queue_mail(f"Message {i}", [f"to{i}@example.com"], "body")
+    app_module.db.session.commit()
+
+
+def make_due(message_id: int) -> None:
+    app_module.db.session.execute(
+        app_module.db.update(OutboxMessage)
+        .where(OutboxMessage.id == message_id)
+        .values(next_attempt_at=app_module.datetime.utcnow() - timedelta(seconds=1))
+    )
+    app_module.db.session.commit()
+
+
+def test_batch_uses_one_connection(fake_smtp):
+    smtp = fake_smtp()
+    queue(5)
+
+    counts = app_module.send_outbox(batch_size=50)
+
+    assert counts == {"sent": 5, "retry": 0, "failed": 0}
+    assert smtp.connections == 1
+    assert len(smtp.messages) == 5
+    assert OutboxMessage.query.filter_by(status="sent").count() == 5
+
+
+def test_rejected_message_is_retried_with_backoff(fake_smtp):
+    smtp = fake_smtp(fail_every=2)  # rejects the second message it receives
+    queue(2)
+
+    assert app_module.send_outbox() == {"sent": 1, "retry": 1, "failed": 0}
+    rejected = OutboxMessage.query.filter_by(status="queued").one()
+    assert rejected.attempts == 1 and rejected.last_error
+    wait = rejected.next_attempt_at - app_module.datetime.utcnow()
+    assert app_module.MAIL_RETRY_BASE - timedelta(seconds=5) < wait <= app_module.MAIL_RETRY_BASE
+
+    # Not due yet, so nothing is sent
+    assert app_module.send_outbox() == {"sent": 0, "retry": 0, "failed": 0}
+
+    make_due(rejected.id)
+    assert app_module.send_outbox() == {"sent": 1, "retry": 0, "failed": 0}
+    assert app_module.db.session.get(OutboxMessage, rejected.id).attempts == 2
+    assert len(smtp.messages) == 2
+
+
+def test_backoff_doubles_and_gives_up(fake_smtp):
+    fake_smtp(fail_every=1)
+    queue(1)
+    message_id = OutboxMessage.query.one().id
+
+    waits = []
+    for _ in range(app_module.MAIL_MAX_ATTEMPTS):
+        app_module.send_outbox()
+        message = app_module.db.session.get(OutboxMessage, message_id)
+        if message.status == "queued":
+            waits.append(message.next_attempt_at - app_module.datetime.utcnow())
+            make_due(message_id)
+
+    assert message.status == "failed" and message.attempts == app_module.MAIL_MAX_ATTEMPTS
+    assert all(later > 1.8 * earlier for earlier, later in zip(waits, waits[1:]))
+
+
+def test_claimed_messages_are_leased(app):
+    queue(6)
+
+    first = app_module.claim_outbox_batch(4)
+    second = app_module.claim_outbox_batch(4)
+
+    assert len(first) == 4 and len(second) == 2
+    assert not {m.id for m in first} & {m.id for m in second}
+    assert app_module.claim_outbox_batch(4) == []
+
+    # A crashed sender's lease lapses and the message is claimed again
+    make_due(first[0].id)
+    assert [m.id for m in app_module.claim_outbox_batch(4)] == [first[0].id]
+
+
+def test_concurrent_senders_deliver_each_message_once(app, fake_smtp):
+    smtp = fake_smtp(latency=0.05)
+    queue(20)
+    start = threading.Barrier(2)
+
+    def sender():
+        with app.app_context():
+            start.wait()
+            app_module.send_outbox(batch_size=15)
+            app_module.db.session.remove()
+
+    threads = [threading.Thread(target=sender) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # A sender that lost the race for every id it saw leaves the rest for its next round
+    while app_module.send_outbox(batch_size=15)["sent"]:
+        pass
+    assert OutboxMessage.query.filter_by(status="sent").count() == 20
+    delivered = [m["to"] for m in smtp.messages]
+    assert len(delivered) == len({tuple(to) for to in delivered}) == 20
+
+
+def test_contact_post_only_queues(client, fake_smtp):
+    smtp = fake_smtp()
+
+    resp = client.post("/contact", data={"name": "Ama", "email": "ama@example.com", "message": "Hello"})
+
+    assert resp.status_code == 302
+    message = OutboxMessage.query.one()
+    assert message.status == "queued" and message.reply_to == "ama@example.com"
+    assert smtp.connections == 0
@@ -0,0 +1,64 @@
+"""cached_page: shared rendered pages, ETags and invalidation."""
+
+import os
+
+import app as app_module
+from conftest import login
+
+
+def test_etag_revalidation(client):
+    first = client.get("/faq")
+    again = client.get("/faq", headers={"If-None-Match": first.headers["ETag"]})
+    gzipped = client.get("/faq", headers={"Accept-Encoding": "gzip"})
+
+    assert first.headers["X-Cache"] == "MISS" and first.status_code == 200
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert gzipped.headers["Content-Encoding"] == "gzip" and gzipped.headers["ETag"] != first.headers["ETag"]
+    assert client.get("/faq", headers={"If-None-Match": '"stale"'}).status_code == 200
+    assert app_module.page_cache.stats()["not_modified"] == 1
+
+
+def test_signed_in_visitors_share_the_page(client, make_user):
+    client.get("/faq")
+    login(client, make_user())
+
+    resp = client.get("/faq?utm_source=newsletter")
+
+    assert resp.headers["X-Cache"] == "HIT"
+    assert "Cookie" not in resp.headers.get("Vary", "")
+    assert app_module.page_cache.stats()["entries"] == 1
+
+
+def test_flashed_messages_bypass_the_cache(client):
+    client.get("/contact")
+    with client.session_transaction() as sess:
+        sess["_flashes"] = [("success", "Your message has been sent")]
+
+    shown = client.get("/contact")
+    after = client.get("/contact")
+
+    assert "X-Cache" not in shown.headers and b"Your message has been sent" in shown.data
+    assert after.headers["X-Cache"] == "HIT" and b"Your message has been sent" not in after.data
+
+
+def test_forged_session_cookie_is_ignored(app, client):
+    client.get("/faq")
+    client.set_cookie(app.config["SESSION_COOKIE_NAME"], "not-a-signed-session")
+
+    assert client.get("/faq").headers["X-Cache"] == "HIT"
+
+
+def test_template_change_invalidates(app, client):
+    path = os.path.join(app.root_path, app.template_folder, "FAQ.html")
+    stat = os.stat(path)
+    client.get("/faq")
+    renders = app_module.page_cache.stats()["renders_by_endpoint"]["faq"]
+    try:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        edited = client.get("/faq")
+    finally:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert edited.headers["X-Cache"] == "MISS"
+    assert app_module.page_cache.stats()["renders_by_endpoint"]["faq"] == renders + 1
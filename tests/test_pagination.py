@@ -0,0 +1,106 @@
+"""Keyset pagination of purchase lists: /api/purchases and the admin pager."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as app_module
+from conftest import login
+
+db = app_module.db
+Purchase = app_module.Purchase
+T0 = datetime(2025, 3, 1, 12, 0, 0)
+
+
+def add_purchases(user, times: list) -> list:
+    rows = [Purchase(provider="MTN", bundle="1GB", number="0241234567", amount=5.0, user_id=user.id,
+                     status="credited", created_at=at) for at in times]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+
+def walk(client, url: str, cursor_arg: str, insert=None, **args) -> list:
+    """Follow next_cursor to the end, calling ``insert`` after the first page."""
+    seen = []
+    cursor = None
+    while True:
+        resp = client.get(url, query_string={**args, cursor_arg: cursor} if cursor else args)
+        assert resp.status_code == 200
+        seen += [row["id"] for row in resp.json["purchases"]]
+        cursor = resp.json["next_cursor"]
+        if insert:
+            insert()
+            insert = None
+        if cursor is None:
+            return seen
+
+
+def test_history_pages_are_stable_under_inserts(client, make_user, monkeypatch):
+    monkeypatch.setattr(app_module, "DASHBOARD_PAGE_SIZE", 3)
+    user = make_user()
+    login(client, user)
+    # Several purchases share a timestamp, so the id breaks ties
+    second, day = timedelta(seconds=1), timedelta(days=1)
+    ids = add_purchases(user, [T0, T0, T0, T0 + second, T0 + second, T0 - day, T0 + day])
+    newest_first = sorted(ids, key=lambda pid: (db.session.get(Purchase, pid).created_at, pid), reverse=True)
+
+    seen = walk(client, "/api/purchases", "cursor", insert=lambda: add_purchases(user, [datetime.utcnow()]))
+
+    # A purchase made while paging lands ahead of the cursor: no repeats, nothing skipped
+    assert seen == newest_first
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "2025-03-01T12:00:00", "2025-03-01T12:00:00_x", "_5", "x_5"])
+def test_malformed_history_cursor_is_refused(client, make_user, cursor):
+    user = make_user()
+    login(client, user)
+    add_purchases(user, [T0])
+
+    resp = client.get("/api/purchases", query_string={"cursor": cursor})
+
+    assert resp.status_code == 400 and resp.json == {"error": "Invalid cursor"}
+
+
+def test_cursor_past_the_end_is_an_empty_last_page(client, make_user):
+    user = make_user()
+    login(client, user)
+    add_purchases(user, [T0])
+
+    resp = client.get("/api/purchases", query_string={"cursor": "2000-01-01T00:00:00_1"})
+
+    assert resp.json == {"purchases": [], "next_cursor": None}
+
+
+def test_admin_pages_are_stable_under_inserts(client, make_user):
+    user = make_user()
+    ids = add_purchases(user, [T0] * 7)
+
+    seen = walk(client, "/admin/api/purchases", "before", limit=3,
+                insert=lambda: add_purchases(user, [datetime.utcnow()] * 2))
+
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_admin_pages_keep_their_filters(client, make_user):
+    user = make_user()
+    ids = add_purchases(user, [T0 + timedelta(days=i) for i in range(6)])
+    for pid in ids[::2]:
+        db.session.get(Purchase, pid).status = "refunded"
+    db.session.commit()
+
+    first = client.get("/admin/api/purchases", query_string={"status": "refunded", "limit": 2}).json
+    second = client.get("/admin/api/purchases",
+                        query_string={"status": "refunded", "limit": 2, "before": first["next_cursor"]}).json
+
+    assert [p["id"] for p in first["purchases"] + second["purchases"]] == sorted(ids[::2], reverse=True)
+    assert second["next_cursor"] is None
+
+
+@pytest.mark.parametrize("before", ["abc", "-1", "1.5", "9e9x"])
+def test_malformed_admin_cursor_is_refused(client, make_user, before):
+    add_purchases(make_user(), [T0])
+
+    assert client.get("/admin/api/purchases", query_string={"before": before}).status_code == 400
+    assert client.get("/admin", query_string={"before": before}).status_code == 400
+    assert client.get("/admin/api/purchases", query_string={"before": "1"}).json["purchases"] == []
@@ -0,0 +1,47 @@
+"""PasswordHasher and its worker pool."""
+
+import threading
+
+from passwords import PasswordHasher
+
+
+def test_pool_is_spawned_while_threads_hold_locks():
+    hasher = PasswordHasher("pbkdf2:sha256:1000", workers=1)
+    held, release = threading.Lock(), threading.Event()
+
+    def busy():
+        with held:  # a fork now would copy this lock, locked, into the worker
+            release.wait()
+
+    thread = threading.Thread(target=busy)
+    thread.start()
+    try:
+        stored = hasher.hash("secret")
+        assert hasher.verify(stored, "secret") and not hasher.verify(stored, "wrong")
+        assert hasher.pool._mp_context.get_start_method() == "spawn"
+    finally:
+        release.set()
+        thread.join()
+        hasher.shutdown()
+
+
+def test_needs_rehash_on_changed_cost():
+    old = PasswordHasher("pbkdf2:sha256:1000", workers=0)
+    new = PasswordHasher("pbkdf2:sha256:2000", workers=0)
+    stored = old.hash("secret")
+
+    assert not old.needs_rehash(stored)
+    assert new.needs_rehash(stored)
+
+
+def test_hash_many_keeps_order_across_workers():
+    passwords = [f"secret-{i}" for i in range(9)]
+    for workers in (0, 2):
+        hasher = PasswordHasher("pbkdf2:sha256:1000", workers=workers)
+        try:
+            hashes = hasher.hash_many(passwords)
+            assert len(hashes) == len(passwords)
+            assert all(hasher.verify(h, p) for h, p in zip(hashes, passwords))
+            assert not hasher.verify(hashes[0], passwords[1])
+        finally:
+            hasher.shutdown()
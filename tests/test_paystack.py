@@ -0,0 +1,161 @@
+"""PaystackClient against the local stand-in, and the top-up crediting paths."""
+
+import hashlib
+import hmac
+import json
+
+import pytest
+
+import app as app_module
+from benchmarks import paystack_client
+from benchmarks.fake_paystack import start_fake_paystack
+from conftest import login
+from paystack import CircuitBreaker, PaystackClient, PaystackError, PaystackUnavailable
+
+
+@pytest.fixture
+def fake_paystack():
+    """Start stand-ins with the given fault settings; all are shut down afterwards."""
+    servers = []
+
+    def start(**settings):
+        server, _ = start_fake_paystack(**settings)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_client(server, **kwargs) -> PaystackClient:
+    kwargs.setdefault("backoff", 0.01)
+    kwargs.setdefault("breaker", CircuitBreaker(failure_threshold=100))
+    return PaystackClient("sk_test", base_url=server.base_url, **kwargs)
+
+
+def test_scenario_slow_gives_up_near_read_timeout():
+    assert paystack_client.scenario_slow()
+
+
+def test_scenario_degraded_opens_breaker():
+    assert paystack_client.scenario_degraded(20)
+
+
+def test_initialize_is_not_retried_once_sent(fake_paystack):
+    server = fake_paystack(fail_rate=1.0)
+    client = make_client(server, max_retries=2)
+
+    with pytest.raises(PaystackError):
+        client.initialize("a@example.com", 500, "http://localhost/cb")
+
+    # A repeat could open a second transaction at Paystack
+    assert server.calls == 1
+
+
+def test_verify_is_retried(fake_paystack):
+    server = fake_paystack(fail_rate=1.0)
+    client = make_client(server, max_retries=2)
+
+    with pytest.raises(PaystackError):
+        client.verify("ref")
+
+    assert server.calls == 3
+
+
+def test_open_breaker_fails_fast(fake_paystack):
+    server = fake_paystack(fail_rate=1.0)
+    client = make_client(server, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    for _ in range(2):
+        with pytest.raises(PaystackError):
+            client.verify("ref")
+    with pytest.raises(PaystackUnavailable):
+        client.verify("ref")
+
+    assert server.calls == 2
+
+
+def add_pending(user, reference="ref-1", amount=20.0):
+    app_module.db.session.add(app_module.PendingPayment(email=user.email, amount=amount, reference=reference))
+    app_module.db.session.commit()
+
+
+def post_webhook(client, event: dict, secret: str = app_module.PAYSTACK_SECRET_KEY):
+    body = json.dumps(event).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+    return client.post("/paystack/webhook", data=body, content_type="application/json",
+                       headers={"X-Paystack-Signature": signature})
+
+
+def charge_success(reference="ref-1", amount=2000) -> dict:
+    return {"event": "charge.success", "data": {"status": "success", "reference": reference, "amount": amount}}
+
+
+def test_webhook_rejects_bad_signature(client, make_user):
+    user = make_user(balance=0)
+    add_pending(user)
+
+    resp = post_webhook(client, charge_success(), secret="sk_wrong")
+
+    assert resp.status_code == 401
+    assert app_module.wallet_balance_minor(user.id) == 0
+    assert app_module.PendingPayment.query.count() == 1
+
+
+def test_replayed_webhook_credits_once(client, make_user):
+    user = make_user(balance=0)
+    add_pending(user)
+
+    first = post_webhook(client, charge_success())
+    again = post_webhook(client, charge_success())
+
+    assert first.status_code == again.status_code == 200
+    assert app_module.wallet_balance_minor(user.id) == 2000
+    assert app_module.Transaction.query.filter_by(reference="ref-1").count() == 1
+    assert app_module.credit_pending_payment("ref-1", 2000) == ("already_credited", user)
+    assert app_module.wallet_balance_minor(user.id) == 2000
+
+
+def test_webhook_amount_mismatch_is_not_credited(client, make_user):
+    user = make_user(balance=0)
+    add_pending(user)
+
+    post_webhook(client, charge_success(amount=1))
+
+    assert app_module.wallet_balance_minor(user.id) == 0
+    assert app_module.PendingPayment.query.count() == 1
+
+
+def test_top_up_through_stand_in(client, make_user, fake_paystack, monkeypatch):
+    server = fake_paystack()
+    monkeypatch.setattr(app_module.paystack, "base_url", server.base_url)
+    user = make_user(balance=0)
+    login(client, user)
+
+    resp = client.post("/initiate_payment", data={"amount": "15", "provider": "MTN", "number": "0241234567"})
+    assert resp.status_code == 302
+    reference = resp.headers["Location"].rsplit("/", 1)[1]
+    server.transactions[reference]["status"] = "success"  # the customer paid
+
+    # The browser callback and a replay of it
+    for _ in range(2):
+        resp = client.get(f"/verify_payment?reference={reference}")
+        assert resp.status_code == 302 and "/wallet" in resp.headers["Location"]
+
+    assert app_module.wallet_balance_minor(user.id) == 1500
+    assert app_module.Transaction.query.filter_by(reference=reference).count() == 1
+
+
+def test_callback_after_account_deleted(client, make_user):
+    user = make_user(balance=0)
+    add_pending(user)
+    post_webhook(client, charge_success())
+    app_module.db.session.execute(app_module.db.delete(app_module.User).where(app_module.User.id == user.id))
+    app_module.db.session.commit()
+
+    resp = client.get("/verify_payment?reference=ref-1")
+
+    assert resp.status_code == 302
+    assert resp.headers["Location"] == "/wallet"
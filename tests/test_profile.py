@@ -0,0 +1,90 @@
+"""POST /profile."""
+
+import io
+
+import app as app_module
+from conftest import login
+
+
+def test_update_refreshes_session_after_commit(app, client, make_user):
+    user = make_user()
+    login(client, user)
+
+    resp = client.post("/profile", data={"username": "renamed", "email": "new@example.com"})
+
+    assert resp.status_code == 200
+    with client.session_transaction() as sess:
+        assert sess["username"] == "renamed" and sess["email"] == "new@example.com"
+    assert app_module.db.session.get(app_module.User, user.id).email == "new@example.com"
+
+
+def test_rejected_upload_leaves_profile_and_session_unchanged(app, client, make_user, tmp_path):
+    app.config["UPLOAD_FOLDER"] = str(tmp_path)
+    user = make_user()
+    login(client, user)
+
+    resp = client.post("/profile", data={
+        "username": "renamed",
+        "email": "new@example.com",
+        "profile_pic": (io.BytesIO(b"not an image"), "pic.png"),
+    }, content_type="multipart/form-data")
+
+    assert resp.status_code == 400
+    with client.session_transaction() as sess:
+        assert sess["username"] == "buyer" and sess["email"] == "buyer@example.com"
+    app_module.db.session.expire_all()
+    assert app_module.db.session.get(app_module.User, user.id).email == "buyer@example.com"
+
+
+def test_oversized_body_is_refused_before_parsing(app, client, make_user, monkeypatch):
+    user = make_user()
+    login(client, user)
+    app.config["MAX_CONTENT_LENGTH"] = 1024
+    parsed = []
+    monkeypatch.setattr(app_module, "store_upload", lambda stream: parsed.append(stream))
+
+    resp = client.post("/profile", data={
+        "username": "renamed",
+        "profile_pic": (io.BytesIO(b"\x89PNG\r\n\x1a\n" + b"x" * 4096), "pic.png"),
+    }, content_type="multipart/form-data")
+
+    assert resp.status_code == 413
+    assert not parsed
+    with client.session_transaction() as sess:
+        assert sess["username"] == "buyer"
+
+
+def test_profile_edit_is_shown_on_the_next_request(client, make_user):
+    login(client, make_user(balance=20))
+    assert b"Welcome buyer" in client.get("/dashboard").data  # now cached
+
+    client.post("/profile", data={"username": "renamed", "email": "buyer@example.com"})
+    page = client.get("/dashboard").data
+
+    assert b"Welcome renamed" in page and b"GHS 20.00" in page
+
+
+def test_balance_change_is_shown_on_the_next_request(client, make_user):
+    login(client, make_user(balance=20))
+    assert client.get("/api/wallet_balance").json["balance"] == 20.0
+    bundle = app_module.bundle_catalog.refresh().by_id[min(app_module.bundle_catalog.by_id)]
+
+    client.post("/purchase", data={"bundle_id": bundle.id, "mobile": "0241234567"},
+                headers={"X-Requested-With": "fetch"})
+
+    assert client.get("/api/wallet_balance").json["balance"] == round(20 - bundle.price, 2)
+
+
+def test_change_from_another_worker_shows_after_the_ttl(client, make_user, monkeypatch):
+    user = make_user()
+    login(client, user)
+    client.get("/dashboard")
+    # Another worker renames the user; this one has no invalidate() call to go on
+    app_module.db.session.execute(
+        app_module.db.update(app_module.User).where(app_module.User.id == user.id).values(username="elsewhere")
+    )
+    app_module.db.session.commit()
+
+    assert b"Welcome buyer" in client.get("/dashboard").data
+    monkeypatch.setattr(app_module.profile_cache, "ttl", 0)
+    assert b"Welcome elsewhere" in client.get("/dashboard").data
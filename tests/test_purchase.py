@@ -0,0 +1,61 @@
+"""Idempotency keys on POST /purchase."""
+
+import app as app_module
+from conftest import login
+
+
+def first_bundle():
+    return app_module.bundle_catalog.refresh().by_id[min(app_module.bundle_catalog.by_id)]
+
+
+def post_purchase(client, bundle, mobile="0241234567", key="key-1"):
+    return client.post(
+        "/purchase",
+        data={"network": bundle.provider, "bundle_id": bundle.id, "mobile": mobile},
+        headers={"X-Requested-With": "fetch", "Idempotency-Key": key},
+    )
+
+
+def purchase_count(user):
+    return app_module.Purchase.query.filter_by(user_id=user.id).count()
+
+
+def test_same_key_same_order_replays(client, make_user):
+    user = make_user()
+    login(client, user)
+    bundle = first_bundle()
+
+    first = post_purchase(client, bundle)
+    again = post_purchase(client, bundle)
+
+    assert first.status_code == 200 and first.json["replayed"] is False
+    assert again.status_code == 200 and again.json == {"ok": True, "id": first.json["id"], "replayed": True}
+    assert purchase_count(user) == 1
+
+
+def test_same_key_different_order_is_refused(client, make_user):
+    user = make_user()
+    login(client, user)
+    bundles = sorted(app_module.bundle_catalog.refresh().by_id.values(), key=lambda b: b.id)
+
+    assert post_purchase(client, bundles[0]).status_code == 200
+    other_number = post_purchase(client, bundles[0], mobile="0209999999")
+    other_bundle = post_purchase(client, bundles[1])
+
+    assert other_number.status_code == 422
+    assert other_bundle.status_code == 422
+    assert purchase_count(user) == 1
+    # Only the first order was paid for
+    assert app_module.wallet_balance_minor(user.id) == app_module.to_minor(100.0 - bundles[0].price)
+
+
+def test_new_key_places_a_new_order(client, make_user):
+    user = make_user()
+    login(client, user)
+    bundle = first_bundle()
+
+    post_purchase(client, bundle, key="key-1")
+    resp = post_purchase(client, bundle, key="key-2")
+
+    assert resp.status_code == 200 and resp.json["replayed"] is False
+    assert purchase_count(user) == 2
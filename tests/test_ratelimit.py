@@ -0,0 +1,125 @@
+"""SharedLimiter buckets and in-flight cap, and how the app applies them."""
+
+import subprocess
+import sys
+
+import pytest
+
+import app as app_module
+from conftest import login
+from ratelimit import Limit, Overloaded, SharedLimiter, parse_limit
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return SharedLimiter(str(tmp_path / "ratelimit.db"))
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("10/minute", Limit(10, 60.0)),
+    (" 3/Second ", Limit(3, 1.0)),
+    ("1/day", Limit(1, 86400.0)),
+    ("", None),
+    (None, None),
+    ("off", None),
+    ("0", None),
+])
+def test_parse_limit(value, expected):
+    assert parse_limit(value) == expected
+
+
+@pytest.mark.parametrize("value", ["10", "10/week", "ten/minute", "0/minute", "-5/hour", "/minute"])
+def test_parse_limit_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_limit(value)
+
+
+def test_bucket_empties_and_refills(limiter):
+    limit = Limit(3, 60.0)  # one token every 20 seconds
+
+    assert [limiter.take("k", limit, now=1000.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.take("k", limit, now=1000.0) == pytest.approx(20.0)
+    assert limiter.take("k", limit, now=1015.0) == pytest.approx(5.0)  # refusals take nothing
+    assert limiter.take("k", limit, now=1020.0) == 0.0
+    assert limiter.take("k", limit, now=1020.0) > 0
+    # Other keys have buckets of their own, and a long pause refills only to capacity
+    assert limiter.take("other", limit, now=1020.0) == 0.0
+    assert [limiter.take("k", limit, now=5000.0) for _ in range(4)][-1] > 0
+
+
+def test_buckets_are_shared_through_the_file(limiter):
+    other = SharedLimiter(limiter.path)  # another worker process on the same host
+    limit = Limit(2, 60.0)
+
+    assert limiter.take("k", limit, now=1000.0) == 0.0
+    assert other.take("k", limit, now=1000.0) == 0.0
+    assert limiter.take("k", limit, now=1000.0) > 0
+
+
+def test_slot_cap(limiter):
+    limiter.acquire_slot(2)
+    limiter.acquire_slot(2)
+    with pytest.raises(Overloaded):
+        limiter.acquire_slot(2)
+    assert limiter.in_flight() == 2
+
+    limiter.release_slot()
+    limiter.acquire_slot(2)
+    for _ in range(3):
+        limiter.release_slot()  # never goes below zero
+    assert limiter.in_flight() == 0
+
+
+def test_slots_of_dead_processes_are_reclaimed(limiter):
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    limiter.acquire_slot(2)
+    limiter._connect().execute("INSERT INTO slots (pid, busy) VALUES (?, 5)", (child.pid,))
+
+    limiter.acquire_slot(2)
+
+    assert limiter.in_flight() == 2
+
+
+@pytest.fixture
+def limited_app(app, limiter, monkeypatch):
+    app.extensions["rate_limiter"] = limiter
+    monkeypatch.setattr(app_module, "RATE_LIMIT_MAX_IN_FLIGHT", 4)
+    return app
+
+
+def test_login_is_rate_limited(limited_app, client, monkeypatch):
+    monkeypatch.setitem(app_module.RATE_LIMITS, "login", {"ip": Limit(2, 60.0), "account": None})
+
+    codes = [client.post("/login", data={"email": "a@example.com", "password": "x"}).status_code for _ in range(3)]
+
+    assert codes[-1] == 429 and 429 not in codes[:2]
+    assert limited_app.extensions["rate_limiter"].in_flight() == 0
+
+
+def test_slot_is_released_when_the_view_fails(limited_app, client, make_user, monkeypatch):
+    login(client, make_user())
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app_module, "post_ledger_entry", broken)
+    monkeypatch.setitem(app_module.RATE_LIMITS, "purchase", {"ip": None, "account": None})
+    bundle_id = min(app_module.bundle_catalog.refresh().by_id)
+    with pytest.raises(RuntimeError):
+        client.post("/purchase", data={"bundle_id": bundle_id, "mobile": "0241234567"})
+
+    assert limited_app.extensions["rate_limiter"].in_flight() == 0
+
+
+def test_full_cap_answers_503(limited_app, client, monkeypatch):
+    monkeypatch.setitem(app_module.RATE_LIMITS, "login", {"ip": None, "account": None})
+    limiter = limited_app.extensions["rate_limiter"]
+    for _ in range(4):
+        limiter.acquire_slot(4)
+
+    resp = client.post("/login", data={"email": "a@example.com", "password": "x"},
+                       headers={"X-Requested-With": "fetch"})
+
+    assert resp.status_code == 503 and resp.headers["Retry-After"] == "1"
+    assert resp.json["ok"] is False
@@ -0,0 +1,94 @@
+"""The sales_daily rollup stays equal to a rebuild across every status change."""
+
+import hashlib
+import hmac
+import json
+
+import app as app_module
+from conftest import login
+from fulfillment import Dispatcher, NetworkLimits, StubAdapter
+
+db = app_module.db
+Purchase = app_module.Purchase
+
+
+def buy(client, count: int, network: str = "MTN") -> list:
+    bundle = next(b for b in app_module.bundle_catalog.refresh().by_id.values() if b.provider == network)
+    ids = []
+    for i in range(count):
+        resp = client.post("/purchase", data={"bundle_id": bundle.id, "mobile": f"02400000{i:02d}"},
+                           headers={"X-Requested-With": "fetch"})
+        assert resp.status_code == 200, resp.data
+        ids.append(resp.json["id"])
+    return ids
+
+
+def top_up_by_webhook(client, user, reference: str, amount_minor: int) -> None:
+    db.session.add(app_module.PendingPayment(email=user.email, amount=amount_minor / 100, reference=reference))
+    db.session.commit()
+    event = {"event": "charge.success", "data": {"status": "success", "reference": reference, "amount": amount_minor}}
+    body = json.dumps(event).encode()
+    signature = hmac.new(app_module.PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512).hexdigest()
+    resp = client.post("/paystack/webhook", data=body, content_type="application/json",
+                       headers={"X-Paystack-Signature": signature})
+    assert resp.status_code == 200
+
+
+def fulfill(**stub) -> dict:
+    dispatcher = Dispatcher({"MTN": StubAdapter("MTN", seed=1, latency=0, **stub)}, {"MTN": NetworkLimits(4, 1000)})
+    try:
+        return app_module.run_fulfillment(dispatcher)
+    finally:
+        dispatcher.shutdown()
+
+
+def mismatches() -> int:
+    db.session.expire_all()
+    return app_module.rebuild_sales_rollups(check_only=True)["mismatched"]
+
+
+def test_rollup_matches_rebuild_across_transitions(client, make_user):
+    user = make_user(balance=0)
+    login(client, user)
+    top_up_by_webhook(client, user, "ref-rollup", 200_00)
+    assert app_module.wallet_balance_minor(user.id) == 200_00
+
+    ids = buy(client, 8)
+    assert mismatches() == 0
+
+    assert client.post("/admin/purchases/batch", json={"ids": ids[:3], "action": "confirmed"}).status_code == 200
+    assert client.post("/admin/purchases/batch", json={"ids": ids[2:4], "action": "credited"}).status_code == 200
+    assert mismatches() == 0
+
+    fetch = {"X-Requested-With": "fetch"}
+    assert client.post(f"/confirm_purchase/{ids[4]}", headers=fetch).json["outcome"] == "updated"
+    assert client.post(f"/credit_purchase/{ids[4]}", headers=fetch).json["outcome"] == "updated"
+    assert client.post(f"/delete_purchase/{ids[0]}", headers=fetch).json["outcome"] == "deleted"
+    assert client.post("/admin/purchases/batch", json={"ids": ids[5:6], "action": "delete"}).status_code == 200
+    assert mismatches() == 0
+
+    # Only the two purchases still paid for are claimed; admin-confirmed ones are left alone
+    assert fulfill() == {"credited": 2}
+    assert db.session.get(Purchase, ids[1]).status == "confirmed"
+    assert mismatches() == 0
+    (late,) = buy(client, 1)
+    assert fulfill(permanent_rate=1.0) == {"refunded": 1}
+    assert mismatches() == 0
+
+    inserted, _ = app_module.import_purchase_batch([
+        {"email": user.email, "provider": "MTN", "bundle": "1GB", "number": "0240000099", "amount": "5.00",
+         "created_at": "2024-01-02 10:00:00", "status": "credited"},
+        {"email": user.email, "provider": "MTN", "bundle": "2GB", "number": "0240000098", "amount": "9.00",
+         "created_at": "2024-01-02 11:00:00", "status": "payment_completed"},
+    ])
+    db.session.commit()
+    assert inserted == 2
+    assert mismatches() == 0
+
+    # The imported history is older than the default range, which holds today's purchases only
+    summary = app_module.sales_summary(None, None)
+    count, revenue = db.session.execute(
+        db.select(db.func.count(), db.func.sum(Purchase.amount)).where(Purchase.created_at >= summary["from"])
+    ).one()
+    assert summary["totals"] == {"purchases": count, "revenue": round(revenue, 2)}
+    assert db.session.get(Purchase, late).status == "refunded"
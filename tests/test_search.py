@@ -0,0 +1,92 @@
+"""Admin search (/admin/api/search) and the FTS5 indexes that serve it."""
+
+import app as app_module
+from conftest import login
+
+db = app_module.db
+Purchase = app_module.Purchase
+
+
+def search(client, q: str) -> dict:
+    resp = client.get("/admin/api/search", query_string={"q": q})
+    assert resp.status_code == 200
+    return resp.json
+
+
+def ids(results: list) -> list:
+    return [row["id"] for row in results]
+
+
+def add_purchase(user, number: str, bundle: str = "1GB", provider: str = "MTN") -> Purchase:
+    purchase = Purchase(provider=provider, bundle=bundle, number=number, amount=5.0, user_id=user.id,
+                        status="credited")
+    db.session.add(purchase)
+    db.session.commit()
+    return purchase
+
+
+def fts_rowids(table: str, terms: list) -> list:
+    db.session.expire_all()
+    return sorted(app_module.fts_ids(table, terms, 100))
+
+
+def test_triggers_keep_the_index_in_step(app, make_user):
+    user = make_user(email="ama@example.com", username="ama")
+    purchase = add_purchase(user, "0241112222")
+    assert fts_rowids("purchases_fts", ["0241112222"]) == [purchase.id]
+    assert fts_rowids("purchases_fts", ["ama@example.com"]) == [purchase.id]
+
+    purchase.number = "0209998888"
+    db.session.commit()
+    assert fts_rowids("purchases_fts", ["0241112222"]) == []
+    assert fts_rowids("purchases_fts", ["02099"]) == [purchase.id]
+
+    # A renamed owner is found under the new name only, in users and purchases
+    user.username, user.email = "akosua", "akosua@example.com"
+    db.session.commit()
+    assert fts_rowids("users_fts", ["ama"]) == [] and fts_rowids("purchases_fts", ["ama"]) == []
+    assert fts_rowids("users_fts", ["akosua"]) == [user.id]
+    assert fts_rowids("purchases_fts", ["akosua@example"]) == [purchase.id]
+
+    db.session.delete(purchase)
+    db.session.commit()
+    assert fts_rowids("purchases_fts", ["02099"]) == []
+
+    db.session.add(app_module.Transaction(user_id=user.id, reference="T-ref-42", amount=10.0, status="success"))
+    db.session.commit()
+    assert len(fts_rowids("transactions_fts", ["t-ref"])) == 1
+    app_module.Transaction.query.delete()
+    db.session.commit()
+    assert fts_rowids("transactions_fts", ["t-ref"]) == []
+
+
+def test_search_by_number(client, make_user):
+    user = make_user()
+    wanted = add_purchase(user, "0241234567")
+    add_purchase(user, "0209876543")
+
+    for typed in ("0241234567", "024 123 4567", "+233 24 123 4567", "02412"):
+        assert ids(search(client, typed)["purchases"]) == [wanted.id], typed
+    assert search(client, "12")["purchases"] == []  # too short to be read as a number, and matches no word
+
+
+def test_search_by_email(client, make_user):
+    ama = make_user(email="ama.mensah@example.com", username="ama")
+    kofi = make_user(email="kofi@example.org", username="kofi")
+    purchase = add_purchase(ama, "0241234567")
+
+    found = search(client, "AMA.MENSAH@exam")
+    assert ids(found["users"]) == [ama.id] and ids(found["purchases"]) == [purchase.id]
+    assert ids(search(client, "kofi@example.org")["users"]) == [kofi.id]
+    assert search(client, "example.net")["users"] == []
+
+
+def test_quotes_and_operators_are_plain_text(client, make_user):
+    user = make_user(username="o'brien", email="obrien@example.com")
+    add_purchase(user, "0241234567", bundle='2GB "night"')
+
+    for typed in ('"', "'", 'night"', '"night OR', "o'brien", 'NEAR("a" "b")', "-", "* AND"):
+        resp = client.get("/admin/api/search", query_string={"q": typed})
+        assert resp.status_code == 200, typed
+    assert ids(search(client, "o'brien")["users"]) == [user.id]
+    assert len(search(client, '"night')["purchases"]) == 1
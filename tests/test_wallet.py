@@ -0,0 +1,108 @@
+"""The wallet ledger and its balance snapshots."""
+
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import app as app_module
+from conftest import login
+
+db = app_module.db
+LedgerEntry = app_module.LedgerEntry
+
+
+def ledger_sum(user_id: int) -> int:
+    return db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(LedgerEntry.amount_minor), 0)).where(LedgerEntry.user_id == user_id)
+    ).scalar()
+
+
+def test_debit_beyond_balance_is_refused(app, make_user):
+    user = make_user(balance=10)
+
+    assert not app_module.post_ledger_entry(user.id, -1001, "purchase", reference="purchase:1", require_funds=True)
+    db.session.rollback()
+
+    assert app_module.wallet_balance_minor(user.id) == 1000
+    assert LedgerEntry.query.filter_by(reference="purchase:1").count() == 0
+    assert app_module.post_ledger_entry(user.id, -1000, "purchase", reference="purchase:1", require_funds=True)
+    db.session.commit()
+    assert app_module.wallet_balance_minor(user.id) == 0
+
+
+def test_purchase_without_funds_leaves_no_entry(client, make_user):
+    user = make_user(balance=1)
+    login(client, user)
+    bundle = app_module.bundle_catalog.refresh().by_id[min(app_module.bundle_catalog.by_id)]
+
+    resp = client.post("/purchase", data={"bundle_id": bundle.id, "mobile": "0241234567"},
+                       headers={"X-Requested-With": "fetch"})
+
+    assert resp.status_code == 400 and resp.json["balance"] == 1.0
+    assert LedgerEntry.query.filter_by(user_id=user.id, kind="purchase").count() == 0
+    assert app_module.Purchase.query.count() == 0
+
+
+def test_reference_is_posted_once(app, make_user):
+    user = make_user(balance=0)
+    app_module.post_ledger_entry(user.id, 500, "topup", reference="paystack:abc")
+    db.session.commit()
+
+    with pytest.raises(IntegrityError):
+        app_module.post_ledger_entry(user.id, 500, "topup", reference="paystack:abc")
+    db.session.rollback()
+    assert app_module.wallet_balance_minor(user.id) == 500
+
+
+def test_snapshot_equals_ledger_sum(app, make_user):
+    users = [make_user(email=f"u{n}@example.com", username=f"u{n}", balance=50) for n in range(3)]
+    for n, user in enumerate(users):
+        app_module.post_ledger_entry(user.id, 1234, "topup", reference=f"paystack:{n}")
+        app_module.post_ledger_entry(user.id, -999, "purchase", reference=f"purchase:{n}", require_funds=True)
+        app_module.post_ledger_entry(user.id, 999, "refund", reference=f"refund:purchase:{n}")
+    db.session.commit()
+
+    for user in users:
+        assert app_module.wallet_balance_minor(user.id) == ledger_sum(user.id) == 5000 + 1234
+    assert app_module.rebuild_wallet_balances(repair=False) == {"checked": 3, "mismatched": 0, "repaired": 0}
+
+
+def test_rebuild_repairs_drift(app, make_user):
+    user = make_user(balance=20)
+    db.session.execute(db.update(app_module.WalletBalance).where(app_module.WalletBalance.user_id == user.id)
+                       .values(balance_minor=7))
+    db.session.commit()
+
+    assert app_module.rebuild_wallet_balances(repair=False)["mismatched"] == 1
+    assert app_module.wallet_balance_minor(user.id) == 7
+    assert app_module.rebuild_wallet_balances()["repaired"] == 1
+    assert app_module.wallet_balance_minor(user.id) == ledger_sum(user.id) == 2000
+    assert app_module.rebuild_wallet_balances(repair=False)["mismatched"] == 0
+
+
+def test_concurrent_debits_never_overdraw(app, make_user):
+    user = make_user(balance=100)
+    start = threading.Barrier(8)
+    results = []
+
+    def spend(n: int) -> None:
+        with app.app_context():
+            start.wait()
+            ok = app_module.post_ledger_entry(user.id, -3000, "purchase", reference=f"purchase:{n}",
+                                              require_funds=True)
+            if ok:
+                db.session.commit()
+            else:
+                db.session.rollback()
+            results.append(ok)
+            db.session.remove()
+
+    threads = [threading.Thread(target=spend, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 3
+    assert app_module.wallet_balance_minor(user.id) == ledger_sum(user.id) == 1000